@@ -43,10 +43,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Собранная статика со сжатием и кешированием - до сессий и прочего (store/assets.py)
+    'store.assets.StaticFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'store.replica.ReplicaMiddleware',
+    'store.cart_storage.CartCookieMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -80,9 +84,18 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
+    # Реплика для чтения каталога и отчетов (store/replica.py); локально - копия db.sqlite3,
+    # которую обновляет команда refresh_replica
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db_replica.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+DATABASE_ROUTERS = ['store.replica.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -128,6 +141,25 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Загруженные файлы называются по хешу содержимого, дубликаты не хранятся (store/storage.py)
+STORAGES = {
+    'default': {'BACKEND': 'store.storage.ContentAddressedStorage'},
+    # Имена с хешем и сжатые копии .gz/.br при collectstatic (store/assets.py)
+    'staticfiles': {'BACKEND': 'store.assets.CompressedManifestStaticFilesStorage'},
+}
+# Сколько секунд браузер кеширует медиафайлы с хешем в имени
+MEDIA_CACHE_MAX_AGE = 365 * 24 * 60 * 60
+# То же для статики с хешем в имени
+STATIC_CACHE_MAX_AGE = 365 * 24 * 60 * 60
+
+# Ширины уменьшенных копий изображений игр, пикселей (store/renditions.py)
+IMAGE_RENDITION_WIDTHS = [320, 640, 960, 1280]
+# Размер размытой заглушки изображения по большей стороне, пикселей (store/placeholders.py)
+IMAGE_PLACEHOLDER_SIZE = 16
+
+# Сколько игр показывать в блоке "С этой игрой покупают" (store/recommendations.py)
+RECOMMENDATION_NEIGHBORS = 6
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -139,10 +171,82 @@ LOGOUT_REDIRECT_URL = '/'   # После выхода - на главную
 LOGIN_REDIRECT_URL = '/'    # После успешного входа - на главную
 
 # Настройки сессии
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+# Сессии в базе; запись - только при изменении данных (store/sessions.py)
+SESSION_ENGINE = 'store.sessions'
+SESSION_SERIALIZER = 'store.sessions.CompactJSONSerializer'
 SESSION_COOKIE_AGE = 1209600  # 2 недели в секундах
 SESSION_SAVE_EVERY_REQUEST = True
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
+# Продлевать срок сессии в базе не чаще раза в столько секунд
+SESSION_EXTEND_INTERVAL = 60 * 60
+# Кеш чтения сессий - только общий для всех процессов (Redis, memcached); None - читать из базы
+SESSION_READ_CACHE = None
+
+# Где хранится корзина анонимного покупателя: 'session' или 'cookie' (store/cart_storage.py).
+# В режиме 'cookie' корзина - подписанная cookie, при входе она переносится в сессию.
+# Включается явно: при переключении корзины анонимных покупателей из сессий не переносятся
+CART_BACKEND = 'session'
+CART_COOKIE_NAME = 'cart'
+CART_COOKIE_AGE = 14 * 24 * 60 * 60   # 2 недели в секундах
+CART_COOKIE_MAX_LINES = 50            # разных игр в корзине-cookie
+
+# Сколько секунд товар в корзине остается зарезервированным за покупателем
+CART_RESERVATION_TTL = 15 * 60
+# Лимиты резервов одной корзины: копий одной игры и копий всего
+CART_MAX_HOLD_PER_LINE = 10
+CART_MAX_HOLD_PER_CART = 50
+
+# Очередь на оформление заказа во время распродаж (store/admission.py)
+CHECKOUT_MAX_CONCURRENT = 20       # сколько покупателей одновременно оформляют заказ
+CHECKOUT_SLOT_TTL = 5 * 60         # через сколько секунд бездействия место освобождается
+CHECKOUT_QUEUE_TTL = 60            # ожидающий без опроса дольше этого выбывает из очереди
+CHECKOUT_QUEUE_POLL = 5            # как часто страница очереди переспрашивает сервер
+CHECKOUT_AVG_SECONDS = 60          # среднее время оформления - для оценки ожидания
+
+# Кеши: default - в памяти процесса;
+# reports - общий для всех процессов кеш отчетов в базе, чтобы блокировка пересчета
+# и старая копия были одни на все процессы;
+# reviews - общий кеш первых страниц отзывов, чтобы их сброс видели все процессы.
+# Таблицы создает: python manage.py createcachetable
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'reports': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'report_cache'},
+    'reviews': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'review_cache'},
+}
+REPORT_CACHE_ALIAS = 'reports'
+REVIEW_CACHE_ALIAS = 'reviews'
+
+# Кеш отчетов (store/report_cache.py), сек: после мягкого TTL результат пересчитывается в фоне,
+# после жесткого - удаляется из кеша
+REPORT_CACHE_SOFT_TTL = 60
+REPORT_CACHE_HARD_TTL = 60 * 60
+
+# Мягкий TTL аналитики продаж (store/analytics.py), сек: для периодов с сегодняшним днем и для прошедших
+SALES_ANALYTICS_TTL = 60
+SALES_ANALYTICS_CLOSED_TTL = 60 * 60
+
+# Профиль соединений SQLite (store/sqlite.py). SQLITE_CONNECTION_PROFILE = False оставляет
+# настройки SQLite по умолчанию; любое значение ниже можно отключить, присвоив None
+SQLITE_CONNECTION_PROFILE = True
+SQLITE_JOURNAL_MODE = 'WAL'
+SQLITE_SYNCHRONOUS = 'NORMAL'
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024   # байт
+SQLITE_CACHE_SIZE = -64 * 1024         # отрицательное - в КиБ (64 МиБ)
+SQLITE_BUSY_TIMEOUT = 5000             # мс ожидания чужой блокировки
+SQLITE_TRANSACTION_MODE = 'IMMEDIATE'  # atomic() сразу берет блокировку записи
+
+# Чтение с реплики (store/replica.py)
+REPLICA_DATABASE = 'replica'
+# REPLICA_MAX_LAG - сек, реплика старше этого не читается; по умолчанию replica.DEFAULT_MAX_LAG (120)
+REPLICA_LAG_CHECK_INTERVAL = 5         # как часто перепроверять отставание, сек
+REPLICA_PIN_SECONDS = 120              # сколько после записи покупатель читает основную базу
+REPLICA_PIN_COOKIE = 'primary_reads'
+# Записи, после которых покупатель должен сразу видеть свои изменения
+REPLICA_PIN_VIEWS = ['checkout', 'payment', 'confirm_payment', 'add_review', 'delete_review']
+REPLICA_READ_VIEWS = [
+    'home', 'game_list', 'game_detail', 'game_reviews',
+    'reports', 'top_games_report', 'weekly_sales_report', 'sales_analytics', 'orders_export',
+]
 
 # Максимальный размер загружаемых файлов
 DATA_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
@@ -167,6 +271,10 @@ EMAIL_HOST = 'localhost'
 EMAIL_PORT = 25
 DEFAULT_FROM_EMAIL = 'noreply@gamestore.com'
 
+# Очередь писем (команда send_outbox): число попыток и базовая задержка повтора, сек
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_RETRY_BASE_SECONDS = 30
+
 # Для продакшена (раскомментируйте и настройте):
 """
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -1,7 +1,8 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+
+from store.views import media_file
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -9,5 +10,4 @@ urlpatterns = [
 ]
 
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
\ No newline at end of file
+    urlpatterns.append(re_path(r'^%s(?P<path>.*)$' % settings.MEDIA_URL.lstrip('/'), media_file))
\ No newline at end of file
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Genre, Tag, Game, Customer, Order, OrderItem, Review
+from .models import Genre, Tag, Game, Customer, Order, OrderItem, Review, OutboxEmail, SalesDaily, GameNeighbor
 
 
 @admin.register(Genre)
@@ -16,7 +16,7 @@ class TagAdmin(admin.ModelAdmin):
 
 @admin.register(Game)
 class GameAdmin(admin.ModelAdmin):
-    list_display = ['title', 'genre', 'price', 'quantity', 'average_rating_display']
+    list_display = ['title', 'genre', 'price', 'quantity', 'reserved', 'average_rating_display']
     list_filter = ['genre', 'tags', 'created_at']
     search_fields = ['title', 'description']
     filter_horizontal = ['tags']
@@ -58,4 +58,28 @@ class ReviewAdmin(admin.ModelAdmin):
         return obj.get_stars_display()
 
     get_stars_display.short_description = 'Рейтинг'
-    get_stars_display.allow_tags = True
\ No newline at end of file
+    get_stars_display.allow_tags = True
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'to', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['subject', 'to']
+    readonly_fields = ['created_at', 'sent_at', 'last_error']
+
+
+@admin.register(SalesDaily)
+class SalesDailyAdmin(admin.ModelAdmin):
+    list_display = ['day', 'game', 'orders', 'units', 'revenue']
+    list_filter = ['day']
+    search_fields = ['game__title']
+    readonly_fields = ['game', 'day', 'orders', 'units', 'revenue']
+
+
+@admin.register(GameNeighbor)
+class GameNeighborAdmin(admin.ModelAdmin):
+    list_display = ['game', 'rank', 'neighbor', 'orders']
+    search_fields = ['game__title']
+    list_select_related = ['game', 'neighbor']
+    readonly_fields = ['game', 'rank', 'neighbor', 'orders']
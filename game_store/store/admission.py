@@ -0,0 +1,158 @@
+"""Очередь на оформление заказа (виртуальная комната ожидания).
+
+Во время распродаж оформлять заказ одновременно могут не больше
+CHECKOUT_MAX_CONCURRENT покупателей. Остальные получают легкую страницу с
+местом в очереди и примерным временем ожидания, которая сама переспрашивает
+сервер, вместо того чтобы упереться в блокировку записи SQLite внутри checkout.
+
+Состояние очереди лежит в таблице AdmissionTicket, поэтому оно общее для всех
+процессов сервера. Опрос из очереди сначала только читает: место и число
+занятых слотов. UPDATE, которому нужна блокировка записи SQLite, выполняется,
+лишь когда посетитель первым в очереди и есть свободный слот. Сам допуск -
+один UPDATE с подзапросами, так что два процесса не могут одновременно занять
+последнее свободное место.
+"""
+import math
+import uuid
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import connection
+from django.http import JsonResponse
+from django.shortcuts import render
+from django.utils import timezone
+
+from .models import AdmissionTicket
+
+SESSION_KEY = 'checkout_token'
+
+# Не обновляем last_seen чаще, чем раз в столько секунд - меньше записей в БД
+TOUCH_INTERVAL = timedelta(seconds=10)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class Admission:
+    """Решение по запросу: пропустить или поставить в очередь"""
+
+    def __init__(self, admitted, position=0, wait_seconds=0):
+        self.admitted = admitted
+        self.position = position
+        self.wait_seconds = wait_seconds
+
+
+def _token(request):
+    token = request.session.get(SESSION_KEY)
+    if token is None:
+        token = uuid.uuid4().hex
+        request.session[SESSION_KEY] = token
+    return token
+
+
+def _try_admit(ticket_id, now, slot_cutoff, queue_cutoff, limit):
+    """Допускает ожидающего, если для него (с учетом стоящих впереди) есть место"""
+    table = AdmissionTicket._meta.db_table
+    adapt = connection.ops.adapt_datetimefield_value
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {table} SET admitted_at = %s, last_seen = %s '
+            f'WHERE id = %s AND admitted_at IS NULL AND ('
+            f'  (SELECT COUNT(*) FROM {table} WHERE admitted_at IS NOT NULL AND last_seen >= %s)'
+            f'  + (SELECT COUNT(*) FROM {table} WHERE admitted_at IS NULL AND last_seen >= %s AND id < %s)'
+            f') < %s',
+            [adapt(now), adapt(now), ticket_id, adapt(slot_cutoff), adapt(queue_cutoff), ticket_id, limit],
+        )
+        return cursor.rowcount == 1
+
+
+def enter(request):
+    """Пропускает посетителя к оформлению или возвращает его место в очереди"""
+    now = timezone.now()
+    limit = _setting('CHECKOUT_MAX_CONCURRENT', 20)
+    slot_cutoff = now - timedelta(seconds=_setting('CHECKOUT_SLOT_TTL', 5 * 60))
+    queue_cutoff = now - timedelta(seconds=_setting('CHECKOUT_QUEUE_TTL', 60))
+    token = _token(request)
+
+    ticket = AdmissionTicket.objects.filter(token=token).first()
+    if ticket and ticket.admitted_at and ticket.last_seen >= slot_cutoff:
+        if ticket.last_seen < now - TOUCH_INTERVAL:
+            AdmissionTicket.objects.filter(pk=ticket.pk).update(last_seen=now)
+        return Admission(True)
+
+    if ticket and ticket.admitted_at:
+        # Место истекло из-за бездействия - встаем в конец очереди заново
+        ticket.delete()
+        ticket = None
+    if ticket is None:
+        # Два одновременных запроса одного посетителя: второй получит уже созданное место
+        ticket, _ = AdmissionTicket.objects.get_or_create(token=token, defaults={'last_seen': now})
+    elif ticket.last_seen < now - TOUCH_INTERVAL:
+        AdmissionTicket.objects.filter(pk=ticket.pk).update(last_seen=now)
+
+    # Сначала только читаем: пока впереди очередь или все слоты заняты, писать незачем
+    busy = AdmissionTicket.objects.filter(admitted_at__isnull=False, last_seen__gte=slot_cutoff).count()
+    ahead = AdmissionTicket.objects.filter(
+        admitted_at__isnull=True, last_seen__gte=queue_cutoff, pk__lt=ticket.pk
+    ).count()
+    if busy + ahead < limit and _try_admit(ticket.pk, now, slot_cutoff, queue_cutoff, limit):
+        return Admission(True)
+
+    position = ahead + 1
+    wait_seconds = math.ceil(position / limit) * _setting('CHECKOUT_AVG_SECONDS', 60)
+    return Admission(False, position, wait_seconds)
+
+
+def release(request):
+    """Освобождает место посетителя (заказ оплачен или оформление брошено)"""
+    token = request.session.get(SESSION_KEY)
+    if token:
+        AdmissionTicket.objects.filter(token=token).delete()
+
+
+def purge_stale(now=None):
+    """Удаляет истекшие места и брошенные места в очереди. Возвращает их число"""
+    now = now or timezone.now()
+    slot_cutoff = now - timedelta(seconds=_setting('CHECKOUT_SLOT_TTL', 5 * 60))
+    queue_cutoff = now - timedelta(seconds=_setting('CHECKOUT_QUEUE_TTL', 60))
+    deleted, _ = AdmissionTicket.objects.filter(admitted_at__isnull=False, last_seen__lt=slot_cutoff).delete()
+    waiting, _ = AdmissionTicket.objects.filter(admitted_at__isnull=True, last_seen__lt=queue_cutoff).delete()
+    return deleted + waiting
+
+
+def queue_response(request, admission):
+    """Легкий ответ для стоящего в очереди: без обращения к корзине и заказам.
+
+    Код 429, а не 503: на ответы 5xx SessionMiddleware не сохраняет сессию,
+    и посетитель терял бы токен, а с ним и место в очереди.
+    """
+    poll = _setting('CHECKOUT_QUEUE_POLL', 5)
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        response = JsonResponse({
+            'queued': True,
+            'position': admission.position,
+            'wait_seconds': admission.wait_seconds,
+            'retry_after': poll,
+        }, status=429)
+    else:
+        response = render(request, 'store/checkout_queue.html', {
+            'position': admission.position,
+            'wait_minutes': max(math.ceil(admission.wait_seconds / 60), 1),
+            'poll': poll,
+        }, status=429)
+    response['Retry-After'] = str(poll)
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+def admission_required(view):
+    """Декоратор: пускает к представлению только допущенных из очереди"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        admission = enter(request)
+        if not admission.admitted:
+            return queue_response(request, admission)
+        return view(request, *args, **kwargs)
+    return wrapper
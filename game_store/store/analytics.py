@@ -0,0 +1,285 @@
+"""Аналитика продаж за произвольный период с разбивкой по времени.
+
+Запрос (SalesQuery) задает период, шаг разбивки (час, день, неделя, месяц),
+фильтры по жанрам, играм и статусам заказов и сравнение с предыдущим
+периодом такой же длины. Разбивка и суммирование выполняются в SQL через
+Trunc*: в Python приходит по строке на интервал, а не по строке на заказ.
+
+Без фильтров по играм и статусам данные берутся из сводки SalesDaily (при
+шаге от дня), иначе - из позиций заказов. Результат кешируется по
+нормализованному запросу (store/report_cache.py).
+"""
+import hashlib
+import json
+from datetime import date, datetime, time, timedelta
+from itertools import zip_longest
+
+from django.conf import settings
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDay, TruncHour, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from . import report_cache, sales
+from .models import Order, OrderItem, SalesDaily
+
+BUCKETS = ('hour', 'day', 'week', 'month')
+DEFAULT_BUCKET = 'day'
+DEFAULT_DAYS = 30
+
+# Больше интервалов в одном ответе не отдаем (год по часам - 8784)
+MAX_BUCKETS = 9000
+
+TRUNC = {'hour': TruncHour, 'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}
+
+STATUSES = [value for value, _ in Order.STATUS_CHOICES]
+
+
+class QueryError(ValueError):
+    """Некорректные параметры запроса аналитики"""
+
+
+def _parse_date(raw, default):
+    if not raw:
+        return default
+    try:
+        return date.fromisoformat(raw)
+    except ValueError:
+        raise QueryError(f'Неверная дата: {raw}')
+
+
+def _ids(params, name):
+    values = set()
+    for raw in params.getlist(name):
+        try:
+            value = int(raw)
+        except (TypeError, ValueError):
+            continue
+        if value > 0:
+            values.add(value)
+    return sorted(values)
+
+
+def bucket_start(value, bucket):
+    """Начало интервала, в который попадает дата/время value"""
+    if bucket == 'hour':
+        return value.replace(minute=0, second=0, microsecond=0)
+    if isinstance(value, datetime):
+        value = value.date()
+    if bucket == 'week':
+        return value - timedelta(days=value.weekday())
+    if bucket == 'month':
+        return value.replace(day=1)
+    return value
+
+
+def bucket_starts(start, end, bucket):
+    """Все интервалы периода [start, end] по порядку"""
+    if bucket == 'hour':
+        current = datetime.combine(start, time())
+        stop = datetime.combine(end + timedelta(days=1), time())
+        step = timedelta(hours=1)
+    else:
+        current, stop = bucket_start(start, bucket), end + timedelta(days=1)
+        step = timedelta(days=7 if bucket == 'week' else 1)
+    while current < stop:
+        yield current
+        if bucket == 'month':
+            current = (current.replace(day=28) + timedelta(days=4)).replace(day=1)
+        else:
+            current += step
+
+
+class SalesQuery:
+    """Нормализованный запрос аналитики продаж.
+
+    Пустой список статусов означает продажи - оплаченные или завершенные
+    заказы (как в отчетах); иначе учитываются заказы с указанными статусами.
+    """
+
+    def __init__(self, start, end, bucket=DEFAULT_BUCKET, genres=(), games=(), statuses=(), compare=False):
+        if bucket not in BUCKETS:
+            raise QueryError(f'Неизвестный шаг разбивки: {bucket}')
+        if end < start:
+            raise QueryError('Конец периода раньше начала')
+        self.start = start
+        self.end = end
+        self.bucket = bucket
+        self.genres = sorted(set(genres))
+        self.games = sorted(set(games))
+        self.statuses = sorted(set(statuses))
+        self.compare = compare
+        if len(self.buckets()) > MAX_BUCKETS:
+            raise QueryError('Слишком много интервалов: увеличьте шаг разбивки или сократите период')
+
+    @classmethod
+    def default(cls):
+        """Продажи за последние DEFAULT_DAYS дней по дням"""
+        end = timezone.localdate()
+        return cls(end - timedelta(days=DEFAULT_DAYS - 1), end)
+
+    @classmethod
+    def from_query(cls, params):
+        today = timezone.localdate()
+        end = _parse_date(params.get('end'), today)
+        start = _parse_date(params.get('start'), end - timedelta(days=DEFAULT_DAYS - 1))
+        return cls(
+            start=start,
+            end=end,
+            bucket=params.get('bucket') or DEFAULT_BUCKET,
+            genres=_ids(params, 'genre'),
+            games=_ids(params, 'game'),
+            statuses=[status for status in params.getlist('status') if status in STATUSES],
+            compare=params.get('compare') in ('1', 'on', 'true'),
+        )
+
+    def as_dict(self):
+        return {
+            'start': self.start.isoformat(),
+            'end': self.end.isoformat(),
+            'bucket': self.bucket,
+            'genre': self.genres,
+            'game': self.games,
+            'status': self.statuses,
+            'compare': self.compare,
+        }
+
+    def cache_key(self):
+        digest = hashlib.sha1(json.dumps(self.as_dict(), sort_keys=True).encode()).hexdigest()
+        return f'sales-analytics:{digest}'
+
+    def days(self):
+        return (self.end - self.start).days + 1
+
+    def previous(self):
+        """Такой же по длине период непосредственно перед этим"""
+        end = self.start - timedelta(days=1)
+        return SalesQuery(
+            end - timedelta(days=self.days() - 1), end, self.bucket,
+            self.genres, self.games, self.statuses,
+        )
+
+    def buckets(self):
+        return list(bucket_starts(self.start, self.end, self.bucket))
+
+    def uses_rollup(self):
+        """Сводка хранит только продажи по дням и не делит заказ между играми"""
+        return self.bucket != 'hour' and not (self.genres or self.games or self.statuses)
+
+
+def _rollup_rows(query):
+    rows = SalesDaily.objects.filter(game__isnull=True, day__gte=query.start, day__lte=query.end)
+    if query.bucket != 'day':
+        rows = rows.annotate(bucket=TRUNC[query.bucket]('day'))
+    else:
+        rows = rows.annotate(bucket=F('day'))
+    return (
+        rows.values('bucket')
+        .annotate(orders=Sum('orders'), units=Sum('units'), revenue=Sum('revenue'))
+        .order_by('bucket')
+    )
+
+
+def _order_rows(query):
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(query.start, time()), tz)
+    end = timezone.make_aware(datetime.combine(query.end + timedelta(days=1), time()), tz)
+
+    items = OrderItem.objects.filter(order__created_at__gte=start, order__created_at__lt=end)
+    if query.statuses:
+        items = items.filter(order__status__in=query.statuses)
+    else:
+        items = items.filter(sales.sale_q('order__'))
+    if query.genres:
+        items = items.filter(game__genre_id__in=query.genres)
+    if query.games:
+        items = items.filter(game_id__in=query.games)
+
+    return (
+        items.annotate(bucket=TRUNC[query.bucket]('order__created_at', tzinfo=tz))
+        .values('bucket')
+        .annotate(
+            orders=Count('order', distinct=True),
+            units=Sum('quantity'),
+            revenue=Sum(F('quantity') * F('price')),
+        )
+        .order_by('bucket')
+    )
+
+
+def _series(query):
+    """Ряд по всем интервалам периода, пустые интервалы - нулями"""
+    rows = _rollup_rows(query) if query.uses_rollup() else _order_rows(query)
+    found = {}
+    for row in rows:
+        bucket = row['bucket']
+        if isinstance(bucket, datetime):
+            bucket = timezone.localtime(bucket).replace(tzinfo=None) if timezone.is_aware(bucket) else bucket
+        found[bucket_start(bucket, query.bucket)] = row
+
+    series = []
+    for start in query.buckets():
+        row = found.get(start, {})
+        series.append({
+            'start': start.isoformat(),
+            'orders': row.get('orders') or 0,
+            'units': row.get('units') or 0,
+            'revenue': float(row.get('revenue') or 0),
+        })
+    return series
+
+
+def _totals(series):
+    return {
+        'orders': sum(row['orders'] for row in series),
+        'units': sum(row['units'] for row in series),
+        'revenue': round(sum(row['revenue'] for row in series), 2),
+    }
+
+
+def _change(current, previous):
+    """Изменение к предыдущему периоду в процентах (None, если там был ноль)"""
+    return {
+        key: round((current[key] - previous[key]) * 100 / previous[key], 1) if previous[key] else None
+        for key in current
+    }
+
+
+def compute(query):
+    """Считает аналитику по запросу без кеша"""
+    series = _series(query)
+    result = {'query': query.as_dict(), 'buckets': series, 'totals': _totals(series)}
+    if query.compare:
+        previous = query.previous()
+        previous_series = _series(previous)
+        result['previous'] = {
+            'start': previous.start.isoformat(),
+            'end': previous.end.isoformat(),
+            'buckets': previous_series,
+            'totals': _totals(previous_series),
+        }
+        result['change'] = _change(result['totals'], result['previous']['totals'])
+    return result
+
+
+EMPTY_BUCKET = {'start': '', 'orders': 0, 'units': 0, 'revenue': 0.0}
+
+
+def compare_rows(result):
+    """Интервалы периода рядом с интервалами предыдущего периода с тем же номером.
+
+    Число интервалов у периодов может различаться (недели и месяцы на границах
+    периода, месяцы разной длины): недостающие с любой стороны - нулевые.
+    """
+    return [
+        dict(row, previous=previous)
+        for row, previous in zip_longest(result['buckets'], result['previous']['buckets'], fillvalue=EMPTY_BUCKET)
+    ]
+
+
+def get(query):
+    """Аналитика по запросу через кеш отчетов; прошлые периоды свежи дольше текущих"""
+    if query.end < timezone.localdate():
+        soft_ttl = getattr(settings, 'SALES_ANALYTICS_CLOSED_TTL', 60 * 60)
+    else:
+        soft_ttl = getattr(settings, 'SALES_ANALYTICS_TTL', 60)
+    return report_cache.get(query.cache_key(), lambda: compute(query), soft_ttl)
@@ -0,0 +1,174 @@
+r"""Статические файлы с хешем в имени и заранее сжатыми копиями.
+
+Стили страниц лежат в store/static/store/css/ и подключаются через
+{% static %}, а не встраиваются в каждый HTML-ответ. collectstatic через
+CompressedManifestStaticFilesStorage:
+
+- дает каждому файлу имя с хешем содержимого (base.css -> base.3f2a1b4c5d6e.css)
+  и пишет staticfiles.json, по которому {% static %} подставляет эти имена;
+- рядом с текстовыми файлами кладет сжатые копии base.3f2a1b4c5d6e.css.gz и,
+  если установлен пакет brotli, .br - сжимать при каждом запросе не нужно.
+
+Файл с хешем в имени никогда не меняется. StaticFilesMiddleware отдает
+файлы из STATIC_ROOT при любом DEBUG: выбирает сжатую копию по
+Accept-Encoding и ставит Cache-Control: immutable только именам с хешем из
+staticfiles.json. Если манифеста нет (collectstatic не запускали или он не
+прочитался), {% static %} ссылается на исходные имена, а в журнал пишется
+предупреждение: такие файлы меняются на месте и навсегда не кешируются.
+Если статику раздает веб-сервер, правила должны быть те же, например в nginx:
+
+    location /static/ {
+        alias /path/to/staticfiles/;
+        gzip_static on;
+        brotli_static on;  # модуль ngx_brotli
+        add_header Vary Accept-Encoding;
+        location ~ "\.[0-9a-f]{12}\.[^/.]+$" {
+            add_header Vary Accept-Encoding;
+            add_header Cache-Control "public, max-age=31536000, immutable";
+        }
+    }
+"""
+import gzip
+import logging
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.http import Http404
+from django.views.static import serve
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Что сжимать: текстовые форматы, картинки и шрифты уже сжаты
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.txt', '.xml', '.map', '.html')
+
+# Сжатые копии не меньше исходника на столько процентов не сохраняем
+MIN_SAVING = 5
+
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^/.]+$')
+
+
+def is_hashed(name):
+    return bool(HASHED_NAME.search(name))
+
+
+def _compressors():
+    yield '.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0)
+    if brotli is not None:
+        yield '.br', lambda data: brotli.compress(data, quality=11)
+
+
+def encodings():
+    """Доступные сжатые копии в порядке предпочтения: (кодировка, суффикс)"""
+    return (('br', '.br'), ('gzip', '.gz')) if brotli is not None else (('gzip', '.gz'),)
+
+
+def accepted_encodings(header):
+    """Кодировки из Accept-Encoding, кроме явно запрещенных q=0"""
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        if params.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def compressed_variant(root, path, header):
+    """Путь к сжатой копии path, которую примет клиент, и ее кодировка; иначе (path, None)"""
+    accepted = accepted_encodings(header)
+    for encoding, suffix in encodings():
+        if encoding in accepted and os.path.isfile(os.path.join(root, path + suffix)):
+            return path + suffix, encoding
+    return path, None
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage, который после collectstatic сжимает текстовые файлы"""
+
+    _warned = False
+
+    def stored_name(self, name):
+        # collectstatic еще не запускали (разработка, тесты) - ссылаемся на исходные имена
+        if not self.hashed_files:
+            if not settings.DEBUG and not self._warned:
+                logger.warning('Манифест %s пуст: статика отдается без хешей в именах', self.manifest_name)
+                self._warned = True
+            return name
+        return super().stored_name(name)
+
+    def is_immutable(self, name):
+        """Имя с хешем, записанное collectstatic в манифест, - содержимое под ним не меняется"""
+        if not is_hashed(name):
+            return False
+        if not hasattr(self, '_hashed_names'):
+            self._hashed_names = set(self.hashed_files.values())
+        return name in self._hashed_names
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        # Сжимаем итоговые файлы: исходные имена и имена с хешем
+        names = set(self.hashed_files) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if name.endswith(COMPRESSIBLE) and self.exists(name):
+                self._compress(name)
+
+    def _compress(self, name):
+        with self.open(name) as source:
+            data = source.read()
+        for suffix, compress in _compressors():
+            compressed = compress(data)
+            if len(compressed) * 100 > len(data) * (100 - MIN_SAVING):
+                continue
+            path = self.path(name + suffix)
+            with open(path, 'wb') as output:
+                output.write(compressed)
+
+
+def _is_immutable(path):
+    is_immutable = getattr(staticfiles_storage, 'is_immutable', None)
+    return is_immutable(path) if is_immutable else is_hashed(path)
+
+
+def serve_static(request, path):
+    """Ответ с файлом path из STATIC_ROOT: сжатая копия, если клиент ее примет,
+    и кеширование навсегда для имен с хешем"""
+    root = str(settings.STATIC_ROOT)
+    variant, encoding = compressed_variant(root, path, request.headers.get('Accept-Encoding', ''))
+    response = serve(request, variant, document_root=root)
+    if encoding:
+        # Тип serve() берет по исходному расширению (base.css.gz - text/css), кодировку ставим сами
+        response['Content-Encoding'] = encoding
+    response['Vary'] = 'Accept-Encoding'
+    if response.status_code in (200, 304) and _is_immutable(path):
+        max_age = getattr(settings, 'STATIC_CACHE_MAX_AGE', 365 * 24 * 60 * 60)
+        response['Cache-Control'] = f'public, max-age={max_age}, immutable'
+    return response
+
+
+class StaticFilesMiddleware:
+    """Отдает собранную collectstatic статику, не доходя до сессий и представлений.
+
+    Запросы к файлам, которых нет в STATIC_ROOT, идут дальше как обычно.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = '/' + settings.STATIC_URL.lstrip('/')
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD') and request.path_info.startswith(self.prefix):
+            try:
+                return serve_static(request, request.path_info[len(self.prefix):])
+            except Http404:
+                pass
+        return self.get_response(request)
@@ -0,0 +1,283 @@
+"""Корзина покупателя.
+
+Корзина - словарь {str(game_id): {'quantity': N, 'added_at': ...}}; хранится
+в сессии или в подписанной cookie (store/cart_storage.py, CART_BACKEND).
+CartService загружает все игры корзины одним запросом in_bulk, сверяет
+количество с остатком на складе, считает суммы строк и заказа и пишет
+корзину обратно не больше одного раза за запрос.
+"""
+from django.utils import timezone
+
+from . import cart_storage, reservations
+from .models import Game
+
+# Сколько строк можно изменить одним запросом к API корзины
+MAX_BATCH_LINES = 100
+
+
+def get_cart(request):
+    """Получает корзину из сессии или cookie"""
+    return cart_storage.get(request).load()
+
+
+def save_cart(request, cart):
+    """Сохраняет корзину туда, откуда она была прочитана"""
+    cart_storage.get(request).save(cart)
+
+
+class CartLine:
+    """Строка корзины с загруженной игрой"""
+
+    def __init__(self, game_id, game, quantity, max_quantity):
+        self.game_id = game_id
+        self.game = game
+        self.quantity = quantity
+        self.max_quantity = max_quantity
+
+    @property
+    def total(self):
+        return self.game.price * self.quantity
+
+    def as_dict(self):
+        """Формат, который ожидают шаблоны корзины и оформления заказа"""
+        return {
+            'game': self.game,
+            'quantity': self.quantity,
+            'total': self.total,
+            'game_id': self.game_id,
+            'max_quantity': self.max_quantity,
+        }
+
+
+class CartService:
+    """Корзина текущего запроса: игры, остатки и суммы"""
+
+    def __init__(self, request):
+        self.request = request
+        self.cart = get_cart(request)
+        self.warnings = []
+        self.changed = False
+        self._games = None
+        self._holds = None
+        self.holder = reservations.holder_key(request, create=False)
+
+    # ---------- загрузка ----------
+
+    def _keys(self):
+        ids = {}
+        for key in list(self.cart):
+            try:
+                ids[key] = int(key)
+            except (TypeError, ValueError):
+                # Мусорный ключ в сессии - просто выбрасываем
+                self.cart.pop(key, None)
+                self.changed = True
+        return ids
+
+    @property
+    def games(self):
+        """Игры корзины по id - один запрос на весь запрос пользователя"""
+        if self._games is None:
+            ids = self._keys()
+            self._games = Game.objects.select_related('genre').in_bulk(ids.values()) if ids else {}
+        return self._games
+
+    def get_game(self, game_id):
+        return self.games.get(int(game_id))
+
+    @property
+    def holds(self):
+        """Резервы этой корзины: {game_id: количество}"""
+        if self._holds is None:
+            self._holds = reservations.holds_for(self.holder)
+        return self._holds
+
+    def available_for(self, game):
+        """Сколько штук игры может быть в этой корзине: свободный остаток плюс свой резерв"""
+        return game.available_quantity + self.holds.get(game.pk, 0)
+
+    def hold_limit(self, game_id):
+        """Сколько штук игры корзина может удерживать по лимитам резервов"""
+        return reservations.limit(self.holds, int(game_id))
+
+    # ---------- чтение ----------
+
+    @property
+    def lines(self):
+        """Строки корзины; отсутствующие игры убираются, количество урезается до остатка"""
+        if not hasattr(self, '_lines'):
+            self._lines = self._build_lines()
+        return self._lines
+
+    def _build_lines(self):
+        games = self.games
+        lines = []
+        for key, item in list(self.cart.items()):
+            game = games.get(int(key))
+            if game is None:
+                # Удаляем несуществующий товар из корзины
+                self.cart.pop(key)
+                self.changed = True
+                continue
+
+            quantity = item['quantity']
+            available = self.available_for(game)
+            if quantity > available:
+                if available > 0:
+                    self.warnings.append(f'Только {available} шт. {game.title} доступно')
+                else:
+                    self.warnings.append(f'{game.title} больше нет в наличии')
+                quantity = available
+                item['quantity'] = quantity
+                self.changed = True
+            if quantity <= 0:
+                self.cart.pop(key)
+                self.changed = True
+                continue
+
+            lines.append(CartLine(key, game, quantity, min(available, reservations.max_per_line())))
+        return lines
+
+    @property
+    def total(self):
+        return sum((line.total for line in self.lines), 0)
+
+    def items(self):
+        return [line.as_dict() for line in self.lines]
+
+    def summary(self):
+        """Состояние корзины для JSON API: строки, суммы и предупреждения"""
+        lines = self.lines
+        return {
+            'lines': [
+                {
+                    'game_id': line.game.pk,
+                    'quantity': line.quantity,
+                    'max_quantity': line.max_quantity,
+                    'price': line.game.price,
+                    'total': line.total,
+                }
+                for line in lines
+            ],
+            'total': self.total,
+            'cart_count': len(self),
+            'warnings': self.warnings,
+        }
+
+    def __len__(self):
+        return len(self.cart)
+
+    # ---------- изменение ----------
+
+    def _reset_lines(self):
+        if hasattr(self, '_lines'):
+            del self._lines
+
+    def add(self, game, quantity):
+        """Добавляет игру в корзину. Возвращает текст ошибки или None"""
+        key = str(game.pk)
+        current = self.cart.get(key, {}).get('quantity', 0)
+        if quantity <= 0:
+            return 'Количество должно быть положительным'
+        max_lines = cart_storage.get(self.request).max_lines
+        if key not in self.cart and max_lines is not None and len(self.cart) >= max_lines:
+            return f'В корзине может быть не больше {max_lines} разных игр'
+        limit = self.hold_limit(game.pk)
+        if current + quantity > limit:
+            return f'В корзине может быть не больше {limit} шт. этой игры'
+        # Резервируем остаток на время жизни корзины
+        self.holder = reservations.holder_key(self.request)
+        if not reservations.hold(self.holder, game.pk, current + quantity):
+            return f'Недостаточно товара. Доступно: {self.available_for(game)}'
+        self._remember_hold(game, current + quantity)
+
+        if key in self.cart:
+            self.cart[key]['quantity'] = current + quantity
+        else:
+            self.cart[key] = {
+                'quantity': quantity,
+                'added_at': timezone.now().isoformat(),
+            }
+        if self._games is not None:
+            self._games[game.pk] = game
+        self.changed = True
+        self._reset_lines()
+        return None
+
+    def set_quantity(self, game_id, quantity):
+        """Меняет количество строки; 0 и меньше - удаление.
+
+        Возвращает текст предупреждения, если пришлось урезать до остатка или лимита резервов.
+        """
+        key = str(game_id)
+        if key not in self.cart:
+            return None
+        if quantity <= 0:
+            return self.remove(game_id)
+
+        game = self.get_game(game_id)
+        if game is None:
+            return self.remove(game_id)
+
+        warning = None
+        limit = self.hold_limit(game.pk)
+        if quantity > limit:
+            warning = f'В корзине может быть не больше {limit} шт. {game.title}'
+            quantity = limit
+        available = self.available_for(game)
+        if quantity > available:
+            warning = f'Недостаточно товара. Доступно: {available}'
+            quantity = available
+        self.holder = reservations.holder_key(self.request)
+        if not reservations.hold(self.holder, game.pk, quantity):
+            # Пока считали, остаток успели забрать другие - оставляем прежний резерв
+            quantity = self.holds.get(game.pk, 0)
+            warning = f'Недостаточно товара. Доступно: {quantity}'
+        self._remember_hold(game, quantity)
+        if quantity > 0:
+            self.cart[key]['quantity'] = quantity
+        else:
+            self.cart.pop(key)
+        self.changed = True
+        self._reset_lines()
+        return warning
+
+    def _remember_hold(self, game, quantity):
+        """Запоминает новый резерв и поправляет reserved у уже загруженной игры"""
+        game.reserved += quantity - self.holds.get(game.pk, 0)
+        self.holds[game.pk] = quantity
+
+    def remove(self, game_id):
+        self.cart.pop(str(game_id), None)
+        held = self.holds.pop(int(game_id), None) if self.holder else None
+        if held is not None:
+            reservations.release(self.holder, int(game_id))
+            game = (self._games or {}).get(int(game_id))
+            if game is not None:
+                game.reserved -= held
+        self.changed = True
+        self._reset_lines()
+        return None
+
+    def apply(self, changes):
+        """Применяет пачку изменений [(game_id, количество), ...]; 0 и меньше - удаление.
+
+        Игры, которых нет в корзине, пропускаются. Предупреждения об урезанном
+        количестве копятся в self.warnings.
+        """
+        for game_id, quantity in changes:
+            warning = self.set_quantity(game_id, quantity)
+            if warning:
+                self.warnings.append(warning)
+
+    def clear(self):
+        self.cart.clear()
+        self.changed = True
+        self._reset_lines()
+
+    def save(self):
+        """Пишет корзину в сессию, только если она менялась, и продлевает резервы"""
+        if self.changed:
+            save_cart(self.request, self.cart)
+            reservations.extend(self.holder)
+            self.changed = False
@@ -0,0 +1,169 @@
+"""Где хранится корзина: в сессии или в подписанной cookie.
+
+CART_BACKEND = 'session' - корзина лежит в сессии (строка django_session).
+CART_BACKEND = 'cookie' - у анонимного покупателя корзина хранится в
+подписанной cookie: только id игр, количества и токен резервов корзины,
+поэтому просмотр каталога и корзины не требует сессии вовсе. Вошедший
+покупатель всегда держит корзину в сессии: при входе корзина из cookie
+переносится туда (promote) вместе с токеном резервов, а cookie удаляется.
+
+Выбранное хранилище кешируется на request; cookie выставляет
+CartCookieMiddleware по ответу, только если корзина менялась.
+"""
+import uuid
+
+from django.conf import settings
+
+SESSION_CART_KEY = 'cart'
+SESSION_TOKEN_KEY = 'cart_token'
+
+COOKIE_SALT = 'store.cart'
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def cookie_name():
+    return _setting('CART_COOKIE_NAME', 'cart')
+
+
+def _new_token():
+    return uuid.uuid4().hex
+
+
+class SessionCartStorage:
+    """Корзина в сессии: {str(game_id): {'quantity': N, 'added_at': ...}}"""
+
+    max_lines = None
+
+    def __init__(self, request):
+        self.request = request
+
+    def load(self):
+        return self.request.session.get(SESSION_CART_KEY, {})
+
+    def save(self, cart):
+        self.request.session[SESSION_CART_KEY] = cart
+        self.request.session.modified = True
+
+    def token(self, create=True):
+        token = self.request.session.get(SESSION_TOKEN_KEY)
+        if token is None and create:
+            token = _new_token()
+            self.request.session[SESSION_TOKEN_KEY] = token
+        return token
+
+    def update_response(self, response):
+        pass
+
+
+class CookieCartStorage:
+    """Корзина в подписанной cookie вида "токен|id:количество,id:количество".
+
+    Дата добавления и прочие поля строк в cookie не попадают; число строк
+    ограничено CART_COOKIE_MAX_LINES, чтобы cookie не выросла за предел браузера.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.max_lines = _setting('CART_COOKIE_MAX_LINES', 50)
+        self.changed = False
+        self.cart, self._token = self._decode(request.get_signed_cookie(
+            cookie_name(), default=None, salt=COOKIE_SALT, max_age=_setting('CART_COOKIE_AGE', 14 * 24 * 60 * 60),
+        ))
+
+    def _decode(self, value):
+        if not value or '|' not in value:
+            return {}, None
+        token, _, lines = value.partition('|')
+        cart = {}
+        for line in lines.split(','):
+            game_id, _, quantity = line.partition(':')
+            try:
+                game_id, quantity = int(game_id), int(quantity)
+            except ValueError:
+                continue
+            if game_id > 0 and quantity > 0:
+                cart[str(game_id)] = {'quantity': quantity}
+            if len(cart) >= self.max_lines:
+                break
+        return cart, token or None
+
+    def _encode(self):
+        lines = ','.join(f'{game_id}:{item["quantity"]}' for game_id, item in self.cart.items())
+        return f'{self._token or ""}|{lines}'
+
+    def load(self):
+        return self.cart
+
+    def save(self, cart):
+        self.cart = cart
+        self.changed = True
+
+    def token(self, create=True):
+        if self._token is None and create:
+            self._token = _new_token()
+            self.changed = True
+        return self._token
+
+    def update_response(self, response):
+        if not self.changed:
+            return
+        if not self.cart:
+            response.delete_cookie(cookie_name(), samesite='Lax')
+            return
+        response.set_signed_cookie(
+            cookie_name(), self._encode(), salt=COOKIE_SALT,
+            max_age=_setting('CART_COOKIE_AGE', 14 * 24 * 60 * 60), httponly=True, samesite='Lax',
+        )
+
+
+def get(request):
+    """Хранилище корзины текущего запроса"""
+    storage = getattr(request, '_cart_storage', None)
+    if storage is None:
+        if _setting('CART_BACKEND', 'session') == 'cookie' and not request.user.is_authenticated:
+            storage = CookieCartStorage(request)
+        else:
+            storage = SessionCartStorage(request)
+        request._cart_storage = storage
+    return storage
+
+
+def promote(request):
+    """Переносит корзину из cookie в сессию вошедшего покупателя.
+
+    Строки, которые уже есть в сессионной корзине, не трогаем. Токен резервов
+    переходит в сессию, если у нее своего еще нет, - резервы остаются за покупателем.
+    """
+    storage = getattr(request, '_cart_storage', None)
+    cookie = storage if isinstance(storage, CookieCartStorage) else CookieCartStorage(request)
+    session = SessionCartStorage(request)
+    request._cart_storage = session
+
+    if cookie.cart:
+        cart = session.load()
+        for key, item in cookie.cart.items():
+            cart.setdefault(key, item)
+        session.save(cart)
+    if cookie._token and session.token(create=False) is None:
+        request.session[SESSION_TOKEN_KEY] = cookie._token
+    if cookie_name() in request.COOKIES:
+        request._cart_cookie_promoted = True
+
+
+class CartCookieMiddleware:
+    """Записывает изменившуюся корзину в cookie и удаляет cookie после входа"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        storage = getattr(request, '_cart_storage', None)
+        if getattr(request, '_cart_cookie_promoted', False):
+            response.delete_cookie(cookie_name(), samesite='Lax')
+        elif storage is not None:
+            storage.update_response(response)
+        return response
@@ -0,0 +1,172 @@
+"""Слой запросов к каталогу игр.
+
+Все страницы, которые показывают карточки игр (главная, каталог), берут
+данные отсюда: жанр подтягивается через select_related, теги - одним
+prefetch_related на всю страницу, а листание идет по ключу (keyset/seek),
+а не через OFFSET, поэтому стоимость страницы не зависит от размера каталога.
+"""
+import base64
+import binascii
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .models import Game
+
+
+# Поддерживаемые сортировки: имя -> (поле, по убыванию)
+SORTS = {
+    'title': ('title', False),
+    'newest': ('created_at', True),
+    'price_asc': ('price', False),
+    'price_desc': ('price', True),
+}
+DEFAULT_SORT = 'title'
+# Сортировка результатов поиска по рангу bm25 (только вместе с поиском)
+RELEVANCE = 'relevance'
+PAGE_SIZE = 24
+
+
+class CatalogPage:
+    """Одна страница каталога и курсор на следующую"""
+
+    def __init__(self, games, next_cursor, sort):
+        self.games = games
+        self.next_cursor = next_cursor
+        self.sort = sort
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.games)
+
+    def __len__(self):
+        return len(self.games)
+
+    def __bool__(self):
+        return bool(self.games)
+
+
+def catalog_queryset(in_stock=True):
+    """Игры (по умолчанию только в наличии) со всеми связями, которые нужны карточке"""
+    games = Game.objects.select_related('genre').prefetch_related('tags')
+    if in_stock:
+        games = games.filter(quantity__gt=0)
+    return games
+
+
+def normalize_sort(sort_by):
+    """Возвращает известную сортировку или сортировку по умолчанию"""
+    return sort_by if sort_by in SORTS else DEFAULT_SORT
+
+
+def _dump_value(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def _load_value(field, raw):
+    if field == 'price':
+        return Decimal(raw)
+    if field == 'created_at':
+        value = parse_datetime(raw)
+        if value is None:
+            raise ValueError(raw)
+        return value
+    if not isinstance(raw, str):
+        raise ValueError(raw)
+    return raw
+
+
+def _pack(payload):
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _unpack(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode()))
+
+
+def encode_cursor(game, sort):
+    """Кодирует позицию последней игры страницы в строку для URL"""
+    field, _ = SORTS[sort]
+    return _pack([_dump_value(getattr(game, field)), game.pk])
+
+
+def decode_cursor(cursor, sort):
+    """Разбирает курсор. Для битого курсора возвращает None (первая страница)"""
+    if not cursor:
+        return None
+    field, _ = SORTS[sort]
+    try:
+        value, pk = _unpack(cursor)
+        return _load_value(field, value), int(pk)
+    except (ValueError, TypeError, InvalidOperation, binascii.Error):
+        return None
+
+
+def paginate(queryset, sort=DEFAULT_SORT, cursor=None, per_page=PAGE_SIZE):
+    """Отдает одну страницу queryset, начиная сразу после курсора.
+
+    Порядок всегда дополняется id, чтобы ключ был уникальным и игры с
+    одинаковой ценой/названием не терялись и не дублировались между страницами.
+    """
+    sort = normalize_sort(sort)
+    field, descending = SORTS[sort]
+
+    if descending:
+        queryset = queryset.order_by(f'-{field}', '-id')
+    else:
+        queryset = queryset.order_by(field, 'id')
+
+    position = decode_cursor(cursor, sort)
+    if position is not None:
+        value, pk = position
+        if descending:
+            queryset = queryset.filter(Q(**{f'{field}__lt': value}) | Q(**{field: value, 'id__lt': pk}))
+        else:
+            queryset = queryset.filter(Q(**{f'{field}__gt': value}) | Q(**{field: value, 'id__gt': pk}))
+
+    # Берем на одну запись больше, чтобы узнать, есть ли следующая страница
+    games = list(queryset[:per_page + 1])
+    next_cursor = None
+    if len(games) > per_page:
+        games = games[:per_page]
+        next_cursor = encode_cursor(games[-1], sort)
+
+    return CatalogPage(games, next_cursor, sort)
+
+
+def paginate_ranked(queryset, ranked_ids, cursor=None, per_page=PAGE_SIZE):
+    """Страница результатов поиска в порядке релевантности.
+
+    ranked_ids - уже ограниченный список id от полнотекстового индекса,
+    поэтому курсор здесь - просто смещение в этом списке.
+    """
+    try:
+        offset = max(int(_unpack(cursor)), 0) if cursor else 0
+    except (ValueError, TypeError, binascii.Error):
+        offset = 0
+
+    allowed = set(queryset.filter(id__in=ranked_ids).values_list('id', flat=True))
+    ordered = [pk for pk in ranked_ids if pk in allowed]
+    page_ids = ordered[offset:offset + per_page]
+
+    by_id = queryset.order_by().in_bulk(page_ids)
+    games = [by_id[pk] for pk in page_ids if pk in by_id]
+    next_cursor = _pack(offset + per_page) if len(ordered) > offset + per_page else None
+
+    return CatalogPage(games, next_cursor, RELEVANCE)
+
+
+def featured_games(limit=6):
+    """Игры для главной страницы - новинки в наличии"""
+    return paginate(catalog_queryset(), sort='newest', per_page=limit)
@@ -1,6 +1,9 @@
+from .cart import get_cart
+
+
 def cart_context(request):
     """Добавляет информацию о корзине в контекст всех шаблонов"""
-    cart = request.session.get('cart', {})
+    cart = get_cart(request)
     cart_count = len(cart)
 
     return {
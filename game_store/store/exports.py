@@ -0,0 +1,129 @@
+"""Потоковые выгрузки отчетов в CSV, NDJSON и JSON.
+
+Строки берутся из .values().iterator(chunk_size=...) и сразу уходят клиенту
+через StreamingHttpResponse: память не растет с размером выгрузки, а первый
+байт отправляется до того, как прочитан весь результат. С ?gzip=1 поток
+сжимается на лету и скачивается как .gz-файл.
+"""
+import csv
+import json
+import zlib
+from datetime import datetime
+from decimal import Decimal
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+FORMATS = ('csv', 'ndjson', 'json')
+
+# Строк, читаемых из БД за один раз
+CHUNK_SIZE = 2000
+
+# Сжатые данные отдаются клиенту порциями не меньше этого размера
+GZIP_FLUSH_BYTES = 64 * 1024
+
+
+class _Echo:
+    """Псевдофайл для csv.writer: возвращает строку вместо записи"""
+
+    def write(self, value):
+        return value
+
+
+class _Encoder(DjangoJSONEncoder):
+    """Суммы отдаем числами, как раньше в JsonResponse отчетов"""
+
+    def default(self, o):
+        if isinstance(o, Decimal):
+            return float(o)
+        return super().default(o)
+
+
+def _cell(value):
+    if isinstance(value, datetime):
+        return timezone.localtime(value).strftime('%Y-%m-%d %H:%M')
+    return value
+
+
+def csv_lines(columns, rows):
+    """Строки CSV: заголовок, затем по строке на запись"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow([title for _, title in columns])
+    for row in rows:
+        yield writer.writerow([_cell(row[key]) for key, _ in columns])
+
+
+def ndjson_lines(columns, rows):
+    """По JSON-объекту на строку"""
+    for row in rows:
+        yield json.dumps({key: row[key] for key, _ in columns}, cls=_Encoder, ensure_ascii=False) + '\n'
+
+
+def json_array_lines(columns, rows):
+    """JSON-массив объектов, записываемый по одному элементу"""
+    yield '['
+    separator = ''
+    for row in rows:
+        yield separator + json.dumps({key: row[key] for key, _ in columns}, cls=_Encoder, ensure_ascii=False)
+        separator = ',\n'
+    yield ']\n'
+
+
+def gzip_chunks(chunks):
+    """Сжимает поток строк в gzip, не собирая его целиком"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    buffer = []
+    size = 0
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            buffer.append(data)
+            size += len(data)
+        if size >= GZIP_FLUSH_BYTES:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    buffer.append(compressor.flush())
+    yield b''.join(buffer)
+
+
+def iterate(queryset, chunk_size=CHUNK_SIZE):
+    """Читает queryset порциями, не кешируя результат"""
+    return queryset.iterator(chunk_size=chunk_size)
+
+
+def stream(request, columns, rows, filename, fmt=None):
+    """Потоковый ответ с выгрузкой.
+
+    columns - [(ключ, заголовок), ...]: ключи строк и заголовки CSV.
+    rows - итерируемые словари (обычно iterate(queryset.values(...))).
+    fmt - 'csv', 'ndjson' или 'json'; по умолчанию берется из ?format=.
+    """
+    fmt = fmt or request.GET.get('format', 'csv')
+    if fmt == 'ndjson':
+        chunks = ndjson_lines(columns, rows)
+        content_type = 'application/x-ndjson; charset=utf-8'
+        filename = f'{filename}.ndjson'
+    elif fmt == 'json':
+        chunks = json_array_lines(columns, rows)
+        content_type = 'application/json'
+        filename = f'{filename}.json'
+    else:
+        chunks = csv_lines(columns, rows)
+        content_type = 'text/csv; charset=utf-8'
+        filename = f'{filename}.csv'
+
+    if request.GET.get('gzip') == '1':
+        chunks = gzip_chunks(chunks)
+        content_type = 'application/gzip'
+        filename = f'{filename}.gz'
+    else:
+        chunks = (chunk.encode('utf-8') for chunk in chunks)
+
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['Cache-Control'] = 'no-store'
+    # Не даем прокси (nginx) буферизовать поток целиком
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
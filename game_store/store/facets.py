@@ -0,0 +1,368 @@
+"""Фасетная навигация по каталогу.
+
+Для каждого значения фасета (жанр, тег, ценовой диапазон, наличие) в таблице
+FacetBitmap хранится битовая карта id игр: бит N установлен, если игра с
+id=N подходит под это значение. Карты меняются точечно из сигналов Game и
+Game.tags (store/signals.py), а целиком перестраиваются командой
+rebuild_facets.
+
+Каждый процесс держит копию карт в памяти и на каждом запросе сверяет только
+версии строк, подгружая заново лишь изменившиеся карты. Копия всегда читается
+из основной базы, куда карты и пишутся, а не через маршрутизатор реплики:
+иначе процесс брал бы карты то из основной базы, то из отстающей реплики, и
+счетчики прыгали бы между запросами. Счетчики фасетов - это popcount
+пересечения карт, без COUNT-запросов к базе.
+"""
+import threading
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import router, transaction
+from django.db.models import F, Q
+
+from .models import FacetBitmap, Game, Genre, Tag
+
+# Границы ценовых диапазонов в рублях: [0, 500), [500, 1000), ..., [3000, ∞)
+PRICE_BOUNDS = [0, 500, 1000, 2000, 3000]
+STOCK_KEY = 1
+
+TAG_MODE_AND = 'and'
+TAG_MODE_OR = 'or'
+
+
+def price_bucket(price):
+    """Номер ценового диапазона для цены"""
+    bucket = 0
+    for index, bound in enumerate(PRICE_BOUNDS):
+        if price >= bound:
+            bucket = index
+    return bucket
+
+
+def price_bucket_label(bucket):
+    low = PRICE_BOUNDS[bucket]
+    if bucket + 1 < len(PRICE_BOUNDS):
+        return f'{low} – {PRICE_BOUNDS[bucket + 1]} ₽'
+    return f'от {low} ₽'
+
+
+def price_bucket_q(bucket):
+    """Условие на цену для одного диапазона"""
+    q = Q(price__gte=Decimal(PRICE_BOUNDS[bucket]))
+    if bucket + 1 < len(PRICE_BOUNDS):
+        q &= Q(price__lt=Decimal(PRICE_BOUNDS[bucket + 1]))
+    return q
+
+
+def bits_from_ids(ids):
+    """Собирает битовую карту (int) из набора id"""
+    buffer = bytearray()
+    for pk in ids:
+        byte = pk >> 3
+        if byte >= len(buffer):
+            buffer.extend(bytes(byte - len(buffer) + 1))
+        buffer[byte] |= 1 << (pk & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def _to_bytes(bits):
+    return bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+
+
+def _from_bytes(raw):
+    return int.from_bytes(bytes(raw or b''), 'little')
+
+
+# ==================== ОБНОВЛЕНИЕ КАРТ ====================
+
+def _update_bitmaps(changes):
+    """Применяет изменения {(kind, key): (set_ids, clear_ids)} к картам"""
+    with transaction.atomic():
+        for (kind, key), (set_ids, clear_ids) in changes.items():
+            if not set_ids and not clear_ids:
+                continue
+            bitmap, _ = FacetBitmap.objects.get_or_create(kind=kind, key=key)
+            bits = _from_bytes(bitmap.bits)
+            for pk in set_ids:
+                bits |= 1 << pk
+            for pk in clear_ids:
+                bits &= ~(1 << pk)
+            FacetBitmap.objects.filter(pk=bitmap.pk).update(bits=_to_bytes(bits), version=F('version') + 1)
+
+
+def _facet_keys(state):
+    genre_id, in_stock, price = state
+    keys = [('genre', genre_id), ('price', price_bucket(price))]
+    if in_stock:
+        keys.append(('stock', STOCK_KEY))
+    return set(keys)
+
+
+def apply_game_change(game_id, old_state, new_state):
+    """Переносит изменение игры в карты жанра, цены и наличия.
+
+    Состояние - кортеж (genre_id, в наличии, цена) или None для новой/удаленной игры.
+    """
+    old_keys = _facet_keys(old_state) if old_state else set()
+    new_keys = _facet_keys(new_state) if new_state else set()
+    changes = defaultdict(lambda: (set(), set()))
+    for key in new_keys - old_keys:
+        changes[key][0].add(game_id)
+    for key in old_keys - new_keys:
+        changes[key][1].add(game_id)
+    _update_bitmaps(changes)
+
+
+def apply_tag_change(game_ids, tag_ids, added):
+    """Отмечает игры в картах тегов (added=True) или снимает отметку"""
+    changes = {}
+    for tag_id in tag_ids:
+        changes[('tag', tag_id)] = (set(game_ids), set()) if added else (set(), set(game_ids))
+    _update_bitmaps(changes)
+
+
+def remove_game(game_id):
+    """Снимает игру со всех карт, где она могла остаться"""
+    with transaction.atomic():
+        for bitmap in FacetBitmap.objects.all():
+            bits = _from_bytes(bitmap.bits)
+            if bits >> game_id & 1:
+                FacetBitmap.objects.filter(pk=bitmap.pk).update(
+                    bits=_to_bytes(bits & ~(1 << game_id)), version=F('version') + 1
+                )
+
+
+def sync_stock(game_ids):
+    """Пересчитывает карту наличия для игр, остаток которых менялся через update().
+
+    Карта перезаписывается, только если у какой-то из игр бит действительно
+    поменялся (обычно - когда игра закончилась на складе).
+    """
+    quantities = dict(Game.objects.filter(id__in=game_ids).values_list('id', 'quantity'))
+    bitmap = FacetBitmap.objects.filter(kind='stock', key=STOCK_KEY).values_list('bits', flat=True).first()
+    bits = _from_bytes(bitmap)
+    set_ids = {pk for pk, quantity in quantities.items() if quantity > 0 and not bits >> pk & 1}
+    clear_ids = {pk for pk in game_ids if quantities.get(pk, 0) <= 0 and bits >> pk & 1}
+    _update_bitmaps({('stock', STOCK_KEY): (set_ids, clear_ids)})
+
+
+def drop_facet_value(kind, key):
+    """Удаляет карту значения фасета (например, удаленного тега)"""
+    FacetBitmap.objects.filter(kind=kind, key=key).delete()
+
+
+def touch_facet_value(kind, key):
+    """Повышает версию карты, чтобы процессы перечитали подписи фасетов"""
+    bitmap, created = FacetBitmap.objects.get_or_create(kind=kind, key=key)
+    if not created:
+        FacetBitmap.objects.filter(pk=bitmap.pk).update(version=F('version') + 1)
+
+
+def rebuild():
+    """Перестраивает все карты по текущему каталогу. Возвращает число карт"""
+    ids = defaultdict(list)
+    rows = Game.objects.values_list('id', 'genre_id', 'quantity', 'price').order_by('id')
+    for game_id, genre_id, quantity, price in rows.iterator(chunk_size=5000):
+        ids[('genre', genre_id)].append(game_id)
+        ids[('price', price_bucket(price))].append(game_id)
+        if quantity > 0:
+            ids[('stock', STOCK_KEY)].append(game_id)
+    tag_rows = Game.tags.through.objects.values_list('game_id', 'tag_id')
+    for game_id, tag_id in tag_rows.iterator(chunk_size=5000):
+        ids[('tag', tag_id)].append(game_id)
+    # У жанров и тегов без игр тоже должны быть (пустые) карты - для подписей
+    for genre_id in Genre.objects.values_list('id', flat=True):
+        ids.setdefault(('genre', genre_id), [])
+    for tag_id in Tag.objects.values_list('id', flat=True):
+        ids.setdefault(('tag', tag_id), [])
+
+    with transaction.atomic():
+        FacetBitmap.objects.all().delete()
+        FacetBitmap.objects.bulk_create([
+            FacetBitmap(kind=kind, key=key, bits=_to_bytes(bits_from_ids(game_ids)), version=1)
+            for (kind, key), game_ids in ids.items()
+        ])
+    return len(ids)
+
+
+# ==================== ЧТЕНИЕ ====================
+
+class FacetIndex:
+    """Копия битовых карт в памяти процесса"""
+
+    def __init__(self):
+        # База, из которой загружены карты: версии сверяются только с ней
+        self.alias = None
+        self.versions = {}
+        self.bitmaps = {}
+        self.genres = []
+        self.tags = []
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        """Подгружает карты, версии которых изменились с прошлого запроса"""
+        alias = router.db_for_write(FacetBitmap)
+        versions = {
+            (kind, key): (pk, version)
+            for pk, kind, key, version in FacetBitmap.objects.using(alias).values_list('pk', 'kind', 'key', 'version')
+        }
+        with self.lock:
+            if alias != self.alias:
+                self.alias, self.versions, self.bitmaps = alias, {}, {}
+            changed = [pk for key, (pk, version) in versions.items() if self.versions.get(key) != (pk, version)]
+            removed = set(self.versions) - set(versions)
+            if not changed and not removed:
+                return
+
+            bitmaps = FacetBitmap.objects.using(alias).filter(pk__in=changed)
+            for kind, key, bits in bitmaps.values_list('kind', 'key', 'bits'):
+                self.bitmaps[(kind, key)] = _from_bytes(bits)
+            for key in removed:
+                self.bitmaps.pop(key, None)
+
+            labels_changed = any(kind in ('genre', 'tag') for kind, _ in removed) or any(
+                kind in ('genre', 'tag') and self.versions.get((kind, key)) != value
+                for (kind, key), value in versions.items()
+            )
+            self.versions = versions
+            if labels_changed or not (self.genres or self.tags):
+                self.genres = list(Genre.objects.using(alias).order_by('name').values_list('id', 'name'))
+                self.tags = list(Tag.objects.using(alias).order_by('name').values_list('id', 'name'))
+
+    def get(self, kind, key):
+        return self.bitmaps.get((kind, key), 0)
+
+    def union(self, kind, keys):
+        bits = 0
+        for key in keys:
+            bits |= self.get(kind, key)
+        return bits
+
+    @property
+    def universe(self):
+        """Все игры каталога (у каждой игры ровно один жанр)"""
+        return self.union('genre', [pk for pk, _ in self.genres])
+
+
+_index = FacetIndex()
+
+
+def get_index():
+    """Индекс фасетов текущего процесса, сверенный с базой"""
+    _index.refresh()
+    return _index
+
+
+class Selection:
+    """Выбранные пользователем значения фасетов"""
+
+    def __init__(self, genres=(), tags=(), tag_mode=TAG_MODE_AND, prices=(), in_stock=True):
+        self.genres = list(genres)
+        self.tags = list(tags)
+        self.tag_mode = tag_mode
+        self.prices = list(prices)
+        self.in_stock = in_stock
+
+    @classmethod
+    def from_query(cls, params):
+        def ints(name, limit=None):
+            values = []
+            for raw in params.getlist(name):
+                try:
+                    value = int(raw)
+                except (TypeError, ValueError):
+                    continue
+                if value >= 0 and (limit is None or value < limit) and value not in values:
+                    values.append(value)
+            return values
+
+        tag_mode = params.get('tag_mode')
+        return cls(
+            genres=ints('genre'),
+            tags=ints('tag'),
+            tag_mode=tag_mode if tag_mode in (TAG_MODE_AND, TAG_MODE_OR) else TAG_MODE_AND,
+            prices=ints('price', limit=len(PRICE_BOUNDS)),
+            in_stock=params.get('stock') != 'all',
+        )
+
+    def filter_queryset(self, queryset):
+        """Применяет выбор к queryset игр (для выдачи страницы)"""
+        through = Game.tags.through.objects
+        if self.in_stock:
+            queryset = queryset.filter(quantity__gt=0)
+        if self.genres:
+            queryset = queryset.filter(genre_id__in=self.genres)
+        if self.tags and self.tag_mode == TAG_MODE_OR:
+            queryset = queryset.filter(id__in=through.filter(tag_id__in=self.tags).values('game_id'))
+        elif self.tags:
+            for tag_id in self.tags:
+                queryset = queryset.filter(id__in=through.filter(tag_id=tag_id).values('game_id'))
+        if self.prices:
+            q = Q()
+            for bucket in self.prices:
+                q |= price_bucket_q(bucket)
+            queryset = queryset.filter(q)
+        return queryset
+
+
+class FacetCounts:
+    """Результат фасетного поиска: число найденных игр и счетчики значений"""
+
+    def __init__(self, total, genres, tags, prices, in_stock):
+        self.total = total
+        self.genres = genres
+        self.tags = tags
+        self.prices = prices
+        self.in_stock = in_stock
+
+
+def count(selection, restrict=None, index=None):
+    """Считает игры и значения фасетов для выбора.
+
+    restrict - необязательная битовая карта (например, совпадения поиска).
+    Для фасетов с выбором "ИЛИ" счетчик значения считается без учета выбора
+    в самом этом фасете, чтобы было видно, сколько игр добавит значение.
+    """
+    index = index or get_index()
+    base = index.universe if restrict is None else index.universe & restrict
+
+    stock_bits = index.get('stock', STOCK_KEY)
+    genre_bits = index.union('genre', selection.genres) if selection.genres else None
+    price_bits = index.union('price', selection.prices) if selection.prices else None
+    if selection.tags and selection.tag_mode == TAG_MODE_OR:
+        tag_bits = index.union('tag', selection.tags)
+    elif selection.tags:
+        tag_bits = -1
+        for tag_id in selection.tags:
+            tag_bits &= index.get('tag', tag_id)
+    else:
+        tag_bits = None
+
+    def matching(skip=None):
+        bits = base
+        if selection.in_stock and skip != 'stock':
+            bits &= stock_bits
+        if genre_bits is not None and skip != 'genre':
+            bits &= genre_bits
+        if tag_bits is not None and skip != 'tag':
+            bits &= tag_bits
+        if price_bits is not None and skip != 'price':
+            bits &= price_bits
+        return bits
+
+    result = matching()
+    without_genre = matching('genre')
+    without_price = matching('price')
+    # В режиме "И" каждый следующий тег сужает выдачу, в режиме "ИЛИ" - расширяет
+    tags_base = result if selection.tag_mode == TAG_MODE_AND else matching('tag')
+
+    return FacetCounts(
+        total=result.bit_count(),
+        genres=[(pk, name, (without_genre & index.get('genre', pk)).bit_count()) for pk, name in index.genres],
+        tags=[(pk, name, (tags_base & index.get('tag', pk)).bit_count()) for pk, name in index.tags],
+        prices=[
+            (bucket, price_bucket_label(bucket), (without_price & index.get('price', bucket)).bit_count())
+            for bucket in range(len(PRICE_BOUNDS))
+        ],
+        in_stock=(matching('stock') & stock_bits).bit_count(),
+    )
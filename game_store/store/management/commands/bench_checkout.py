@@ -0,0 +1,115 @@
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection
+from django.db.models import Sum
+
+from store import orders
+from store.models import Customer, Game, Genre, Order, OrderItem
+
+
+def legacy_checkout(customer, game_id, quantity):
+    """Старый алгоритм оформления: проверка и списание без транзакции"""
+    game = Game.objects.get(id=game_id)
+    if quantity > game.quantity:
+        raise orders.OutOfStock(game, quantity)
+    order = Order.objects.create(customer=customer, total_amount=0)
+    OrderItem.objects.create(order=order, game=game, quantity=quantity, price=game.price)
+    game.quantity -= quantity
+    game.save()
+    order.total_amount = game.price * quantity
+    order.save()
+    return order
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест оформления заказа: много покупателей одновременно '
+            'раскупают одну игру. Показывает заказы/с и проверяет, что нет перепродажи. '
+            'Создает временные данные в текущей базе и удаляет их после прогона.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buyers', type=int, default=16, help='Число параллельных покупателей')
+        parser.add_argument('--stock', type=int, default=200, help='Начальный остаток игры')
+        parser.add_argument('--attempts', type=int, default=25, help='Попыток покупки на покупателя')
+        parser.add_argument('--quantity', type=int, default=1, help='Штук в одном заказе')
+        parser.add_argument('--legacy', action='store_true',
+                            help='Прогнать старый алгоритм (без транзакции) для сравнения')
+
+    def handle(self, *args, **options):
+        buyers = options['buyers']
+        stock = options['stock']
+        quantity = options['quantity']
+        prefix = f'bench-{uuid.uuid4().hex[:8]}'
+
+        genre = Genre.objects.create(name=prefix)
+        game = Game.objects.create(
+            title=prefix, description='Нагрузочный тест', price=Decimal('100.00'),
+            quantity=stock, genre=genre,
+        )
+        customers = []
+        for index in range(buyers):
+            user = User.objects.create_user(f'{prefix}-{index}')
+            customers.append(Customer.objects.create(user=user))
+
+        stats = {'ok': 0, 'sold_out': 0, 'errors': 0}
+        stats_lock = threading.Lock()
+        barrier = threading.Barrier(buyers)
+
+        def buyer(customer):
+            counts = {'ok': 0, 'sold_out': 0, 'errors': 0}
+            try:
+                barrier.wait()
+                for _ in range(options['attempts']):
+                    try:
+                        if options['legacy']:
+                            legacy_checkout(customer, game.pk, quantity)
+                        else:
+                            orders.place_order(customer, [(game, quantity)])
+                        counts['ok'] += 1
+                    except orders.OutOfStock:
+                        counts['sold_out'] += 1
+                    except DatabaseError:
+                        counts['errors'] += 1
+            finally:
+                connection.close()
+                with stats_lock:
+                    for key, value in counts.items():
+                        stats[key] += value
+
+        threads = [threading.Thread(target=buyer, args=(customer,)) for customer in customers]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        try:
+            sold = OrderItem.objects.filter(game=game).aggregate(total=Sum('quantity'))['total'] or 0
+            remaining = Game.objects.get(pk=game.pk).quantity
+            oversold = max(sold - stock, 0)
+            lost_updates = sold - (stock - remaining)
+
+            mode = 'старый алгоритм' if options['legacy'] else 'транзакция + условный UPDATE'
+            self.stdout.write(f'Режим: {mode}')
+            self.stdout.write(f'Покупателей: {buyers}, попыток: {buyers * options["attempts"]}, '
+                              f'остаток в начале: {stock}')
+            self.stdout.write(f'Заказов оформлено: {stats["ok"]} за {elapsed:.2f} с '
+                              f'({stats["ok"] / elapsed:.1f} заказов/с)')
+            self.stdout.write(f'Отказов "нет в наличии": {stats["sold_out"]}, ошибок БД: {stats["errors"]}')
+            self.stdout.write(f'Продано штук: {sold}, осталось на складе: {remaining}')
+            if oversold or lost_updates:
+                self.stdout.write(self.style.ERROR(
+                    f'Перепродано: {oversold} шт., потерянных списаний: {lost_updates}'
+                ))
+            else:
+                self.stdout.write(self.style.SUCCESS('Перепродаж нет, остаток сходится с продажами'))
+        finally:
+            Order.objects.filter(customer__in=customers).delete()
+            game.delete()
+            genre.delete()
+            User.objects.filter(username__startswith=f'{prefix}-').delete()
@@ -0,0 +1,151 @@
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connections, transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from store import sqlite
+from store.models import Game
+
+
+def copy_database(path, journal_mode):
+    """Копия текущей базы через backup API - бенчмарк не трогает рабочие данные"""
+    source = connections['default']
+    source.ensure_connection()
+    target = sqlite3.connect(path)
+    try:
+        source.connection.backup(target)
+        target.execute(f'PRAGMA journal_mode = {journal_mode}')
+    finally:
+        target.close()
+
+
+def read_catalog(alias):
+    """Чтение как у страницы каталога: первая страница игр в наличии"""
+    list(Game.objects.using(alias).filter(quantity__gt=0).select_related('genre').order_by('title', 'id')[:25])
+
+
+def write_session(alias, key):
+    """Запись как у сохранения сессии на каждом запросе"""
+    with transaction.atomic(using=alias):
+        Session.objects.using(alias).update_or_create(
+            session_key=key,
+            defaults={'session_data': uuid.uuid4().hex * 8, 'expire_date': timezone.now() + timedelta(days=14)},
+        )
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест SQLite: параллельные чтения каталога и записи сессий на копии базы '
+            'с настройками SQLite по умолчанию и с профилем store/sqlite.py (WAL, PRAGMA, BEGIN IMMEDIATE). '
+            'Показывает операции/с, задержки и число ошибок "database is locked".')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8, help='Потоков чтения')
+        parser.add_argument('--writers', type=int, default=4, help='Потоков записи')
+        parser.add_argument('--seconds', type=float, default=5, help='Длительность каждого прогона')
+        parser.add_argument('--only', choices=['default', 'profile'], help='Прогнать только один режим')
+
+    def handle(self, *args, **options):
+        if connections['default'].vendor != 'sqlite':
+            raise CommandError('Бенчмарк рассчитан на базу SQLite')
+
+        modes = [options['only']] if options['only'] else ['default', 'profile']
+        results = {}
+        with tempfile.TemporaryDirectory(prefix='bench-sqlite-') as directory:
+            for mode in modes:
+                path = os.path.join(directory, f'{mode}.sqlite3')
+                copy_database(path, 'WAL' if mode == 'profile' else 'DELETE')
+                results[mode] = self.run(mode, path, options)
+
+        if len(results) == 2:
+            default, profile = results['default'], results['profile']
+            for kind in ('reads', 'writes'):
+                if default[kind]:
+                    self.stdout.write(self.style.SUCCESS(
+                        f'{"Чтения" if kind == "reads" else "Записи"}: '
+                        f'в {profile[kind] / default[kind]:.1f} раза больше операций/с с профилем'
+                    ))
+
+    def run(self, mode, path, options):
+        alias = f'bench-sqlite-{mode}'
+        connections.settings[alias] = {**connections['default'].settings_dict, 'NAME': path}
+        stats = {'reads': [], 'writes': [], 'errors': 0}
+        stats_lock = threading.Lock()
+        workers = options['readers'] + options['writers']
+        barrier = threading.Barrier(workers + 1)
+        deadline = []
+
+        def worker(kind, index):
+            latencies, errors = [], 0
+            key = f'bench{index:04d}{uuid.uuid4().hex[:24]}'
+            try:
+                barrier.wait()
+                while time.perf_counter() < deadline[0]:
+                    started = time.perf_counter()
+                    try:
+                        if kind == 'reads':
+                            read_catalog(alias)
+                        else:
+                            write_session(alias, key)
+                    except DatabaseError:
+                        errors += 1
+                        continue
+                    latencies.append(time.perf_counter() - started)
+            finally:
+                connections[alias].close()
+                with stats_lock:
+                    stats[kind].extend(latencies)
+                    stats['errors'] += errors
+
+        settings_override = override_settings(SQLITE_CONNECTION_PROFILE=(mode == 'profile'))
+        settings_override.enable()
+        try:
+            threads = [threading.Thread(target=worker, args=('reads', index)) for index in range(options['readers'])]
+            threads += [
+                threading.Thread(target=worker, args=('writes', index)) for index in range(options['writers'])
+            ]
+            for thread in threads:
+                thread.start()
+            deadline.append(time.perf_counter() + options['seconds'])
+            barrier.wait()
+            for thread in threads:
+                thread.join()
+
+            connection = connections[alias]
+            pragmas = sqlite.current_pragmas(connection)
+            connection.close()
+        finally:
+            settings_override.disable()
+            del connections.settings[alias]
+
+        seconds = options['seconds']
+        title = 'настройки SQLite по умолчанию' if mode == 'default' else 'профиль store/sqlite.py'
+        self.stdout.write(self.style.MIGRATE_HEADING(f'Режим: {title}'))
+        self.stdout.write('PRAGMA: ' + ', '.join(f'{name}={value}' for name, value in pragmas.items()))
+        for kind, label in (('reads', 'Чтения каталога'), ('writes', 'Записи сессий')):
+            latencies = sorted(stats[kind])
+            if not latencies:
+                self.stdout.write(f'{label}: ни одной успешной операции')
+                continue
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            self.stdout.write(
+                f'{label}: {len(latencies)} за {seconds:g} с ({len(latencies) / seconds:.0f} оп/с), '
+                f'медиана {statistics.median(latencies) * 1000:.1f} мс, p95 {p95 * 1000:.1f} мс'
+            )
+        if stats['errors']:
+            self.stdout.write(self.style.ERROR(f'Ошибок "database is locked": {stats["errors"]}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Ошибок блокировки нет'))
+        return {
+            'reads': len(stats['reads']) / seconds,
+            'writes': len(stats['writes']) / seconds,
+        }
@@ -0,0 +1,54 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Q
+
+from store import renditions
+from store.models import Game
+
+
+class Command(BaseCommand):
+    help = ('Строит уменьшенные копии изображений игр (WebP и JPEG нескольких ширин) '
+            'и заглушки для первой отрисовки в пуле процессов и записывает результат '
+            'в поля Game.IMAGE_META_FIELDS. По умолчанию обрабатывает только игры '
+            'без копий или без заглушки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Перестроить копии для всех игр')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Число процессов')
+
+    def handle(self, *args, **options):
+        games = Game.objects.exclude(image='').exclude(image__isnull=True)
+        if not options['all']:
+            games = games.filter(Q(image_renditions=[]) | Q(image_placeholder=''))
+
+        # Одно изображение может быть у нескольких игр - обрабатываем файл один раз
+        game_ids = {}
+        for game_id, name in games.values_list('id', 'image'):
+            game_ids.setdefault(name, []).append(game_id)
+        if not game_ids:
+            self.stdout.write(self.style.SUCCESS('Все изображения уже обработаны'))
+            return
+
+        # Дочерние процессы не должны унаследовать открытые соединения с БД
+        connections.close_all()
+        started = time.perf_counter()
+        done = failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            futures = [pool.submit(renditions.process_safely, name) for name in game_ids]
+            for future in as_completed(futures):
+                name, meta, error = future.result()
+                if error:
+                    failed += 1
+                    self.stdout.write(self.style.ERROR(f'{name}: {error}'))
+                    continue
+                Game.objects.filter(id__in=game_ids[name]).update(**meta)
+                done += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано изображений: {done}, с ошибками: {failed} '
+            f'за {time.perf_counter() - started:.1f} с ({options["workers"]} процессов)'
+        ))
@@ -0,0 +1,89 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from store import renditions, storage
+from store.models import Game
+
+
+class Command(BaseCommand):
+    help = ('Переносит изображения игр в имена по хешу содержимого (store/storage.py): '
+            'одинаковые файлы сливаются в один, уменьшенные копии переименовываются '
+            'вслед за оригиналом, Game.image обновляется.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete-old', action='store_true',
+                            help='Удалить старые файлы, на которые больше не ссылается ни одна игра')
+        parser.add_argument('--dry-run', action='store_true', help='Только показать, что будет перенесено')
+
+    def _size(self, name):
+        try:
+            return default_storage.size(name)
+        except OSError:
+            return 0
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, storage.ContentAddressedStorage):
+            raise CommandError('STORAGES["default"] должно быть store.storage.ContentAddressedStorage')
+
+        # Старое имя -> игры с ним и построенные для него ширины
+        games = {}
+        for game_id, name, built in Game.objects.exclude(image='').values_list('id', 'image', 'image_renditions'):
+            if not storage.is_addressed(name):
+                entry = games.setdefault(name, ([], built or []))
+                entry[0].append(game_id)
+        if not games:
+            self.stdout.write(self.style.SUCCESS('Все изображения уже хранятся по хешу'))
+            return
+
+        moved = {}
+        missing = 0
+        for old_name, (game_ids, built) in games.items():
+            if not default_storage.exists(old_name):
+                missing += 1
+                self.stdout.write(self.style.WARNING(f'{old_name}: файла нет, игры {game_ids} пропущены'))
+                continue
+            with default_storage.open(old_name) as content:
+                new_name = storage.addressed_name(old_name, content)
+                if not options['dry_run']:
+                    new_name = default_storage.save(new_name, content)
+            moved[old_name] = new_name
+            self.stdout.write(f'{old_name} -> {new_name}')
+            if options['dry_run']:
+                continue
+
+            for width in built:
+                for ext in renditions.FORMATS:
+                    source = renditions.rendition_name(old_name, width, ext)
+                    if default_storage.exists(source):
+                        with default_storage.open(source) as content:
+                            default_storage.save_exact(renditions.rendition_name(new_name, width, ext), content)
+            # update() в обход save(): файл уже на месте, копии строить заново не нужно
+            Game.objects.filter(id__in=game_ids).update(image=new_name)
+
+        before = sum(self._size(name) for name in moved)
+        after = sum(self._size(name) for name in set(moved.values()))
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Будет перенесено файлов: {len(moved)} -> {len(set(moved.values()))} уникальных'
+            ))
+            return
+
+        deleted = 0
+        if options['delete_old']:
+            still_used = set(Game.objects.filter(image__in=list(moved)).values_list('image', flat=True))
+            for old_name, (_, built) in games.items():
+                if old_name not in moved or old_name in still_used:
+                    continue
+                names = [old_name] + [
+                    renditions.rendition_name(old_name, width, ext) for width in built for ext in renditions.FORMATS
+                ]
+                for name in names:
+                    if default_storage.exists(name):
+                        default_storage.delete(name)
+                        deleted += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено файлов: {len(moved)} -> {len(set(moved.values()))} уникальных, '
+            f'оригиналы: {before / 1024:.0f} КБ -> {after / 1024:.0f} КБ, '
+            f'удалено старых файлов: {deleted}, без файла: {missing}'
+        ))
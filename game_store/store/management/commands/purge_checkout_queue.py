@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store import admission
+
+
+class Command(BaseCommand):
+    help = 'Удаляет истекшие и брошенные места в очереди на оформление заказа'
+
+    def handle(self, *args, **options):
+        purged = admission.purge_stale()
+        self.stdout.write(self.style.SUCCESS(f'Удалено мест в очереди: {purged}'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store import facets
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает битовые карты фасетов каталога (жанры, теги, цены, наличие)'
+
+    def handle(self, *args, **options):
+        total = facets.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Построено битовых карт: {total}'))
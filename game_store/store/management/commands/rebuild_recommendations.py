@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from store import recommendations
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает матрицу совместных покупок (CoPurchase) и списки '
+            '"С этой игрой покупают" (GameNeighbor) по истории оплаченных заказов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Размер пачки bulk_create')
+
+    def handle(self, *args, **options):
+        cells, neighbors = recommendations.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Пар игр в матрице: {cells}, рекомендаций: {neighbors}'))
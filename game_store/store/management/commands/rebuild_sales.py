@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from store import sales
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает сводку продаж по дням (SalesDaily) по истории оплаченных заказов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Размер пачки bulk_create')
+
+    def handle(self, *args, **options):
+        rows = sales.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Строк в сводке продаж: {rows}'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store import search
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс игр (SQLite FTS5)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Размер пачки при вставке')
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError('Полнотекстовый индекс поддерживается только на SQLite')
+
+        total = search.rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано игр: {total}'))
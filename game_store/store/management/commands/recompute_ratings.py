@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from store import ratings
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает агрегаты рейтинга игр по одобренным отзывам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Размер пачки bulk_update')
+
+    def handle(self, *args, **options):
+        updated = ratings.recompute_all(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Пересчитан рейтинг игр: {updated}'))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store import replica
+
+
+class Command(BaseCommand):
+    help = ('Обновляет реплику базы (REPLICA_DATABASE) копией основной через backup API SQLite '
+            'и пишет отметку времени для измерения отставания. '
+            'По умолчанию работает постоянно; с --once обновляет реплику один раз.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Обновить реплику один раз и выйти')
+        parser.add_argument('--interval', type=float, default=30, help='Пауза между обновлениями, сек')
+
+    def handle(self, *args, **options):
+        if not replica.configured():
+            raise CommandError(f'В DATABASES нет базы "{replica.alias()}"')
+        while True:
+            started = time.perf_counter()
+            lag = replica.refresh()
+            self.stdout.write(
+                f'Реплика обновлена за {time.perf_counter() - started:.2f} с, отставание {lag or 0:.2f} с'
+            )
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS('Реплика обновлена'))
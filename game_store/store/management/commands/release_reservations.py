@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from store import reservations
+
+
+class Command(BaseCommand):
+    help = 'Снимает просроченные резервы товара в корзинах (запускать по расписанию, например раз в минуту)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Резервов в одной транзакции')
+
+    def handle(self, *args, **options):
+        released = reservations.release_expired(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Снято просроченных резервов: {released}'))
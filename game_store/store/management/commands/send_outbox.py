@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store import outbox
+
+
+class Command(BaseCommand):
+    help = ('Отправляет письма из очереди (OutboxEmail) пачками через одно SMTP-соединение. '
+            'По умолчанию работает постоянно; с --once разбирает очередь и завершается.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Разобрать очередь один раз и выйти')
+        parser.add_argument('--batch-size', type=int, default=100, help='Писем в одной пачке')
+        parser.add_argument('--interval', type=float, default=5, help='Пауза между проверками очереди, сек')
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        while True:
+            try:
+                sent, failed = outbox.send_batch(batch_size=options['batch_size'])
+            except Exception as e:
+                # Сбой базы или соединения не должен останавливать обработчик
+                self.stderr.write(self.style.ERROR(f'Ошибка при отправке пачки: {e}'))
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+                continue
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                self.stdout.write(f'Отправлено: {sent}, ошибок: {failed}')
+            if sent + failed == options['batch_size']:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f'Всего отправлено писем: {total_sent}, ошибок: {total_failed}'))
@@ -0,0 +1,41 @@
+# Полнотекстовый индекс игр (SQLite FTS5)
+
+from django.db import migrations
+
+FTS_TABLE = 'store_game_fts'
+
+
+def create_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Game = apps.get_model('store', 'Game')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"title, description, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        rows = [
+            (game_id, title.replace('ё', 'е').replace('Ё', 'Е'), description.replace('ё', 'е').replace('Ё', 'Е'))
+            for game_id, title, description in Game.objects.values_list('id', 'title', 'description')
+        ]
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, description) VALUES (%s, %s, %s)', rows
+        )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0003_order_payment_code_order_payment_method_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
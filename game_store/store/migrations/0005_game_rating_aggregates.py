@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:27
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def fill_rating_aggregates(apps, schema_editor):
+    Game = apps.get_model('store', 'Game')
+    Review = apps.get_model('store', 'Review')
+
+    annotations = {'total': Sum('rating'), 'count': Count('id')}
+    for stars in range(1, 6):
+        annotations[f'count_{stars}'] = Count('id', filter=Q(rating=stars))
+
+    rows = Review.objects.filter(is_approved=True).values('game_id').annotate(**annotations).order_by()
+    for row in rows:
+        Game.objects.filter(pk=row['game_id']).update(
+            rating_sum=row['total'],
+            rating_count=row['count'],
+            **{f'rating_{stars}': row[f'count_{stars}'] for stars in range(1, 6)},
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0004_game_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='rating_1',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Оценок 1'),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='rating_2',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Оценок 2'),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='rating_3',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Оценок 3'),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='rating_4',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Оценок 4'),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='rating_5',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Оценок 5'),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество оценок'),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Сумма оценок'),
+        ),
+        migrations.RunPython(fill_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:30
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+PRICE_BOUNDS = [0, 500, 1000, 2000, 3000]
+
+
+def _to_bytes(ids):
+    buffer = bytearray((max(ids) >> 3) + 1 if ids else 0)
+    for pk in ids:
+        buffer[pk >> 3] |= 1 << (pk & 7)
+    return bytes(buffer)
+
+
+def build_facet_bitmaps(apps, schema_editor):
+    Game = apps.get_model('store', 'Game')
+    Genre = apps.get_model('store', 'Genre')
+    Tag = apps.get_model('store', 'Tag')
+    FacetBitmap = apps.get_model('store', 'FacetBitmap')
+
+    ids = defaultdict(list)
+    for pk in Genre.objects.values_list('id', flat=True):
+        ids.setdefault(('genre', pk), [])
+    for pk in Tag.objects.values_list('id', flat=True):
+        ids.setdefault(('tag', pk), [])
+    for game_id, genre_id, quantity, price in Game.objects.values_list('id', 'genre_id', 'quantity', 'price'):
+        bucket = max(index for index, bound in enumerate(PRICE_BOUNDS) if price >= bound)
+        ids[('genre', genre_id)].append(game_id)
+        ids[('price', bucket)].append(game_id)
+        if quantity > 0:
+            ids[('stock', 1)].append(game_id)
+    for game_id, tag_id in Game.tags.through.objects.values_list('game_id', 'tag_id'):
+        ids[('tag', tag_id)].append(game_id)
+
+    FacetBitmap.objects.bulk_create([
+        FacetBitmap(kind=kind, key=key, bits=_to_bytes(game_ids), version=1)
+        for (kind, key), game_ids in ids.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0005_game_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FacetBitmap',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('genre', 'Жанр'), ('tag', 'Тег'), ('price', 'Ценовой диапазон'), ('stock', 'Наличие')], max_length=10, verbose_name='Тип фасета')),
+                ('key', models.PositiveBigIntegerField(verbose_name='Значение фасета')),
+                ('bits', models.BinaryField(default=b'', verbose_name='Битовая карта')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='Версия')),
+            ],
+            options={
+                'verbose_name': 'Битовая карта фасета',
+                'verbose_name_plural': 'Битовые карты фасетов',
+                'unique_together': {('kind', 'key')},
+            },
+        ),
+        migrations.RunPython(build_facet_bitmaps, migrations.RunPython.noop),
+    ]
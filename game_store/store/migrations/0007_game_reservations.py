@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_facet_bitmaps'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='reserved',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Зарезервировано'),
+        ),
+        migrations.CreateModel(
+            name='Reservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('holder', models.CharField(max_length=32, verbose_name='Корзина')),
+                ('quantity', models.PositiveIntegerField(verbose_name='Количество')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='Действует до')),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='store.game', verbose_name='Игра')),
+            ],
+            options={
+                'verbose_name': 'Резерв',
+                'verbose_name_plural': 'Резервы',
+                'unique_together': {('holder', 'game')},
+            },
+        ),
+    ]
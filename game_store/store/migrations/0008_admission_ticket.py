@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_game_reservations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdmissionTicket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=32, unique=True, verbose_name='Токен посетителя')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Встал в очередь')),
+                ('admitted_at', models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Допущен')),
+                ('last_seen', models.DateTimeField(db_index=True, verbose_name='Последняя активность')),
+            ],
+            options={
+                'verbose_name': 'Место в очереди',
+                'verbose_name_plural': 'Очередь на оформление',
+            },
+        ),
+    ]
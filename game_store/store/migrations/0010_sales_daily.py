@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def fill_sales_daily(apps, schema_editor):
+    Order = apps.get_model('store', 'Order')
+    OrderItem = apps.get_model('store', 'OrderItem')
+    SalesDaily = apps.get_model('store', 'SalesDaily')
+
+    paid = Order.objects.filter(~Q(status='cancelled') & (Q(status='completed') | Q(payment_status='completed')))
+    items = OrderItem.objects.filter(order__in=paid).annotate(
+        day=TruncDate('order__created_at', tzinfo=timezone.get_current_timezone())
+    )
+    aggregates = {'units': Sum('quantity'), 'revenue': Sum(F('quantity') * F('price')), 'orders': Count('order', distinct=True)}
+    rows = [SalesDaily(**row) for row in items.values('game_id', 'day').annotate(**aggregates).order_by()]
+    rows += [SalesDaily(game_id=None, **row) for row in items.values('day').annotate(**aggregates).order_by()]
+    SalesDaily.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_outbox_email'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('units', models.IntegerField(default=0, verbose_name='Продано копий')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Выручка')),
+                ('orders', models.IntegerField(default=0, verbose_name='Заказов')),
+                ('game', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='store.game', verbose_name='Игра')),
+            ],
+            options={
+                'verbose_name': 'Продажи за день',
+                'verbose_name_plural': 'Продажи по дням',
+                'indexes': [models.Index(fields=['day'], name='store_sales_day_597b77_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('game__isnull', False)), fields=('game', 'day'), name='sales_daily_game_day'), models.UniqueConstraint(condition=models.Q(('game__isnull', True)), fields=('day',), name='sales_daily_total_day')],
+            },
+        ),
+        migrations.RunPython(fill_sales_daily, migrations.RunPython.noop),
+    ]
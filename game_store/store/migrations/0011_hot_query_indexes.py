@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0010_sales_daily'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='salesdaily',
+            name='store_sales_day_597b77_idx',
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(condition=models.Q(('quantity__gt', 0)), fields=['title', 'id'], name='game_in_stock_title'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(condition=models.Q(('quantity__gt', 0)), fields=['created_at', 'id'], name='game_in_stock_created'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(condition=models.Q(('quantity__gt', 0)), fields=['price', 'id'], name='game_in_stock_price'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['title', 'id'], name='game_title'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['created_at', 'id'], name='game_created'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['price', 'id'], name='game_price'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', 'created_at'], name='order_customer_created'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'created_at'], name='order_status_created'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['created_at'], name='order_created'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['game', 'created_at', 'id'], name='review_game_created'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['game', 'rating', 'created_at', 'id'], name='review_game_rating'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['game', 'rating', '-created_at', '-id'], name='review_game_rating_low'),
+        ),
+        migrations.AddIndex(
+            model_name='salesdaily',
+            index=models.Index(fields=['game', 'day'], name='sales_daily_game_day_idx'),
+        ),
+    ]
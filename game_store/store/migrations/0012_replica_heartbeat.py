@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0011_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReplicaHeartbeat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('beat_at', models.DateTimeField(verbose_name='Время отметки')),
+            ],
+            options={
+                'verbose_name': 'Отметка реплики',
+                'verbose_name_plural': 'Отметки реплики',
+            },
+        ),
+    ]
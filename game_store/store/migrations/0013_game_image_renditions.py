@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_replica_heartbeat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='image_renditions',
+            field=models.JSONField(blank=True, default=list, editable=False, verbose_name='Копии изображения'),
+        ),
+    ]
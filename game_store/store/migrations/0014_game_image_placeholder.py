@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0013_game_image_renditions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='image_color',
+            field=models.CharField(blank=True, editable=False, max_length=7, verbose_name='Основной цвет изображения'),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='image_height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Высота изображения'),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='image_placeholder',
+            field=models.TextField(blank=True, editable=False, verbose_name='Заглушка изображения'),
+        ),
+        migrations.AddField(
+            model_name='game',
+            name='image_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Ширина изображения'),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
+
+
+def fill_recommendations(apps, schema_editor):
+    OrderItem = apps.get_model('store', 'OrderItem')
+    CoPurchase = apps.get_model('store', 'CoPurchase')
+    GameNeighbor = apps.get_model('store', 'GameNeighbor')
+
+    paid = Q(order__status='completed') | Q(order__payment_status='completed')
+    pairs = (
+        OrderItem.objects.filter(paid & ~Q(order__status='cancelled'))
+        .annotate(other=F('order__orderitem__game_id'))
+        .filter(~Q(other=F('game_id')))
+        .values_list('game_id', 'other')
+        .annotate(orders=Count('order_id', distinct=True))
+        .order_by()
+    )
+    CoPurchase.objects.bulk_create(
+        [CoPurchase(game_id=game_id, other_id=other_id, orders=orders) for game_id, other_id, orders in pairs],
+        batch_size=1000,
+    )
+
+    top = (
+        CoPurchase.objects.annotate(rank=Window(
+            RowNumber(), partition_by=[F('game_id')], order_by=[F('orders').desc(), F('other_id').asc()],
+        ))
+        .filter(rank__lte=getattr(settings, 'RECOMMENDATION_NEIGHBORS', 6))
+        .values_list('game_id', 'rank', 'other_id', 'orders')
+    )
+    GameNeighbor.objects.bulk_create(
+        [GameNeighbor(game_id=game_id, rank=rank, neighbor_id=other_id, orders=orders) for game_id, rank, other_id, orders in top],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0014_game_image_placeholder'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoPurchase',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('orders', models.IntegerField(default=0, verbose_name='Заказов')),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.game', verbose_name='Игра')),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.game', verbose_name='Вторая игра')),
+            ],
+            options={
+                'verbose_name': 'Совместная покупка',
+                'verbose_name_plural': 'Совместные покупки',
+                'indexes': [models.Index(fields=['game', '-orders', 'other'], name='copurchase_game_orders')],
+                'constraints': [models.UniqueConstraint(fields=('game', 'other'), name='copurchase_game_other')],
+            },
+        ),
+        migrations.CreateModel(
+            name='GameNeighbor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Место')),
+                ('orders', models.IntegerField(verbose_name='Заказов')),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.game', verbose_name='Игра')),
+                ('neighbor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='store.game', verbose_name='Рекомендуемая игра')),
+            ],
+            options={
+                'verbose_name': 'Рекомендация',
+                'verbose_name_plural': 'Рекомендации',
+                'constraints': [models.UniqueConstraint(fields=('game', 'rank'), name='game_neighbor_rank')],
+            },
+        ),
+        migrations.RunPython(fill_recommendations, migrations.RunPython.noop),
+    ]
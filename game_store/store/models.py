@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 
 
 class Genre(models.Model):
@@ -39,24 +40,199 @@ class Game(models.Model):
     tags = models.ManyToManyField(Tag, blank=True, verbose_name="Теги")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата добавления")
 
+    # Ширины уменьшенных копий изображения, поддерживается store/renditions.py
+    image_renditions = models.JSONField(default=list, blank=True, editable=False, verbose_name="Копии изображения")
+    # Размеры, цвет и заглушка для первой отрисовки, поддерживаются store/placeholders.py
+    image_width = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name="Ширина изображения")
+    image_height = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name="Высота изображения")
+    image_color = models.CharField(max_length=7, blank=True, editable=False, verbose_name="Основной цвет изображения")
+    image_placeholder = models.TextField(blank=True, editable=False, verbose_name="Заглушка изображения")
+
+    # Агрегаты одобренных отзывов, поддерживаются store/ratings.py
+    rating_sum = models.PositiveIntegerField(default=0, editable=False, verbose_name="Сумма оценок")
+    rating_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Количество оценок")
+    rating_1 = models.PositiveIntegerField(default=0, editable=False, verbose_name="Оценок 1")
+    rating_2 = models.PositiveIntegerField(default=0, editable=False, verbose_name="Оценок 2")
+    rating_3 = models.PositiveIntegerField(default=0, editable=False, verbose_name="Оценок 3")
+    rating_4 = models.PositiveIntegerField(default=0, editable=False, verbose_name="Оценок 4")
+    rating_5 = models.PositiveIntegerField(default=0, editable=False, verbose_name="Оценок 5")
+
+    # Сколько штук сейчас удерживается в корзинах, поддерживается store/reservations.py
+    reserved = models.PositiveIntegerField(default=0, editable=False, verbose_name="Зарезервировано")
+
+    RATING_FIELDS = ('rating_sum', 'rating_count', 'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5')
+    # Счетчики, которые меняются только атомарными UPDATE, а не через save()
+    COUNTER_FIELDS = RATING_FIELDS + ('reserved',)
+    # Производные от файла изображения - пишутся после его обработки (store/signals.py)
+    IMAGE_META_FIELDS = ('image_renditions', 'image_width', 'image_height', 'image_color', 'image_placeholder')
+
     def __str__(self):
         return self.title
 
     class Meta:
         verbose_name = "Игра"
         verbose_name_plural = "Игры"
+        # Каталог по умолчанию показывает игры в наличии: частичные индексы под
+        # каждую сортировку (id замыкает ключ курсора)
+        indexes = [
+            models.Index(fields=['title', 'id'], condition=models.Q(quantity__gt=0), name='game_in_stock_title'),
+            models.Index(fields=['created_at', 'id'], condition=models.Q(quantity__gt=0), name='game_in_stock_created'),
+            models.Index(fields=['price', 'id'], condition=models.Q(quantity__gt=0), name='game_in_stock_price'),
+            models.Index(fields=['title', 'id'], name='game_title'),
+            models.Index(fields=['created_at', 'id'], name='game_created'),
+            models.Index(fields=['price', 'id'], name='game_price'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Агрегаты рейтинга и резерв меняются только атомарными UPDATE (store/ratings.py,
+        # store/reservations.py), а данные о копиях изображения - после его обработки,
+        # поэтому обычное сохранение игры не должно затирать их
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS + self.IMAGE_META_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if {'genre_id', 'quantity', 'price'}.issubset(field_names):
+            instance.remember_facet_state()
+        if 'image' in field_names:
+            instance.remember_image_state()
+        return instance
+
+    def remember_image_state(self):
+        """Запоминает файл изображения, для которого построены копии и заглушка (см. store/renditions.py)"""
+        self._image_state = self.image.name or ''
+
+    def remember_facet_state(self):
+        """Запоминает, в каких битовых картах фасетов учтена игра (см. store/facets.py)"""
+        self._facet_state = (self.genre_id, self.quantity > 0, self.price)
+
+    @property
+    def available_quantity(self):
+        """Сколько штук можно положить в корзину прямо сейчас (остаток минус резерв)"""
+        return max(self.quantity - self.reserved, 0)
 
     def average_rating(self):
         """Средний рейтинг игры"""
-        reviews = self.reviews.filter(is_approved=True)
-        if reviews.exists():
-            total = sum([review.rating for review in reviews])
-            return round(total / reviews.count(), 1)
+        if self.rating_count:
+            return round(self.rating_sum / self.rating_count, 1)
         return 0
 
     def review_count(self):
         """Количество отзывов"""
-        return self.reviews.filter(is_approved=True).count()
+        return self.rating_count
+
+    def rating_histogram(self):
+        """Распределение оценок: список (оценка, количество, процент) от 5 к 1"""
+        histogram = []
+        for stars in range(5, 0, -1):
+            count = getattr(self, f'rating_{stars}')
+            percent = round(count * 100 / self.rating_count) if self.rating_count else 0
+            histogram.append((stars, count, percent))
+        return histogram
+
+
+class FacetBitmap(models.Model):
+    """Битовая карта id игр для одного значения фасета (см. store/facets.py)"""
+    KIND_CHOICES = [
+        ('genre', 'Жанр'),
+        ('tag', 'Тег'),
+        ('price', 'Ценовой диапазон'),
+        ('stock', 'Наличие'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, verbose_name="Тип фасета")
+    key = models.PositiveBigIntegerField(verbose_name="Значение фасета")
+    bits = models.BinaryField(default=b'', verbose_name="Битовая карта")
+    version = models.PositiveBigIntegerField(default=0, verbose_name="Версия")
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.key}"
+
+    class Meta:
+        verbose_name = "Битовая карта фасета"
+        verbose_name_plural = "Битовые карты фасетов"
+        unique_together = ['kind', 'key']
+
+
+class Reservation(models.Model):
+    """Временное удержание товара в корзине покупателя"""
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='reservations', verbose_name="Игра")
+    holder = models.CharField(max_length=32, verbose_name="Корзина")
+    quantity = models.PositiveIntegerField(verbose_name="Количество")
+    expires_at = models.DateTimeField(db_index=True, verbose_name="Действует до")
+
+    def __str__(self):
+        return f"{self.game} x {self.quantity} ({self.holder})"
+
+    class Meta:
+        verbose_name = "Резерв"
+        verbose_name_plural = "Резервы"
+        unique_together = ['holder', 'game']
+
+
+class AdmissionTicket(models.Model):
+    """Место в очереди на оформление заказа (см. store/admission.py)"""
+    token = models.CharField(max_length=32, unique=True, verbose_name="Токен посетителя")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Встал в очередь")
+    admitted_at = models.DateTimeField(null=True, blank=True, db_index=True, verbose_name="Допущен")
+    last_seen = models.DateTimeField(db_index=True, verbose_name="Последняя активность")
+
+    def __str__(self):
+        return self.token
+
+    class Meta:
+        verbose_name = "Место в очереди"
+        verbose_name_plural = "Очередь на оформление"
+
+
+class OutboxEmail(models.Model):
+    """Письмо, ожидающее отправки фоновым обработчиком (см. store/outbox.py)"""
+    STATUS_CHOICES = [
+        ('pending', 'Ожидает отправки'),
+        ('sending', 'Отправляется'),
+        ('sent', 'Отправлено'),
+        ('failed', 'Не удалось отправить'),
+    ]
+
+    subject = models.CharField(max_length=255, verbose_name="Тема")
+    body = models.TextField(verbose_name="Текст")
+    from_email = models.CharField(max_length=255, verbose_name="Отправитель")
+    to = models.TextField(verbose_name="Получатели")  # через запятую
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', verbose_name="Статус")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Попыток")
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name="Следующая попытка")
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создано")
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name="Отправлено")
+
+    def __str__(self):
+        return f"{self.subject} -> {self.to}"
+
+    class Meta:
+        verbose_name = "Письмо в очереди"
+        verbose_name_plural = "Очередь писем"
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+
+
+class ReplicaHeartbeat(models.Model):
+    """Метка времени, которую обновление реплики пишет в основную базу перед копированием.
+
+    Значение, прочитанное из реплики, показывает, на какой момент она актуальна
+    (см. store/replica.py).
+    """
+    beat_at = models.DateTimeField(verbose_name="Время отметки")
+
+    def __str__(self):
+        return f"Реплика на {self.beat_at}"
+
+    class Meta:
+        verbose_name = "Отметка реплики"
+        verbose_name_plural = "Отметки реплики"
 
 
 class Customer(models.Model):
@@ -120,12 +296,33 @@ class Order(models.Model):
         verbose_name="Код подтверждения"
     )
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if {'status', 'payment_status'}.issubset(field_names):
+            instance.remember_sale_state()
+        return instance
+
+    @property
+    def is_sale(self):
+        """Заказ оплачен или завершен (и не отменен) - учитывается в продажах"""
+        return self.status != 'cancelled' and (self.status == 'completed' or self.payment_status == 'completed')
+
+    def remember_sale_state(self):
+        """Запоминает, учтен ли заказ в сводке продаж (см. store/sales.py)"""
+        self._sale_state = self.is_sale
+
     def __str__(self):
         return f"Заказ #{self.id} - {self.customer}"
 
     class Meta:
         verbose_name = "Заказ"
         verbose_name_plural = "Заказы"
+        indexes = [
+            models.Index(fields=['customer', 'created_at'], name='order_customer_created'),
+            models.Index(fields=['status', 'created_at'], name='order_status_created'),
+            models.Index(fields=['created_at'], name='order_created'),
+        ]
 
 
 class OrderItem(models.Model):
@@ -143,6 +340,75 @@ class OrderItem(models.Model):
         verbose_name_plural = "Элементы заказа"
 
 
+class SalesDaily(models.Model):
+    """Продажи игры за день - сводка для отчетов (см. store/sales.py).
+
+    Строка с game=NULL хранит итоги дня по заказам целиком: заказ с
+    несколькими играми в ней считается один раз.
+    """
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, null=True, blank=True, verbose_name="Игра")
+    day = models.DateField(verbose_name="День")
+    units = models.IntegerField(default=0, verbose_name="Продано копий")
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Выручка")
+    orders = models.IntegerField(default=0, verbose_name="Заказов")
+
+    def __str__(self):
+        return f"{self.day}: {self.game_id or 'итого'} x {self.units}"
+
+    class Meta:
+        verbose_name = "Продажи за день"
+        verbose_name_plural = "Продажи по дням"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['game', 'day'], condition=models.Q(game__isnull=False), name='sales_daily_game_day'
+            ),
+            models.UniqueConstraint(
+                fields=['day'], condition=models.Q(game__isnull=True), name='sales_daily_total_day'
+            ),
+        ]
+        # game IS NULL + диапазон дней - итоги по дням; game + день - строки игр
+        indexes = [models.Index(fields=['game', 'day'], name='sales_daily_game_day_idx')]
+
+
+class CoPurchase(models.Model):
+    """Сколько оплаченных заказов содержат обе игры - ячейка разреженной
+    матрицы совместных покупок (см. store/recommendations.py).
+
+    Пара хранится в обе стороны: (A, B) и (B, A), чтобы соседей любой игры
+    можно было выбрать по индексу.
+    """
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='+', verbose_name="Игра")
+    other = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='+', verbose_name="Вторая игра")
+    orders = models.IntegerField(default=0, verbose_name="Заказов")
+
+    def __str__(self):
+        return f"{self.game_id} + {self.other_id}: {self.orders}"
+
+    class Meta:
+        verbose_name = "Совместная покупка"
+        verbose_name_plural = "Совместные покупки"
+        constraints = [models.UniqueConstraint(fields=['game', 'other'], name='copurchase_game_other')]
+        # Лучшие соседи игры: по убыванию числа заказов
+        indexes = [models.Index(fields=['game', '-orders', 'other'], name='copurchase_game_orders')]
+
+
+class GameNeighbor(models.Model):
+    """Игра из списка "С этой игрой покупают" - верхние RECOMMENDATION_NEIGHBORS
+    строк CoPurchase для игры, пересчитываются вместе с ними"""
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='+', verbose_name="Игра")
+    rank = models.PositiveSmallIntegerField(verbose_name="Место")
+    neighbor = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='+', verbose_name="Рекомендуемая игра")
+    orders = models.IntegerField(verbose_name="Заказов")
+
+    def __str__(self):
+        return f"{self.game_id} #{self.rank}: {self.neighbor_id}"
+
+    class Meta:
+        verbose_name = "Рекомендация"
+        verbose_name_plural = "Рекомендации"
+        constraints = [models.UniqueConstraint(fields=['game', 'rank'], name='game_neighbor_rank')]
+
+
 class Review(models.Model):
     """Модель для отзывов на игры"""
     game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='reviews', verbose_name="Игра")
@@ -160,6 +426,32 @@ class Review(models.Model):
         verbose_name_plural = "Отзывы"
         unique_together = ['game', 'user']  # один отзыв на игру от пользователя
         ordering = ['-created_at']
+        # Лента отзывов игры: только одобренные, по дате или по оценке
+        indexes = [
+            models.Index(
+                fields=['game', 'created_at', 'id'], condition=models.Q(is_approved=True), name='review_game_created'
+            ),
+            models.Index(
+                fields=['game', 'rating', 'created_at', 'id'], condition=models.Q(is_approved=True),
+                name='review_game_rating',
+            ),
+            # "сначала низкие": оценка по возрастанию, но внутри оценки - новые первыми
+            models.Index(
+                fields=['game', 'rating', '-created_at', '-id'], condition=models.Q(is_approved=True),
+                name='review_game_rating_low',
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if {'game_id', 'rating', 'is_approved'}.issubset(field_names):
+            instance.remember_rating_state()
+        return instance
+
+    def remember_rating_state(self):
+        """Запоминает, как отзыв учтен в агрегатах игры (см. store/ratings.py)"""
+        self._rating_state = (self.game_id, self.rating, self.is_approved)
 
     def __str__(self):
         return f"{self.user.username} - {self.game.title} ({self.rating}/5)"
@@ -0,0 +1,90 @@
+"""Пересчет сводок по заказам после фиксации транзакции.
+
+Вклад заказа в сводку продаж (store/sales.py) и в матрицу совместных
+покупок (store/recommendations.py) зависит и от его статуса, и от позиций,
+а они меняются разными сохранениями: админка с инлайном позиций и скрипты
+сначала сохраняют оплаченный заказ, а позиции добавляют после; позиции уже
+оплаченного заказа правятся в инлайне. Поэтому сигналы Order и OrderItem
+(store/signals.py) не считают разницу сами:
+
+- before() до изменения запоминает снимок заказа - что он вносит в сводки
+  сейчас (день и позиции, None - заказ не учитывается);
+- changed() после изменения откладывает пересчет до фиксации транзакции
+  (transaction.on_commit), один на транзакцию.
+
+После фиксации снимок каждого измененного заказа сравнивается с тем, что
+заказ вносит теперь, и в сводки пишется только разница. Сколько бы
+сохранений ни было в транзакции, заказ пересчитывается один раз, а позиции,
+добавленные после смены статуса, не теряются и не учитываются дважды.
+При откате транзакции Django отбрасывает и отложенный пересчет.
+
+bulk_create() и update() сигналов не посылают: после них сводки нужно
+пересчитать командами rebuild_sales и rebuild_recommendations.
+"""
+from collections import namedtuple
+
+from django.db import connections, transaction
+
+from . import recommendations, sales
+from .models import Order, OrderItem
+
+# Вклад оплаченного заказа: день продажи и позиции [(игра, количество, цена)]
+Snapshot = namedtuple('Snapshot', 'day items')
+
+
+def snapshot(using, order_id):
+    """Что заказ вносит в сводки по данным в базе using; None - ничего"""
+    order = Order.objects.using(using).filter(pk=order_id).only('status', 'payment_status', 'created_at').first()
+    if order is None or not order.is_sale:
+        return None
+    items = OrderItem.objects.using(using).filter(order_id=order_id).values_list('game_id', 'quantity', 'price')
+    return Snapshot(sales.sale_day(order), list(items))
+
+
+class _Batch:
+    """Заказы, измененные в транзакции, и их снимки до первого изменения"""
+
+    def __init__(self, using):
+        self.using = using
+        self.before = {}
+        self.applied = False
+
+    def __call__(self):
+        self.applied = True
+        for order_id, before in sorted(self.before.items()):
+            after = snapshot(self.using, order_id)
+            sales.apply_change(before, after)
+            recommendations.apply_change(before, after)
+
+
+def _batch(using):
+    """Пересчет, уже запланированный в текущей транзакции"""
+    for _, func, _ in connections[using].run_on_commit:
+        if isinstance(func, _Batch) and not func.applied:
+            return func
+    return None
+
+
+def before(using, order_ids):
+    """Снимки заказов перед изменением - для тех, что еще не менялись в транзакции"""
+    batch = _batch(using)
+    return {
+        order_id: snapshot(using, order_id)
+        for order_id in order_ids
+        if order_id is not None and (batch is None or order_id not in batch.before)
+    }
+
+
+def changed(using, snapshots):
+    """Планирует пересчет заказов после фиксации; snapshots - результат before()"""
+    if not snapshots:
+        return
+    batch = _batch(using)
+    if batch is not None:
+        for order_id, value in snapshots.items():
+            batch.before.setdefault(order_id, value)
+        return
+    batch = _Batch(using)
+    batch.before.update(snapshots)
+    # Вне транзакции выполняется сразу
+    transaction.on_commit(batch, using=using)
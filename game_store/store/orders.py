@@ -0,0 +1,73 @@
+"""Оформление заказа.
+
+Весь заказ создается в одной транзакции: остаток каждой игры уменьшается
+условным UPDATE ... SET quantity = quantity - n WHERE quantity >= n, поэтому
+две параллельные покупки не могут продать больше, чем лежит на складе.
+Если хоть одной игры не хватило, транзакция откатывается целиком - ни
+заказа, ни списаний не остается.
+
+Резервы корзины (store/reservations.py) при этом превращаются в продажу:
+удержанные покупателем штуки не считаются занятыми для него самого.
+"""
+from django.db import transaction
+from django.db.models import F
+
+from . import facets, reservations
+from .models import Game, Order, OrderItem
+
+
+class CheckoutError(Exception):
+    """Заказ не удалось оформить"""
+
+
+class OutOfStock(CheckoutError):
+    """Игры не хватило на складе в момент оформления"""
+
+    def __init__(self, game, requested):
+        self.game = game
+        self.requested = requested
+        super().__init__(f'Недостаточно "{game.title}"')
+
+
+def place_order(customer, items, holder=None):
+    """Создает заказ из [(game, quantity), ...] и списывает остатки.
+
+    game - уже загруженные объекты Game (цена берется из них).
+    holder - токен корзины, резервы которой забираются в заказ.
+    Бросает OutOfStock, если какой-то игры не хватило; CheckoutError - если
+    заказывать нечего.
+    """
+    # Одинаковый порядок списания во всех транзакциях - меньше взаимных ожиданий
+    items = sorted(((game, quantity) for game, quantity in items if quantity > 0), key=lambda item: item[0].pk)
+    if not items:
+        raise CheckoutError('Корзина пуста')
+
+    with transaction.atomic():
+        held = reservations.consume(holder, [game.pk for game, _ in items])
+        for game, quantity in items:
+            # Свой резерв покупатель может выкупить, чужие - нет
+            own = held.get(game.pk, 0)
+            updated = Game.objects.filter(pk=game.pk, quantity__gte=F('reserved') - own + quantity).update(
+                quantity=F('quantity') - quantity,
+                reserved=F('reserved') - own,
+            )
+            if not updated:
+                raise OutOfStock(game, quantity)
+
+        total_amount = sum(game.price * quantity for game, quantity in items)
+        order = Order.objects.create(
+            customer=customer,
+            status='pending',
+            total_amount=total_amount,
+            payment_method='none',
+            payment_status='pending'
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, game=game, quantity=quantity, price=game.price)
+            for game, quantity in items
+        ])
+
+        # Остатки менялись через update(), сигналы Game не сработали
+        facets.sync_stock([game.pk for game, _ in items])
+
+    return order
@@ -0,0 +1,123 @@
+"""Исходящая почта через таблицу-очередь (transactional outbox).
+
+Представления не ходят в SMTP сами: enqueue() записывает письмо в
+OutboxEmail в той же транзакции, что и изменение заказа, поэтому письмо
+уходит тогда и только тогда, когда изменение заказа сохранено, а ответ
+пользователю не ждет почтовый сервер.
+
+Команда send_outbox забирает письма пачками и отправляет их через одно
+SMTP-соединение. Неудачные попытки повторяются с экспоненциальной задержкой,
+после OUTBOX_MAX_ATTEMPTS письмо помечается как failed.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+# Сколько секунд письмо числится за обработчиком, прежде чем его сможет забрать другой
+LEASE_SECONDS = 5 * 60
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enqueue(subject, body, recipients, from_email=None):
+    """Ставит письмо в очередь. Вызывайте внутри транзакции изменения заказа"""
+    return OutboxEmail.objects.create(
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=','.join(recipients),
+    )
+
+
+def backoff(attempts):
+    """Задержка перед следующей попыткой: 30 с, 1 мин, 2 мин, ... но не больше часа"""
+    base = _setting('OUTBOX_RETRY_BASE_SECONDS', 30)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), 3600))
+
+
+def claim_batch(batch_size, now=None):
+    """Забирает пачку писем, которые пора отправлять.
+
+    Каждое письмо захватывается условным UPDATE, поэтому несколько
+    обработчиков не отправят одно письмо дважды.
+    """
+    now = now or timezone.now()
+    candidates = list(
+        OutboxEmail.objects.filter(status__in=['pending', 'sending'], next_attempt_at__lte=now)
+        .order_by('next_attempt_at', 'id')
+        .values_list('id', 'next_attempt_at')[:batch_size]
+    )
+    lease_until = now + timedelta(seconds=LEASE_SECONDS)
+    claimed = []
+    for email_id, next_attempt_at in candidates:
+        updated = OutboxEmail.objects.filter(pk=email_id, next_attempt_at=next_attempt_at).update(
+            status='sending', next_attempt_at=lease_until
+        )
+        if updated:
+            claimed.append(email_id)
+    return list(OutboxEmail.objects.filter(pk__in=claimed).order_by('id'))
+
+
+def _fail(emails, error, max_attempts):
+    """Откладывает письма после неудачной попытки или помечает failed, если попытки кончились"""
+    now = timezone.now()
+    for email in emails:
+        attempts = email.attempts + 1
+        OutboxEmail.objects.filter(pk=email.pk).update(
+            status='failed' if attempts >= max_attempts else 'pending',
+            attempts=attempts,
+            next_attempt_at=now + backoff(attempts),
+            last_error=str(error)[:1000],
+        )
+    return len(emails)
+
+
+def send_batch(batch_size=100, connection=None):
+    """Отправляет одну пачку писем через одно соединение.
+
+    Если почтовый сервер недоступен, неотправленные письма пачки
+    откладываются как обычная неудачная попытка. Возвращает (отправлено, ошибок).
+    """
+    emails = claim_batch(batch_size)
+    if not emails:
+        return 0, 0
+
+    max_attempts = _setting('OUTBOX_MAX_ATTEMPTS', 8)
+    connection = connection or get_connection()
+    sent = failed = 0
+    try:
+        try:
+            connection.open()
+        except Exception as e:
+            return 0, _fail(emails, e, max_attempts)
+        for index, email in enumerate(emails):
+            message = EmailMessage(
+                email.subject, email.body, email.from_email, email.to.split(','),
+                connection=connection,
+            )
+            try:
+                message.send()
+            except Exception as e:
+                failed += _fail([email], e, max_attempts)
+                # После ошибки SMTP-соединение может быть в неопределенном состоянии
+                connection.close()
+                try:
+                    connection.open()
+                except Exception as e:
+                    # Сервер перестал отвечать - остаток пачки ждет следующей попытки
+                    failed += _fail(emails[index + 1:], e, max_attempts)
+                    break
+            else:
+                sent += 1
+                OutboxEmail.objects.filter(pk=email.pk).update(
+                    status='sent', attempts=email.attempts + 1, sent_at=timezone.now(), last_error=''
+                )
+    finally:
+        connection.close()
+    return sent, failed
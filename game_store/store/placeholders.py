@@ -0,0 +1,75 @@
+"""Заглушки изображений игр для первой отрисовки страницы.
+
+Пока обложка грузится, карточка должна сразу иметь правильный размер и
+похожую картинку. При обработке нового изображения (store/renditions.py)
+для него один раз считаются:
+
+- image_width, image_height - размеры оригинала после поворота по EXIF:
+  тег {% game_image %} выводит их в атрибутах width/height, и браузер
+  резервирует место под картинку без сдвига макета;
+- image_color - преобладающий цвет, "#rrggbb";
+- image_placeholder - размытая копия размером PLACEHOLDER_SIZE пикселей
+  по большей стороне в WebP, готовый data: URI в пару сотен байт.
+
+Цвет и заглушка выводятся фоном самого <img> прямо в HTML, поэтому первая
+отрисовка не ждет ни одного байта изображений.
+"""
+import base64
+from io import BytesIO
+
+from django.conf import settings
+from PIL import Image, ImageFilter
+
+# Значения полей для игры без изображения
+EMPTY = {'image_width': None, 'image_height': None, 'image_color': '', 'image_placeholder': ''}
+
+DEFAULT_SIZE = 16
+
+
+def placeholder_size():
+    return getattr(settings, 'IMAGE_PLACEHOLDER_SIZE', DEFAULT_SIZE)
+
+
+def dominant_color(image):
+    """Самый частый цвет после сведения картинки к палитре из 8 цветов"""
+    small = image.copy()
+    small.thumbnail((64, 64))
+    quantized = small.quantize(colors=8)
+    palette = quantized.getpalette()
+    _, index = max(quantized.getcolors())
+    red, green, blue = palette[index * 3:index * 3 + 3]
+    return f'#{red:02x}{green:02x}{blue:02x}'
+
+
+def placeholder(image):
+    """Размытая миниатюра в WebP как data: URI"""
+    small = image.copy()
+    small.thumbnail((placeholder_size(),) * 2, Image.LANCZOS)
+    small = small.filter(ImageFilter.GaussianBlur(1))
+    output = BytesIO()
+    small.save(output, 'WEBP', quality=40, method=6)
+    return 'data:image/webp;base64,' + base64.b64encode(output.getvalue()).decode('ascii')
+
+
+def describe(image, rgb=None):
+    """Поля заглушки для открытого изображения Pillow.
+
+    rgb - то же изображение, уже приведенное к RGB (без прозрачности).
+    """
+    rgb = rgb or image.convert('RGB')
+    return {
+        'image_width': image.width,
+        'image_height': image.height,
+        'image_color': dominant_color(rgb),
+        'image_placeholder': placeholder(rgb),
+    }
+
+
+def style(game):
+    """Фон <img> на время загрузки: цвет и растянутая заглушка"""
+    parts = []
+    if game.image_color:
+        parts.append(game.image_color)
+    if game.image_placeholder:
+        parts.append(f'url({game.image_placeholder}) center / cover no-repeat')
+    return f'background: {" ".join(parts)};' if parts else ''
@@ -0,0 +1,85 @@
+"""Денормализованные агрегаты рейтинга игры.
+
+Game хранит сумму и количество одобренных оценок и гистограмму 1-5, чтобы
+страница игры и админка читали рейтинг без запросов к отзывам. Агрегаты
+меняются атомарными UPDATE с F() из сигналов Review (store/signals.py);
+команда recompute_ratings пересчитывает их с нуля.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+from .models import Game, Review
+
+RATING_FIELDS = list(Game.RATING_FIELDS)
+
+
+def _add(deltas, state, sign):
+    game_id, rating, is_approved = state
+    if not is_approved:
+        return
+    fields = deltas[game_id]
+    fields['rating_sum'] += sign * rating
+    fields['rating_count'] += sign
+    fields[f'rating_{rating}'] += sign
+
+
+def apply_review_change(old_state, new_state):
+    """Переносит изменение отзыва в агрегаты игр.
+
+    Состояние отзыва - кортеж (game_id, rating, is_approved) или None, если
+    отзыва не было (создание) или больше нет (удаление).
+    """
+    if old_state == new_state:
+        return
+
+    deltas = defaultdict(lambda: defaultdict(int))
+    if old_state is not None:
+        _add(deltas, old_state, -1)
+    if new_state is not None:
+        _add(deltas, new_state, 1)
+
+    for game_id, fields in deltas.items():
+        changes = {name: F(name) + delta for name, delta in fields.items() if delta}
+        if changes:
+            Game.objects.filter(pk=game_id).update(**changes)
+
+
+def recompute_all(batch_size=1000):
+    """Пересчитывает агрегаты всех игр по таблице отзывов.
+
+    Возвращает количество обновленных игр.
+    """
+    annotations = {
+        'total': Sum('rating'),
+        'count': Count('id'),
+    }
+    for stars in range(1, 6):
+        annotations[f'count_{stars}'] = Count('id', filter=Q(rating=stars))
+
+    stats = {
+        row['game_id']: row
+        for row in Review.objects.filter(is_approved=True)
+        .values('game_id').annotate(**annotations).order_by()
+    }
+
+    updated = 0
+    games = Game.objects.only('id', *RATING_FIELDS).order_by('id')
+    batch = []
+    with transaction.atomic():
+        for game in games.iterator(chunk_size=batch_size):
+            row = stats.get(game.id)
+            game.rating_sum = row['total'] if row else 0
+            game.rating_count = row['count'] if row else 0
+            for stars in range(1, 6):
+                setattr(game, f'rating_{stars}', row[f'count_{stars}'] if row else 0)
+            batch.append(game)
+            if len(batch) >= batch_size:
+                Game.objects.bulk_update(batch, RATING_FIELDS)
+                updated += len(batch)
+                batch = []
+        if batch:
+            Game.objects.bulk_update(batch, RATING_FIELDS)
+            updated += len(batch)
+    return updated
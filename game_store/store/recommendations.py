@@ -0,0 +1,140 @@
+"""Рекомендации "С этой игрой покупают" по совместным покупкам.
+
+Матрица игра x игра разреженная: ненулевые ячейки есть только у пар игр,
+которые хоть раз оказались в одном оплаченном заказе (Order.is_sale).
+Она хранится в CoPurchase - строка на ненулевую ячейку, в обе стороны.
+
+rebuild() считает всю матрицу одним запросом: позиции заказов соединяются
+сами с собой по заказу и группируются по паре игр (то же, что произведение
+Aᵀ·A разреженной матрицы заказ x игра), так что перебор пар идет внутри
+SQLite, а не во вложенных циклах Python. Верхние RECOMMENDATION_NEIGHBORS
+соседей каждой игры выбираются оконной функцией ROW_NUMBER() и пишутся в
+компактную таблицу GameNeighbor, которую страница игры читает одним
+запросом по индексу (game, rank).
+
+Новый оплаченный заказ меняет только ячейки пар своих игр, поэтому после
+фиксации транзакции (store/order_rollups.py) к ним прибавляется 1, а при
+отмене, удалении заказа или его позиций вычитается, и пересчитываются
+списки соседей только затронутых игр - без полного пересчета. Ячейка не
+уходит ниже нуля и удаляется, когда доходит до него. Миграция 0015 заполняет
+матрицу по уже оплаченным заказам, команда rebuild_recommendations строит
+все заново.
+"""
+from itertools import permutations
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
+
+from .models import CoPurchase, GameNeighbor, OrderItem
+from .sales import sale_q
+
+DEFAULT_NEIGHBORS = 6
+
+
+def neighbors_count():
+    return getattr(settings, 'RECOMMENDATION_NEIGHBORS', DEFAULT_NEIGHBORS)
+
+
+def _pairs():
+    """Ненулевые ячейки матрицы: (игра, вторая игра, число заказов с обеими)"""
+    return (
+        OrderItem.objects.filter(sale_q('order__'))
+        .annotate(other=F('order__orderitem__game_id'))
+        .filter(~Q(other=F('game_id')))
+        .values_list('game_id', 'other')
+        .annotate(orders=Count('order_id', distinct=True))
+        .order_by()
+    )
+
+
+def _top(game_ids=None):
+    """Верхние соседи игр: (игра, место, сосед, число заказов)"""
+    cells = CoPurchase.objects.filter(orders__gt=0)
+    if game_ids is not None:
+        cells = cells.filter(game_id__in=game_ids)
+    return (
+        cells.annotate(rank=Window(
+            RowNumber(), partition_by=[F('game_id')], order_by=[F('orders').desc(), F('other_id').asc()],
+        ))
+        .filter(rank__lte=neighbors_count())
+        .values_list('game_id', 'rank', 'other_id', 'orders')
+    )
+
+
+def _refresh(game_ids=None):
+    """Переписывает списки соседей игр game_ids (None - всех игр)"""
+    rows = [
+        GameNeighbor(game_id=game_id, rank=rank, neighbor_id=other_id, orders=orders)
+        for game_id, rank, other_id, orders in _top(game_ids)
+    ]
+    stale = GameNeighbor.objects.all() if game_ids is None else GameNeighbor.objects.filter(game_id__in=game_ids)
+    stale.delete()
+    GameNeighbor.objects.bulk_create(rows)
+
+
+def _add(game_id, other_id, orders):
+    """Прибавляет к ячейке матрицы, создавая ее при необходимости"""
+    if CoPurchase.objects.filter(game_id=game_id, other_id=other_id).update(orders=F('orders') + orders):
+        return
+    try:
+        with transaction.atomic():
+            CoPurchase.objects.create(game_id=game_id, other_id=other_id, orders=orders)
+    except IntegrityError:
+        # Ячейку только что создал параллельный запрос
+        CoPurchase.objects.filter(game_id=game_id, other_id=other_id).update(orders=F('orders') + orders)
+
+
+def _subtract(game_id, other_id):
+    """Вычитает 1 из ячейки; пустую ячейку удаляет, отсутствующую не создает"""
+    cell = CoPurchase.objects.filter(game_id=game_id, other_id=other_id)
+    cell.filter(orders__gt=0).update(orders=F('orders') - 1)
+    cell.filter(orders__lte=0).delete()
+
+
+def _pairs_of(snapshot):
+    """Пары игр, которые заказ вносит в матрицу (снимок store/order_rollups.py)"""
+    if snapshot is None:
+        return set()
+    return set(permutations(sorted({game_id for game_id, _, _ in snapshot.items}), 2))
+
+
+def apply_change(before, after):
+    """Вносит в матрицу разницу между двумя снимками заказа и обновляет соседей затронутых игр"""
+    old, new = _pairs_of(before), _pairs_of(after)
+    added, removed = sorted(new - old), sorted(old - new)
+    if not added and not removed:
+        return
+    with transaction.atomic():
+        for game_id, other_id in added:
+            _add(game_id, other_id, 1)
+        for game_id, other_id in removed:
+            _subtract(game_id, other_id)
+        _refresh(sorted({game_id for game_id, _ in added + removed}))
+
+
+def rebuild(batch_size=1000):
+    """Пересчитывает матрицу и списки соседей по всем оплаченным заказам.
+
+    Возвращает (число ненулевых ячеек, число строк рекомендаций).
+    """
+    cells = [
+        CoPurchase(game_id=game_id, other_id=other_id, orders=orders)
+        for game_id, other_id, orders in _pairs()
+    ]
+    with transaction.atomic():
+        CoPurchase.objects.all().delete()
+        CoPurchase.objects.bulk_create(cells, batch_size=batch_size)
+        _refresh()
+    return len(cells), GameNeighbor.objects.count()
+
+
+def for_game(game_id, limit=None):
+    """Игры, которые покупают вместе с game_id, - один запрос по индексу (game, rank)"""
+    neighbors = (
+        GameNeighbor.objects.filter(game_id=game_id)
+        .select_related('neighbor')
+        .order_by('rank')[:limit or neighbors_count()]
+    )
+    return [row.neighbor for row in neighbors]
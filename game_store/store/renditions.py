@@ -0,0 +1,123 @@
+"""Уменьшенные копии обложек игр для адаптивных картинок.
+
+Оригинал Game.image может быть огромным (баннер 2560x1440), а в карточке
+каталога он показывается шириной 200-300 пикселей. При сохранении игры с
+новым изображением (store/signals.py) рядом с оригиналом создаются копии
+нескольких ширин (IMAGE_RENDITION_WIDTHS) в WebP и JPEG:
+
+    games/images/poster.jpg -> games/images/poster.320w.webp, poster.320w.jpg, ...
+
+Ширины, которые удалось построить, записываются в Game.image_renditions -
+шаблонный тег {% game_image %} (store/templatetags/store_images.py) строит по
+ним srcset, не обращаясь к диску. Копии шире оригинала не делаются.
+За то же чтение файла считаются размеры и заглушка (store/placeholders.py).
+Для уже загруженных изображений копии и заглушки строит команда build_renditions.
+"""
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from . import placeholders
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WIDTHS = (320, 640, 960, 1280)
+
+# Расширение файла -> (формат Pillow, параметры сохранения)
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def widths():
+    return tuple(sorted(getattr(settings, 'IMAGE_RENDITION_WIDTHS', DEFAULT_WIDTHS)))
+
+
+def rendition_name(name, width, ext):
+    """Имя копии рядом с оригиналом: poster.jpg -> poster.640w.webp"""
+    base, _ = os.path.splitext(name)
+    return f'{base}.{width}w.{ext}'
+
+
+def _flatten(image):
+    """JPEG не хранит прозрачность - подкладываем белый фон"""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _save(storage, name, content):
+    # Хранилище по хешу (store/storage.py) назвало бы копию по ее содержимому
+    save_exact = getattr(storage, 'save_exact', None)
+    if save_exact is not None:
+        save_exact(name, ContentFile(content))
+        return
+    # Перезаписываем: иначе storage добавит к имени суффикс _1, _2
+    if storage.exists(name):
+        storage.delete(name)
+    storage.save(name, ContentFile(content))
+
+
+def _open(name, storage):
+    with storage.open(name) as source:
+        image = Image.open(source)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    return image
+
+
+def generate(name, storage=None, image=None):
+    """Строит копии изображения name; возвращает список построенных ширин"""
+    storage = storage or default_storage
+    if image is None:
+        image = _open(name, storage)
+
+    built = []
+    for width in widths():
+        if width >= image.width:
+            break
+        height = max(round(image.height * width / image.width), 1)
+        resized = image.resize((width, height), Image.LANCZOS)
+        for ext, (fmt, options) in FORMATS.items():
+            output = BytesIO()
+            copy = resized if fmt == 'WEBP' and resized.mode in ('RGB', 'RGBA') else _flatten(resized)
+            copy.save(output, fmt, **options)
+            _save(storage, rendition_name(name, width, ext), output.getvalue())
+        built.append(width)
+    return built
+
+
+def process(name, storage=None):
+    """Копии и заглушка изображения за одно чтение файла.
+
+    Возвращает значения Game.IMAGE_META_FIELDS: ширины копий, размеры,
+    преобладающий цвет и заглушку (store/placeholders.py).
+    """
+    storage = storage or default_storage
+    image = _open(name, storage)
+    meta = placeholders.describe(image, _flatten(image))
+    meta['image_renditions'] = generate(name, storage, image)
+    return meta
+
+
+def process_safely(name):
+    """process() для фоновых процессов и сигналов: ошибка не роняет сохранение игры"""
+    try:
+        return name, process(name), None
+    except Exception as error:
+        logger.warning('Не удалось обработать изображение %s: %s', name, error)
+        return name, dict(placeholders.EMPTY, image_renditions=[]), str(error)
+
+
+def srcset(name, built, ext, storage=None):
+    storage = storage or default_storage
+    return ', '.join(f'{storage.url(rendition_name(name, width, ext))} {width}w' for width in built)
@@ -0,0 +1,177 @@
+"""Чтение из реплики базы для каталога и отчетов.
+
+Основная база (default) принимает все записи. Реплика - копия основной
+базы, которую команда refresh_replica периодически обновляет через backup
+API SQLite; в продакшене на ее месте может быть настоящая реплика СУБД.
+
+На реплику уходят только чтения моделей магазина и только в представлениях
+из REPLICA_READ_VIEWS (ReplicaMiddleware). Всё остальное читает основную
+базу:
+- внутри транзакции на основной базе;
+- после записи, которую покупатель должен сразу увидеть (оформление и
+  оплата заказа, отзыв - REPLICA_PIN_VIEWS): REPLICA_PIN_SECONDS он читает
+  основную базу (cookie REPLICA_PIN_COOKIE). Прочие POST, например
+  добавление в корзину, чтение с реплики не выключают;
+- если реплика отстала больше чем на REPLICA_MAX_LAG секунд или недоступна.
+
+Отставание измеряется по отметке ReplicaHeartbeat: перед копированием
+refresh_replica пишет текущее время в основную базу, а lag() читает его
+из реплики.
+"""
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DatabaseError, connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Разрешено ли в текущем запросе читать реплику
+_use_replica = ContextVar('store_use_replica', default=False)
+
+_lag_lock = threading.Lock()
+_lag_state = {'checked_at': None, 'lag': None}
+
+# Только эти приложения читаются с реплики: сессии и прочее служебное - всегда с основной базы
+REPLICA_APPS = {'store'}
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Реплика, отставшая больше чем на столько секунд, не читается (REPLICA_MAX_LAG)
+DEFAULT_MAX_LAG = 120
+
+# После каких записей покупатель читает основную базу (REPLICA_PIN_VIEWS)
+DEFAULT_PIN_VIEWS = ('checkout', 'payment', 'confirm_payment', 'add_review', 'delete_review')
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def alias():
+    return _setting('REPLICA_DATABASE', 'replica')
+
+
+def configured():
+    return alias() in settings.DATABASES
+
+
+def measure_lag():
+    """Отставание реплики в секундах по отметке ReplicaHeartbeat; None - реплика недоступна"""
+    from .models import ReplicaHeartbeat
+
+    try:
+        beat_at = ReplicaHeartbeat.objects.using(alias()).values_list('beat_at', flat=True).first()
+    except DatabaseError as error:
+        logger.warning('Реплика %s недоступна: %s', alias(), error)
+        return None
+    if beat_at is None:
+        return None
+    return max((timezone.now() - beat_at).total_seconds(), 0.0)
+
+
+def lag():
+    """Отставание реплики, перепроверяемое не чаще раза в REPLICA_LAG_CHECK_INTERVAL секунд"""
+    if not configured():
+        return None
+    now = time.monotonic()
+    with _lag_lock:
+        checked_at, value = _lag_state['checked_at'], _lag_state['lag']
+        if checked_at is not None and now - checked_at < _setting('REPLICA_LAG_CHECK_INTERVAL', 5):
+            # За время с проверки реплика отстала еще сильнее
+            return None if value is None else value + (now - checked_at)
+    value = measure_lag()
+    with _lag_lock:
+        _lag_state.update(checked_at=now, lag=value)
+    return value
+
+
+def refresh():
+    """Отмечает время в основной базе и копирует ее в реплику целиком; возвращает отставание"""
+    from .models import ReplicaHeartbeat
+
+    source, target = connections['default'], connections[alias()]
+    if source.vendor != 'sqlite' or target.vendor != 'sqlite':
+        raise ImproperlyConfigured('Копирование через backup API работает только между базами SQLite')
+
+    ReplicaHeartbeat.objects.update_or_create(pk=1, defaults={'beat_at': timezone.now()})
+    source.ensure_connection()
+    target.ensure_connection()
+    # Одним шагом: при пошаговом копировании запись в основную базу перезапускает backup
+    source.connection.backup(target.connection)
+    with _lag_lock:
+        _lag_state['checked_at'] = None
+    return measure_lag()
+
+
+def max_lag():
+    return _setting('REPLICA_MAX_LAG', DEFAULT_MAX_LAG)
+
+
+def replica_ready():
+    value = lag()
+    return value is not None and value <= max_lag()
+
+
+class ReplicaRouter:
+    """Роутер: чтения моделей магазина - на реплику, когда запрос это разрешает"""
+
+    def db_for_read(self, model, **hints):
+        if not _use_replica.get() or model._meta.app_label not in REPLICA_APPS:
+            return 'default'
+        # Внутри транзакции читаем то, что сами же и пишем
+        if connections['default'].in_atomic_block:
+            return 'default'
+        return alias() if replica_ready() else 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика - копия основной базы, объекты из обеих можно связывать
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема попадает на реплику вместе с копией данных
+        return db == 'default'
+
+
+class ReplicaMiddleware:
+    """Разрешает чтение с реплики в представлениях из REPLICA_READ_VIEWS"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        finally:
+            _use_replica.set(False)
+
+        # После своего заказа или отзыва покупатель какое-то время читает основную базу
+        match = request.resolver_match
+        if (
+            request.method not in SAFE_METHODS
+            and response.status_code < 400
+            and match is not None
+            and match.url_name in _setting('REPLICA_PIN_VIEWS', DEFAULT_PIN_VIEWS)
+        ):
+            response.set_cookie(
+                _setting('REPLICA_PIN_COOKIE', 'primary_reads'), '1',
+                max_age=_setting('REPLICA_PIN_SECONDS', 60), httponly=True, samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (
+            configured()
+            and request.method in SAFE_METHODS
+            and _setting('REPLICA_PIN_COOKIE', 'primary_reads') not in request.COOKIES
+            and request.resolver_match.url_name in _setting('REPLICA_READ_VIEWS', ())
+        ):
+            _use_replica.set(True)
+        return None
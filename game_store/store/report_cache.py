@@ -0,0 +1,111 @@
+"""Кеш результатов отчетов: stale-while-revalidate.
+
+Результат хранится в кеше Django вместе с моментом, до которого он считается
+свежим (мягкий TTL). Пока запись свежая, она просто отдается. Когда мягкий
+TTL прошел, запрос все равно сразу получает старый результат, а пересчет
+запускается в фоновом потоке. Жесткий TTL ограничивает, насколько старые
+данные вообще можно показать.
+
+Пересчитывает ключ только тот, кто взял блокировку cache.add(): остальные
+процессы и потоки в это время продолжают отдавать старый результат, а при
+пустом кеше ненадолго ждут результата первого.
+
+Блокировка и общая старая копия работают между процессами, только если кеш
+REPORT_CACHE_ALIAS общий для всех процессов. В settings.py это DatabaseCache
+в таблице report_cache (создается командой createcachetable): add() в нем
+атомарен за счет первичного ключа таблицы. Подойдут и Redis/memcached, а
+LocMemCache у каждого процесса свой - с ним каждый процесс пересчитывает
+отчет сам.
+"""
+import contextvars
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'store:report:'
+
+# Сколько секунд держится блокировка пересчета, если пересчитывающий упал
+LOCK_TTL = 60
+
+# Сколько ждать чужого пересчета при пустом кеше, прежде чем считать самим
+WAIT_SECONDS = 5
+WAIT_STEP = 0.05
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _cache():
+    return caches[_setting('REPORT_CACHE_ALIAS', 'default')]
+
+
+def _store(key, value, soft_ttl):
+    hard_ttl = max(_setting('REPORT_CACHE_HARD_TTL', 60 * 60), soft_ttl)
+    _cache().set(KEY_PREFIX + key, (value, time.time() + soft_ttl), hard_ttl)
+
+
+def _refresh(key, compute, soft_ttl):
+    try:
+        _store(key, compute(), soft_ttl)
+    except Exception:
+        logger.exception('Не удалось пересчитать отчет %s', key)
+    finally:
+        _cache().delete(KEY_PREFIX + 'lock:' + key)
+
+
+def _refresh_in_background(key, compute, soft_ttl):
+    def run():
+        try:
+            _refresh(key, compute, soft_ttl)
+        finally:
+            # Поток вне цикла запроса - соединения с БД закрываем сами
+            connections.close_all()
+
+    # Копия контекста сохраняет выбор базы запроса (чтение с реплики, store/replica.py)
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(run,), name=f'report-refresh:{key}', daemon=True).start()
+
+
+def get(key, compute, soft_ttl=None):
+    """Результат отчета по ключу; compute() считает его заново.
+
+    key должен включать имя отчета и все нормализованные параметры.
+    """
+    if soft_ttl is None:
+        soft_ttl = _setting('REPORT_CACHE_SOFT_TTL', 60)
+    lock_key = KEY_PREFIX + 'lock:' + key
+
+    entry = _cache().get(KEY_PREFIX + key)
+    if entry is not None:
+        value, fresh_until = entry
+        if time.time() >= fresh_until and _cache().add(lock_key, 1, LOCK_TTL):
+            if _setting('REPORT_CACHE_BACKGROUND', True):
+                _refresh_in_background(key, compute, soft_ttl)
+            else:
+                _refresh(key, compute, soft_ttl)
+        return value
+
+    # Кеш пуст: считает один, остальные ждут его результат
+    if not _cache().add(lock_key, 1, LOCK_TTL):
+        deadline = time.time() + WAIT_SECONDS
+        while time.time() < deadline:
+            time.sleep(WAIT_STEP)
+            entry = _cache().get(KEY_PREFIX + key)
+            if entry is not None:
+                return entry[0]
+        return compute()
+
+    try:
+        value = compute()
+        _store(key, value, soft_ttl)
+    finally:
+        _cache().delete(lock_key)
+    return value
+
@@ -0,0 +1,160 @@
+"""Временные резервы товара в корзинах.
+
+Когда покупатель кладет игру в корзину, часть остатка удерживается за ним на
+CART_RESERVATION_TTL секунд. Сумма активных резервов хранится прямо в
+Game.reserved, поэтому доступный остаток (quantity - reserved) читается без
+подсчета резервов. Все изменения reserved - условные UPDATE с F(), так что
+два покупателя не могут зарезервировать больше, чем есть на складе.
+
+Резервы привязаны не к ключу сессии (он меняется при входе), а к токену
+корзины, который хранится вместе с корзиной (store/cart_storage.py). Просроченные резервы пачками снимает
+команда release_reservations; оформление заказа превращает резервы в продажу.
+
+Одна корзина не может удерживать больше CART_MAX_HOLD_PER_LINE копий одной
+игры и больше CART_MAX_HOLD_PER_CART копий всего: иначе анонимный посетитель,
+продлевающий резервы каждым запросом, мог бы держать весь склад.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.utils import timezone
+
+from . import cart_storage
+from .models import Game, Reservation
+
+
+DEFAULT_MAX_PER_LINE = 10
+DEFAULT_MAX_PER_CART = 50
+
+
+def max_per_line():
+    return getattr(settings, 'CART_MAX_HOLD_PER_LINE', DEFAULT_MAX_PER_LINE)
+
+
+def max_per_cart():
+    return getattr(settings, 'CART_MAX_HOLD_PER_CART', DEFAULT_MAX_PER_CART)
+
+
+def limit(holds, game_id):
+    """Сколько копий игры корзина с резервами holds ({game_id: количество}) может удерживать"""
+    others = sum(quantity for held_id, quantity in holds.items() if held_id != game_id)
+    return max(min(max_per_line(), max_per_cart() - others), 0)
+
+
+def ttl():
+    return timedelta(seconds=getattr(settings, 'CART_RESERVATION_TTL', 15 * 60))
+
+
+def holder_key(request, create=True):
+    """Токен корзины текущего посетителя"""
+    return cart_storage.get(request).token(create)
+
+
+def holds_for(holder):
+    """Резервы корзины: {game_id: количество}"""
+    if not holder:
+        return {}
+    return dict(Reservation.objects.filter(holder=holder).values_list('game_id', 'quantity'))
+
+
+def hold(holder, game_id, quantity):
+    """Устанавливает резерв корзины на игру ровно в quantity штук.
+
+    Возвращает False, если свободного остатка не хватило или резерв вышел бы
+    за лимиты корзины (резерв не меняется). quantity <= 0 снимает резерв.
+    """
+    quantity = max(quantity, 0)
+    with transaction.atomic():
+        existing = Reservation.objects.filter(holder=holder, game_id=game_id).first()
+        current = existing.quantity if existing else 0
+        delta = quantity - current
+
+        if delta > 0 and quantity > limit(holds_for(holder), game_id):
+            return False
+        if delta > 0:
+            updated = Game.objects.filter(pk=game_id, quantity__gte=F('reserved') + delta).update(
+                reserved=F('reserved') + delta
+            )
+            if not updated:
+                return False
+        elif delta < 0:
+            Game.objects.filter(pk=game_id).update(reserved=F('reserved') + delta)
+
+        if quantity == 0:
+            if existing:
+                existing.delete()
+        elif existing:
+            Reservation.objects.filter(pk=existing.pk).update(
+                quantity=quantity, expires_at=timezone.now() + ttl()
+            )
+        else:
+            Reservation.objects.create(
+                holder=holder, game_id=game_id, quantity=quantity, expires_at=timezone.now() + ttl()
+            )
+    return True
+
+
+def release(holder, game_id):
+    """Снимает резерв корзины на игру"""
+    hold(holder, game_id, 0)
+
+
+def extend(holder):
+    """Продлевает все резервы корзины (покупатель активен)"""
+    if holder:
+        Reservation.objects.filter(holder=holder).update(expires_at=timezone.now() + ttl())
+
+
+def _subtract_reserved(amounts):
+    """Одним UPDATE уменьшает Game.reserved на {game_id: количество}"""
+    if not amounts:
+        return
+    Game.objects.filter(pk__in=amounts).update(
+        reserved=F('reserved') - Case(
+            *[When(pk=game_id, then=Value(amount)) for game_id, amount in amounts.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+    )
+
+
+def consume(holder, game_ids):
+    """Забирает резервы корзины на игры при оформлении заказа.
+
+    Вызывается внутри транзакции оформления: возвращает {game_id: количество},
+    которое было удержано, и удаляет эти резервы. Game.reserved уменьшает
+    сам вызывающий - вместе со списанием остатка.
+    """
+    if not holder:
+        return {}
+    reservations = Reservation.objects.filter(holder=holder, game_id__in=game_ids)
+    held = dict(reservations.values_list('game_id', 'quantity'))
+    if held:
+        reservations.delete()
+    return held
+
+
+def release_expired(now=None, batch_size=1000):
+    """Снимает все просроченные резервы пачками. Возвращает число снятых резервов"""
+    now = now or timezone.now()
+    released = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                Reservation.objects.filter(expires_at__lte=now)
+                .order_by('expires_at')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not batch:
+                break
+            amounts = dict(
+                Reservation.objects.filter(pk__in=batch)
+                .values('game_id').annotate(total=Sum('quantity'))
+                .values_list('game_id', 'total').order_by()
+            )
+            _subtract_reserved(amounts)
+            Reservation.objects.filter(pk__in=batch).delete()
+        released += len(batch)
+    return released
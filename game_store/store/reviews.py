@@ -0,0 +1,170 @@
+"""Лента отзывов на странице игры.
+
+Отзывы листаются по ключу (keyset), как каталог: курсор хранит значения
+полей сортировки последнего отзыва страницы, поэтому стоимость страницы не
+зависит от того, сколько отзывов уже пролистано. Автор подтягивается через
+select_related.
+
+Первая страница каждой сортировки кешируется для каждой игры и сбрасывается
+сигналами Review (store/signals.py) после фиксации транзакции, когда отзывы
+игры меняются. Кеш REVIEW_CACHE_ALIAS должен быть общим для всех процессов
+(в settings.py - DatabaseCache в таблице review_cache): сброс в кеше одного
+процесса другие не увидят, и они до CACHE_TTL показывали бы страницу без
+нового или одобренного отзыва.
+"""
+import binascii
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Q
+from django.db.models.functions import Length
+from django.utils.dateparse import parse_datetime
+
+from .catalog import _pack, _unpack
+from .models import Review
+
+# Сортировки: имя -> (подпись, [(поле, по убыванию), ...]); id замыкает ключ
+SORTS = {
+    'newest': ('Сначала новые', [('created_at', True), ('id', True)]),
+    'highest': ('Сначала высокие оценки', [('rating', True), ('created_at', True), ('id', True)]),
+    'lowest': ('Сначала низкие оценки', [('rating', False), ('created_at', True), ('id', True)]),
+    'with_text': ('Новые с подробным текстом', [('created_at', True), ('id', True)]),
+}
+DEFAULT_SORT = 'newest'
+PAGE_SIZE = 10
+
+# С какой длины отзыв считается подробным (сортировка with_text)
+DETAILED_MIN_LENGTH = 100
+
+CACHE_TTL = 10 * 60
+
+
+class ReviewPage:
+    """Одна страница отзывов и курсор на следующую"""
+
+    def __init__(self, reviews, next_cursor, sort):
+        self.reviews = reviews
+        self.next_cursor = next_cursor
+        self.sort = sort
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.reviews)
+
+    def __len__(self):
+        return len(self.reviews)
+
+    def __bool__(self):
+        return bool(self.reviews)
+
+
+def normalize_sort(sort):
+    return sort if sort in SORTS else DEFAULT_SORT
+
+
+def sort_choices():
+    return [(name, label) for name, (label, _) in SORTS.items()]
+
+
+def _serialize(review):
+    """Отзыв в виде словаря - его же кладем в кеш и отдаем в JSON"""
+    return {
+        'id': review.id,
+        'username': review.user.username,
+        'is_staff': review.user.is_staff,
+        'rating': review.rating,
+        'comment': review.comment,
+        'created_at': review.created_at,
+    }
+
+
+def _encode_cursor(review, keys):
+    return _pack([
+        review['created_at'].isoformat() if field == 'created_at' else review[field]
+        for field, _ in keys
+    ])
+
+
+def _decode_cursor(cursor, keys):
+    if not cursor:
+        return None
+    try:
+        values = _unpack(cursor)
+        if len(values) != len(keys):
+            return None
+        decoded = []
+        for (field, _), value in zip(keys, values):
+            if field == 'created_at':
+                value = parse_datetime(value)
+                if value is None:
+                    return None
+            else:
+                value = int(value)
+            decoded.append(value)
+        return decoded
+    except (ValueError, TypeError, binascii.Error):
+        return None
+
+
+def _after(keys, values):
+    """Условие "строго после позиции" для составного ключа сортировки"""
+    condition = Q()
+    for index, (field, descending) in enumerate(keys):
+        step = Q(**{f'{field}__{"lt" if descending else "gt"}': values[index]})
+        for prev_index in range(index):
+            step &= Q(**{keys[prev_index][0]: values[prev_index]})
+        condition |= step
+    return condition
+
+
+def page(game_id, sort=DEFAULT_SORT, cursor=None, per_page=PAGE_SIZE):
+    """Страница одобренных отзывов игры после курсора"""
+    sort = normalize_sort(sort)
+    _, keys = SORTS[sort]
+
+    queryset = Review.objects.filter(game_id=game_id, is_approved=True).select_related('user')
+    if sort == 'with_text':
+        queryset = queryset.annotate(comment_length=Length('comment')).filter(
+            comment_length__gte=DETAILED_MIN_LENGTH
+        )
+    queryset = queryset.order_by(*[f'-{field}' if descending else field for field, descending in keys])
+
+    position = _decode_cursor(cursor, keys)
+    if position is not None:
+        queryset = queryset.filter(_after(keys, position))
+
+    # Берем на один отзыв больше, чтобы узнать, есть ли следующая страница
+    reviews = [_serialize(review) for review in queryset[:per_page + 1]]
+    next_cursor = None
+    if len(reviews) > per_page:
+        reviews = reviews[:per_page]
+        next_cursor = _encode_cursor(reviews[-1], keys)
+    return ReviewPage(reviews, next_cursor, sort)
+
+
+def _cache():
+    return caches[getattr(settings, 'REVIEW_CACHE_ALIAS', 'default')]
+
+
+def _cache_key(game_id, sort):
+    return f'store:reviews:{game_id}:{sort}'
+
+
+def first_page(game_id, sort=DEFAULT_SORT):
+    """Первая страница отзывов из кеша"""
+    sort = normalize_sort(sort)
+    key = _cache_key(game_id, sort)
+    cached = _cache().get(key)
+    if cached is not None:
+        return ReviewPage(*cached)
+    result = page(game_id, sort)
+    _cache().set(key, (result.reviews, result.next_cursor, result.sort), CACHE_TTL)
+    return result
+
+
+def invalidate(game_id):
+    """Сбрасывает закешированные первые страницы отзывов игры"""
+    _cache().delete_many([_cache_key(game_id, sort) for sort in SORTS])
@@ -0,0 +1,137 @@
+"""Сводка продаж по дням (SalesDaily).
+
+Отчеты менеджеров читают только эту таблицу: на каждый день в ней по строке
+на проданную игру и одна строка итогов дня (game=NULL), поэтому время ответа
+зависит от числа дней и игр, а не от числа заказов.
+
+Заказ попадает в сводку, когда становится оплаченным или завершенным
+(Order.is_sale), и выходит из нее при отмене или удалении; позиции,
+добавленные к оплаченному заказу или измененные в нем, тоже учитываются.
+Разница вносится атомарными UPDATE с F() после фиксации транзакции
+(store/order_rollups.py); команда rebuild_sales пересчитывает сводку по
+истории заказов.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import OrderItem, SalesDaily
+
+
+def sale_q(prefix=''):
+    """Условие на заказы, которые учитываются в продажах (то же, что Order.is_sale).
+
+    prefix - путь до заказа, например 'order__' для позиций заказа.
+    """
+    return ~Q(**{f'{prefix}status': 'cancelled'}) & (
+        Q(**{f'{prefix}status': 'completed'}) | Q(**{f'{prefix}payment_status': 'completed'})
+    )
+
+
+def sale_day(order):
+    """День продажи - дата оформления заказа в часовом поясе магазина"""
+    return timezone.localdate(order.created_at)
+
+
+def _add(game_id, day, units, revenue, orders):
+    """Прибавляет значения к строке сводки, создавая ее при необходимости"""
+    changes = {
+        'units': F('units') + units,
+        'revenue': F('revenue') + revenue,
+        'orders': F('orders') + orders,
+    }
+    if SalesDaily.objects.filter(game_id=game_id, day=day).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            SalesDaily.objects.create(game_id=game_id, day=day, units=units, revenue=revenue, orders=orders)
+    except IntegrityError:
+        # Строку только что создал параллельный запрос
+        SalesDaily.objects.filter(game_id=game_id, day=day).update(**changes)
+
+
+def _rows(snapshot):
+    """Строки сводки от заказа: {(игра или None, день): [копии, выручка, заказы]}"""
+    rows = defaultdict(lambda: [0, Decimal(0), 0])
+    if snapshot is None:
+        return rows
+    for game_id, quantity, price in snapshot.items:
+        # Строка игры и строка итогов дня; заказ в каждой считается один раз
+        for key in ((game_id, snapshot.day), (None, snapshot.day)):
+            row = rows[key]
+            row[0] += quantity
+            row[1] += quantity * price
+            row[2] = 1
+    return rows
+
+
+def apply_change(before, after):
+    """Вносит в сводку разницу между двумя снимками заказа (store/order_rollups.py)"""
+    old, new = _rows(before), _rows(after)
+    # Строки игр по порядку, итоги дня последними - как при записи заказа
+    keys = sorted(set(old) | set(new), key=lambda key: (key[0] is None, key[0] or 0, key[1]))
+    with transaction.atomic():
+        for game_id, day in keys:
+            units, revenue, orders = (value - old_value for value, old_value in zip(new[game_id, day], old[game_id, day]))
+            if units or revenue or orders:
+                _add(game_id, day, units, revenue, orders)
+
+
+def rebuild(batch_size=1000):
+    """Пересчитывает сводку с нуля по всем оплаченным заказам. Возвращает число строк"""
+    day = TruncDate('order__created_at', tzinfo=timezone.get_current_timezone())
+    items = OrderItem.objects.filter(sale_q('order__')).annotate(day=day)
+    aggregates = {'units': Sum('quantity'), 'revenue': Sum(F('quantity') * F('price')), 'orders': Count('order', distinct=True)}
+
+    rows = [
+        SalesDaily(game_id=row['game_id'], day=row['day'], units=row['units'], revenue=row['revenue'], orders=row['orders'])
+        for row in items.values('game_id', 'day').annotate(**aggregates).order_by()
+    ]
+    rows += [
+        SalesDaily(game_id=None, day=row['day'], units=row['units'], revenue=row['revenue'], orders=row['orders'])
+        for row in items.values('day').annotate(**aggregates).order_by()
+    ]
+
+    with transaction.atomic():
+        SalesDaily.objects.all().delete()
+        SalesDaily.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def top_games(limit=10):
+    """Самые продаваемые игры за все время (values-queryset); limit=None - все игры"""
+    queryset = (
+        SalesDaily.objects.filter(game__isnull=False)
+        .values('game_id', 'game__title', 'game__genre__name')
+        .annotate(total_sold=Sum('units'), total_revenue=Sum('revenue'))
+        .filter(total_sold__gt=0)
+        .order_by('-total_sold', '-total_revenue')
+    )
+    return queryset[:limit] if limit else queryset
+
+
+def daily_totals(start, end):
+    """Итоги по дням с start по end включительно, только дни с продажами (values-queryset)"""
+    return (
+        SalesDaily.objects.filter(game__isnull=True, day__gte=start, day__lte=end, orders__gt=0)
+        .order_by('-day')
+        .values('day', 'orders', 'units', 'revenue')
+    )
+
+
+def period_summary(start, end):
+    """Итоги периода: дни с продажами и общие суммы (для отчета за неделю)"""
+    days = list(daily_totals(start, end))
+    total_orders = sum(day['orders'] for day in days)
+    total_amount = sum(day['revenue'] for day in days)
+    return {
+        'days': days,
+        'total_orders': total_orders,
+        'total_units': sum(day['units'] for day in days),
+        'total_amount': total_amount,
+        'average_amount': total_amount / total_orders if total_orders else 0,
+    }
@@ -0,0 +1,147 @@
+"""Полнотекстовый поиск по каталогу на SQLite FTS5.
+
+Таблица store_game_fts (создается миграцией 0004) хранит копию названия и
+описания каждой игры, rowid совпадает с Game.id. Индекс обновляется сигналами
+(store/signals.py), а целиком перестраивается командой rebuild_search_index.
+На других СУБД поиск откатывается к обычному icontains.
+"""
+import re
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'store_game_fts'
+
+# Вес названия выше веса описания при ранжировании bm25
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+# Сколько лучших совпадений ранжировать при сортировке по релевантности;
+# столько же показывает и счетчик найденных игр
+RANKED_LIMIT = 1000
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+_CYRILLIC_RE = re.compile(r'[а-я]')
+
+# Частые окончания русских слов (от длинных к коротким). Отрезаем их у слов
+# запроса и ищем по префиксу: "приключения" найдет и "приключение".
+_RU_ENDINGS = sorted([
+    'ями', 'ами', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ией', 'иям', 'иях',
+    'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ой', 'ей', 'ий', 'ый', 'ов', 'ев',
+    'ам', 'ям', 'ах', 'ях', 'ом', 'ем', 'ую', 'юю', 'ия',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+], key=len, reverse=True)
+
+
+def is_available():
+    """FTS5 используется только на SQLite"""
+    return connection.vendor == 'sqlite'
+
+
+def normalize_text(text):
+    """Приводит текст к виду, в котором он хранится в индексе (ё -> е)"""
+    return (text or '').replace('ё', 'е').replace('Ё', 'Е')
+
+
+def _stem(word):
+    if len(word) < 5 or not _CYRILLIC_RE.search(word):
+        return word
+    for ending in _RU_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 4:
+            return word[:-len(ending)]
+    return word
+
+
+def build_match_query(query):
+    """Строит выражение MATCH: все слова обязательны, каждое - по префиксу.
+
+    Возвращает None, если в запросе нет ни одного слова.
+    """
+    words = _WORD_RE.findall(normalize_text(query).lower())
+    if not words:
+        return None
+    return ' '.join(f'"{_stem(word)}"*' for word in words)
+
+
+def search_game_ids(query, limit=None):
+    """Id игр, подходящих под запрос, от самых релевантных к менее (не больше RANKED_LIMIT)"""
+    match = build_match_query(query)
+    if match is None:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'ORDER BY bm25({FTS_TABLE}, %s, %s) LIMIT %s',
+            [match, TITLE_WEIGHT, DESCRIPTION_WEIGHT, limit or RANKED_LIMIT],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def matching_ids(query):
+    """Все id игр, подходящих под запрос (без ранжирования и ограничения)"""
+    match = build_match_query(query)
+    if match is None:
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def filter_queryset(queryset, query):
+    """Оставляет в queryset игр только совпадения с запросом (без ранжирования)"""
+    if not is_available():
+        return queryset.filter(Q(title__icontains=query) | Q(description__icontains=query))
+    match = build_match_query(query)
+    if match is None:
+        return queryset.none()
+    return queryset.filter(
+        id__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+    )
+
+
+def index_game(game):
+    """Добавляет или обновляет игру в индексе"""
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [game.pk])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, description) VALUES (%s, %s, %s)',
+            [game.pk, normalize_text(game.title), normalize_text(game.description)],
+        )
+
+
+def remove_game(game_id):
+    """Удаляет игру из индекса"""
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [game_id])
+
+
+def rebuild_index(batch_size=2000):
+    """Перестраивает индекс целиком пачками. Возвращает число игр в индексе"""
+    from .models import Game
+
+    total = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        batch = []
+        rows = Game.objects.values_list('id', 'title', 'description').order_by('id')
+        for game_id, title, description in rows.iterator(chunk_size=batch_size):
+            batch.append((game_id, normalize_text(title), normalize_text(description)))
+            if len(batch) >= batch_size:
+                cursor.executemany(
+                    f'INSERT INTO {FTS_TABLE} (rowid, title, description) VALUES (%s, %s, %s)', batch
+                )
+                total += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, description) VALUES (%s, %s, %s)', batch
+            )
+            total += len(batch)
+        # Сливаем сегменты b-дерева после массовой вставки
+        cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+    return total
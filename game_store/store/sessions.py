@@ -0,0 +1,136 @@
+"""Сессии, которые не пишут в базу без необходимости.
+
+С SESSION_SAVE_EVERY_REQUEST = True стандартный бэкенд db обновляет строку
+django_session на каждом запросе - даже когда покупатель просто листает
+каталог. Этот бэкенд (SESSION_ENGINE = 'store.sessions'):
+
+- сохраняет сессию, только если ее данные действительно изменились -
+  сравнивается отпечаток сериализованных данных, поэтому замечаются и
+  изменения вложенных словарей без request.session.modified;
+- продлевает срок в базе не чаще раза в SESSION_EXTEND_INTERVAL секунд:
+  продление между записями откладывается и делается вместе со следующей
+  записью. Из-за этого сессия в базе может истечь на SESSION_EXTEND_INTERVAL
+  раньше срока в cookie;
+- может читать сессию через кеш SESSION_READ_CACHE (имя кеша из CACHES) и
+  идти в базу только при промахе. По умолчанию кеша нет: он должен быть
+  общим для всех процессов (Redis, memcached), иначе выход или flush() в
+  одном процессе не виден другим, и они отдают устаревшую копию сессии.
+  Кеш в той же базе (DatabaseCache) не нужен - чтение из него стоит столько
+  же, сколько чтение django_session, а запись удваивается.
+
+CompactJSONSerializer (SESSION_SERIALIZER) пишет JSON без экранирования
+не-ASCII символов: кириллица занимает 2 байта UTF-8 вместо 6 байт \\uXXXX.
+Остальное Django уже делает само - JSON без пробелов, сжатый zlib.
+"""
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'store:session:'
+
+
+class CompactJSONSerializer:
+    """JSON-сериализатор сессий в UTF-8; читает и прежние данные в ASCII"""
+
+    def dumps(self, obj):
+        return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+    def loads(self, data):
+        return json.loads(data.decode('utf-8'))
+
+
+def read_cache():
+    """Кеш чтения сессий или None, если он не настроен"""
+    alias = getattr(settings, 'SESSION_READ_CACHE', None)
+    return caches[alias] if alias else None
+
+
+class SessionStore(DBStore):
+    """Сессия в базе с пропуском ненужных записей и необязательным кешем чтения"""
+
+    def __init__(self, session_key=None):
+        self._cache = read_cache()
+        # (отпечаток данных, срок в базе) на момент загрузки или последней записи
+        self._stored = None
+        super().__init__(session_key)
+
+    @property
+    def cache_key(self):
+        return KEY_PREFIX + self._get_or_create_session_key()
+
+    def _digest(self, data):
+        return hashlib.sha1(self.serializer().dumps(data)).hexdigest()
+
+    def _cache_get(self):
+        if self._cache is None:
+            return None
+        try:
+            return self._cache.get(self.cache_key)
+        except Exception:
+            # Некоторые кеши не принимают произвольные ключи - как в cached_db
+            return None
+
+    def _cache_set(self, entry, timeout):
+        if self._cache is None:
+            return
+        try:
+            self._cache.set(self.cache_key, entry, timeout)
+        except Exception:
+            logger.exception('Не удалось сохранить сессию в кеш')
+
+    def load(self):
+        entry = self._cache_get()
+        if entry is None:
+            session = self._get_session_from_db()
+            if not session:
+                self._stored = None
+                return {}
+            entry = (self.decode(session.session_data), session.expire_date)
+            self._cache_set(entry, self.get_expiry_age(expiry=session.expire_date))
+
+        data, expire_date = entry
+        self._stored = (self._digest(data), expire_date)
+        return data
+
+    def _needs_write(self):
+        if self._stored is None:
+            return True
+        digest, expire_date = self._stored
+        if self._digest(self._get_session()) != digest:
+            return True
+        interval = getattr(settings, 'SESSION_EXTEND_INTERVAL', 60 * 60)
+        return (self.get_expiry_date() - expire_date).total_seconds() >= interval
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            # create() выдает ключ и возвращается сюда с must_create=True
+            return self.create()
+        if not must_create and not self._needs_write():
+            return
+        super().save(must_create)
+        data = self._get_session(no_load=must_create)
+        expire_date = self.get_expiry_date()
+        self._stored = (self._digest(data), expire_date)
+        self._cache_set((data, expire_date), self.get_expiry_age())
+
+    def delete(self, session_key=None):
+        super().delete(session_key)
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        if self._cache is not None:
+            self._cache.delete(KEY_PREFIX + session_key)
+        self._stored = None
+
+    def flush(self):
+        """Удаляет текущую сессию из базы и кеша и выдает новый ключ"""
+        self.clear()
+        self.delete(self.session_key)
+        self._session_key = None
@@ -0,0 +1,200 @@
+"""Обработчики сигналов моделей магазина"""
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import cart_storage, facets, order_rollups, placeholders, ratings, renditions, reviews, search, sqlite
+from .models import Game, Genre, Order, OrderItem, Review, Tag
+
+
+@receiver(connection_created)
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """Включает WAL и остальной профиль SQLite для нового соединения"""
+    sqlite.configure(connection)
+
+
+@receiver(user_logged_in)
+def promote_cart_on_login(sender, request, user, **kwargs):
+    """Переносит корзину анонимного покупателя из cookie в сессию"""
+    if request is not None:
+        cart_storage.promote(request)
+
+
+@receiver(post_save, sender=Game)
+def update_search_index(sender, instance, **kwargs):
+    """Обновляет полнотекстовый индекс после сохранения игры"""
+    search.index_game(instance)
+
+
+@receiver(post_delete, sender=Game)
+def remove_from_search_index(sender, instance, **kwargs):
+    """Удаляет игру из полнотекстового индекса"""
+    search.remove_game(instance.pk)
+
+
+@receiver(pre_save, sender=Game)
+def remember_facet_state(sender, instance, **kwargs):
+    """Для игры, созданной в обход загрузки из БД, берем прежние значения из базы"""
+    if instance.pk and not hasattr(instance, '_facet_state'):
+        old = Game.objects.filter(pk=instance.pk).values_list('genre_id', 'quantity', 'price').first()
+        if old is not None:
+            genre_id, quantity, price = old
+            instance._facet_state = (genre_id, quantity > 0, price)
+
+
+@receiver(post_save, sender=Game)
+def update_facets_on_save(sender, instance, created, **kwargs):
+    """Переносит жанр, цену и наличие игры в битовые карты фасетов"""
+    old_state = None if created else getattr(instance, '_facet_state', None)
+    facets.apply_game_change(instance.pk, old_state, (instance.genre_id, instance.quantity > 0, instance.price))
+    instance.remember_facet_state()
+
+
+@receiver(post_delete, sender=Game)
+def update_facets_on_delete(sender, instance, **kwargs):
+    """Снимает удаленную игру со всех битовых карт"""
+    facets.remove_game(instance.pk)
+
+
+@receiver(pre_save, sender=Game)
+def remember_image_state(sender, instance, **kwargs):
+    """Для игры, созданной в обход загрузки из БД, берем прежнее изображение из базы"""
+    if instance.pk and not hasattr(instance, '_image_state'):
+        old = Game.objects.filter(pk=instance.pk).values_list('image', flat=True).first()
+        if old is not None:
+            instance._image_state = old
+
+
+@receiver(post_save, sender=Game)
+def build_image_renditions(sender, instance, created, update_fields, **kwargs):
+    """Строит уменьшенные копии и заглушку, когда у игры появилось новое изображение"""
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    name = instance.image.name or ''
+    if name == getattr(instance, '_image_state', None) or (created and not name):
+        return
+    meta = renditions.process_safely(name)[1] if name else dict(placeholders.EMPTY, image_renditions=[])
+    Game.objects.filter(pk=instance.pk).update(**meta)
+    for field, value in meta.items():
+        setattr(instance, field, value)
+    instance.remember_image_state()
+
+
+@receiver(m2m_changed, sender=Game.tags.through)
+def update_tag_facets(sender, instance, action, reverse, pk_set, **kwargs):
+    """Держит карты тегов в соответствии со связями игра-тег"""
+    if action == 'pre_clear':
+        # Запоминаем связи до очистки, после нее их уже не узнать
+        if reverse:
+            instance._cleared_facet_ids = list(instance.game_set.values_list('id', flat=True))
+        else:
+            instance._cleared_facet_ids = list(instance.tags.values_list('id', flat=True))
+        return
+
+    if action == 'post_clear':
+        pk_set = getattr(instance, '_cleared_facet_ids', [])
+    elif action not in ('post_add', 'post_remove'):
+        return
+
+    added = action == 'post_add'
+    if reverse:
+        facets.apply_tag_change(pk_set, [instance.pk], added)
+    else:
+        facets.apply_tag_change([instance.pk], pk_set, added)
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_save, sender=Tag)
+def update_facet_labels(sender, instance, **kwargs):
+    """Новый или переименованный жанр/тег - процессы перечитают подписи фасетов"""
+    facets.touch_facet_value('genre' if sender is Genre else 'tag', instance.pk)
+
+
+@receiver(post_delete, sender=Genre)
+@receiver(post_delete, sender=Tag)
+def drop_facet_labels(sender, instance, **kwargs):
+    """Удаляет карту удаленного жанра/тега"""
+    facets.drop_facet_value('genre' if sender is Genre else 'tag', instance.pk)
+
+
+@receiver(pre_save, sender=Review)
+def remember_rating_state(sender, instance, **kwargs):
+    """Для отзыва, созданного в обход загрузки из БД, берем прежнюю оценку из базы"""
+    if instance.pk and not hasattr(instance, '_rating_state'):
+        old = Review.objects.filter(pk=instance.pk).values_list('game_id', 'rating', 'is_approved').first()
+        if old is not None:
+            instance._rating_state = old
+
+
+@receiver(post_save, sender=Review)
+def update_rating_on_save(sender, instance, created, **kwargs):
+    """Переносит новую или измененную оценку в агрегаты игры"""
+    old_state = None if created else getattr(instance, '_rating_state', None)
+    ratings.apply_review_change(old_state, (instance.game_id, instance.rating, instance.is_approved))
+    instance.remember_rating_state()
+
+
+@receiver(post_delete, sender=Review)
+def update_rating_on_delete(sender, instance, **kwargs):
+    """Убирает оценку удаленного отзыва из агрегатов игры"""
+    old_state = getattr(instance, '_rating_state', None)
+    if old_state is None:
+        old_state = (instance.game_id, instance.rating, instance.is_approved)
+    ratings.apply_review_change(old_state, None)
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def reset_review_feed(sender, instance, using, **kwargs):
+    """Сбрасывает закешированные первые страницы отзывов игры после фиксации транзакции,
+    чтобы другой процесс не успел закешировать их снова со старыми данными"""
+    game_id = instance.game_id
+    transaction.on_commit(lambda: reviews.invalidate(game_id), using=using)
+
+
+@receiver(pre_save, sender=Order)
+def remember_sale_state(sender, instance, using, **kwargs):
+    """Перед сменой статуса запоминаем, что заказ вносил в сводки"""
+    if instance.pk is None or getattr(instance, '_sale_state', None) == instance.is_sale:
+        instance._rollup_before = {}
+    else:
+        instance._rollup_before = order_rollups.before(using, [instance.pk])
+
+
+@receiver(post_save, sender=Order)
+def update_rollups_on_save(sender, instance, created, using, **kwargs):
+    """Пересчитывает вклад заказа в сводки после фиксации транзакции"""
+    before = {instance.pk: None} if created and instance.is_sale else getattr(instance, '_rollup_before', {})
+    order_rollups.changed(using, before)
+    instance.remember_sale_state()
+
+
+@receiver(pre_delete, sender=Order)
+def remember_deleted_order(sender, instance, using, **kwargs):
+    """Запоминаем вклад удаляемого заказа в сводки, пока его позиции еще в базе"""
+    instance._rollup_before = order_rollups.before(using, [instance.pk])
+
+
+@receiver(pre_save, sender=OrderItem)
+def remember_order_item_state(sender, instance, using, **kwargs):
+    """Запоминаем вклад заказа позиции в сводки (и прежнего заказа, если позицию перенесли)"""
+    order_ids = {instance.order_id}
+    if not instance._state.adding:
+        order_ids.update(OrderItem.objects.using(using).filter(pk=instance.pk).values_list('order_id', flat=True))
+    instance._rollup_before = order_rollups.before(using, order_ids)
+
+
+@receiver(pre_delete, sender=OrderItem)
+def remember_deleted_order_item(sender, instance, using, **kwargs):
+    """Запоминаем вклад заказа удаляемой позиции в сводки"""
+    instance._rollup_before = order_rollups.before(using, [instance.order_id])
+
+
+@receiver(post_delete, sender=Order)
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def schedule_rollup_update(sender, instance, using, **kwargs):
+    """Пересчитывает сводки по заказу после фиксации транзакции"""
+    order_rollups.changed(using, getattr(instance, '_rollup_before', {}))
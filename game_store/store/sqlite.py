@@ -0,0 +1,66 @@
+"""Настройка соединений SQLite под нагрузку.
+
+По умолчанию SQLite работает с журналом отката: пишущая транзакция блокирует
+весь файл, и на время записи сессии (SESSION_SAVE_EVERY_REQUEST) читатели
+ждут. В режиме WAL читатели и писатель не мешают друг другу, а
+synchronous=NORMAL убирает fsync с каждого коммита (fsync остается на
+контрольных точках - при WAL это не грозит порчей базы).
+
+Профиль применяется к каждому новому соединению через сигнал
+connection_created (store/signals.py). Кроме PRAGMA он переводит транзакции
+в режим BEGIN IMMEDIATE: блокировка записи берется в начале atomic(), а не
+при первой записи посередине транзакции, когда повышение блокировки может
+закончиться ошибкой "database is locked" без ожидания.
+"""
+from django.conf import settings
+
+# Значения по умолчанию; каждое переопределяется настройкой SQLITE_<ИМЯ>
+DEFAULTS = {
+    'JOURNAL_MODE': 'WAL',
+    'SYNCHRONOUS': 'NORMAL',
+    'MMAP_SIZE': 256 * 1024 * 1024,   # байт файла, читаемых через mmap
+    'CACHE_SIZE': -64 * 1024,         # отрицательное значение - КиБ (64 МиБ)
+    'BUSY_TIMEOUT': 5000,             # мс ожидания чужой блокировки
+    'TEMP_STORE': 'MEMORY',
+    'TRANSACTION_MODE': 'IMMEDIATE',
+}
+
+# Порядок важен: busy_timeout должен действовать до смены журнала
+PRAGMAS = ('BUSY_TIMEOUT', 'JOURNAL_MODE', 'SYNCHRONOUS', 'MMAP_SIZE', 'CACHE_SIZE', 'TEMP_STORE')
+
+
+def _setting(name):
+    return getattr(settings, f'SQLITE_{name}', DEFAULTS[name])
+
+
+def enabled():
+    return getattr(settings, 'SQLITE_CONNECTION_PROFILE', True)
+
+
+def pragmas():
+    """Список (pragma, значение) текущего профиля; None в настройке отключает pragma"""
+    return [(name.lower(), _setting(name)) for name in PRAGMAS if _setting(name) is not None]
+
+
+def configure(connection):
+    """Применяет профиль к только что открытому соединению SQLite"""
+    if connection.vendor != 'sqlite' or not enabled():
+        return
+
+    for name, value in pragmas():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
+
+    # Явно заданный в DATABASES OPTIONS режим транзакций важнее профиля
+    if 'transaction_mode' not in connection.settings_dict['OPTIONS']:
+        mode = _setting('TRANSACTION_MODE')
+        connection.transaction_mode = mode.upper() if mode else None
+
+
+def current_pragmas(connection):
+    """Фактические значения PRAGMA соединения - для диагностики и бенчмарка"""
+    with connection.cursor() as cursor:
+        values = {}
+        for name in PRAGMAS:
+            cursor.execute(f'PRAGMA {name.lower()}')
+            values[name.lower()] = cursor.fetchone()[0]
+    return values
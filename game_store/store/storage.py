@@ -0,0 +1,93 @@
+"""Хранилище медиафайлов с адресацией по содержимому.
+
+Загруженный файл получает имя по хешу своих байтов, а каталоги делятся по
+первым символам хеша, чтобы в одном каталоге не копились тысячи файлов:
+
+    games/images/poster.jpg -> games/images/3f/a2/3fa2...e1.jpg
+
+Одинаковые файлы ложатся под одно имя и хранятся один раз: повторная
+загрузка той же обложки не создает poster_1.jpg, а возвращает уже
+сохраненный файл. Содержимое по имени никогда не меняется, поэтому такие
+файлы можно кешировать навсегда (Cache-Control: immutable, см.
+views.media_file).
+
+Имена, которые уже имеют такой вид (в том числе уменьшенные копии
+hash.640w.webp из store/renditions.py), сохраняются как есть.
+"""
+import hashlib
+import posixpath
+import re
+
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage
+
+# Сколько шестнадцатеричных символов SHA-256 оставлять в имени (160 бит)
+HASH_LENGTH = 40
+
+ADDRESSED_NAME = re.compile(
+    r'(?:^|/)(?P<a>[0-9a-f]{2})/(?P<b>[0-9a-f]{2})/(?P=a)(?P=b)[0-9a-f]{%d}(?:\.[^/]*)?$' % (HASH_LENGTH - 4)
+)
+
+
+class _AlreadyStored(Exception):
+    """Файл с таким содержимым уже лежит в хранилище"""
+
+
+def is_addressed(name):
+    return bool(name and ADDRESSED_NAME.search(name))
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def addressed_name(name, content):
+    """Имя файла по содержимому в том же каталоге: dir/ab/cd/abcd...ext"""
+    digest = content_hash(content)
+    directory = posixpath.dirname(name)
+    extension = posixpath.splitext(name)[1].lower()
+    return posixpath.join(directory, digest[:2], digest[2:4], digest + extension)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage, который называет файлы по хешу и не хранит дубликаты"""
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        if not is_addressed(name):
+            name = addressed_name(name, content)
+        if self.exists(name):
+            return name
+        try:
+            return super().save(name, content, max_length)
+        except _AlreadyStored:
+            return name
+
+    def save_exact(self, name, content):
+        """Сохраняет файл под заданным именем, заменяя прежний.
+
+        Для производных файлов, имя которых выводится из имени оригинала
+        (уменьшенные копии store/renditions.py), а не из их содержимого.
+        """
+        if self.exists(name):
+            self.delete(name)
+        return super().save(name, content)
+
+    def get_available_name(self, name, max_length=None):
+        # Такое имя уже занято тем же содержимым - записывать нечего
+        if is_addressed(name) and self.exists(name):
+            raise _AlreadyStored(name)
+        return super().get_available_name(name, max_length)
+
+    def _save(self, name, content):
+        try:
+            return super()._save(name, content)
+        except _AlreadyStored:
+            # Параллельная загрузка тех же байтов успела раньше
+            return name
@@ -0,0 +1,44 @@
+"""Теги шаблонов для изображений игр"""
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from store import placeholders, renditions
+
+register = template.Library()
+
+# Ширина, под которую выбирается src для браузеров без поддержки srcset
+FALLBACK_WIDTH = 640
+
+
+def _attrs(**attrs):
+    """Атрибуты тега; пустые значения пропускаются"""
+    return format_html_join('', ' {}="{}"', ((name, value) for name, value in attrs.items() if value))
+
+
+@register.simple_tag
+def game_image(game, sizes='100vw', css_class='', style=''):
+    """<picture> с копиями обложки игры в WebP и JPEG и ленивой загрузкой.
+
+    sizes - ширина картинки в макете, как в атрибуте sizes: "(max-width: 600px) 100vw, 300px".
+    Если копий еще нет, выводится оригинал. Размеры и заглушка (store/placeholders.py)
+    выводятся прямо в <img>: место под картинку занято сразу, а до загрузки виден
+    размытый фон.
+    """
+    name = game.image.name
+    built = game.image_renditions or []
+    common = {
+        'alt': game.title, 'class': css_class, 'style': placeholders.style(game) + style,
+        'width': game.image_width, 'height': game.image_height, 'loading': 'lazy', 'decoding': 'async',
+    }
+    if not built:
+        return format_html('<img{}>', _attrs(src=game.image.url, **common))
+
+    fallback = next((width for width in built if width >= FALLBACK_WIDTH), built[-1])
+    return format_html(
+        '<picture><source{}><img{}></picture>',
+        _attrs(type='image/webp', srcset=renditions.srcset(name, built, 'webp'), sizes=sizes),
+        _attrs(
+            src=game.image.storage.url(renditions.rendition_name(name, fallback, 'jpg')),
+            srcset=renditions.srcset(name, built, 'jpg'), sizes=sizes, **common,
+        ),
+    )
@@ -1,3 +1,666 @@
-from django.test import TestCase
+"""Регрессионные тесты планов запросов.
 
-# Create your tests here.
+Каждая проверка открывает страницу тестовым клиентом, записывает все
+SELECT, которые выполнило представление, и прогоняет их через
+EXPLAIN QUERY PLAN. Тест падает, если горячий запрос читает большую таблицу
+целиком (SCAN без индекса) или сортирует ленту во временном B-дереве вместо
+того, чтобы идти по индексу.
+
+CheckoutTests проверяют, что условное списание остатка не продает
+последний экземпляр дважды, OutboxTests - очередь писем на locmem-бэкенде,
+SessionTests - запись сессий только при изменении, SalesRollupTests - сводку
+продаж и совместные покупки при любом порядке сохранения заказа и позиций,
+ReviewFeedTests - сброс кеша первой страницы отзывов, CartHoldLimitTests -
+лимиты резервов одной корзины, AdmissionTests - очередь на оформление,
+SearchTests - счетчик результатов поиска, AnalyticsTests - сравнение периодов,
+ExportTests - потоковые выгрузки, StaticFilesTests - кеширование статики.
+"""
+import json
+import os
+import re
+import shutil
+import tempfile
+import unittest
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+from smtplib import SMTPException
+from types import SimpleNamespace
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core import mail
+from django.core.cache import caches
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import admission, analytics, exports, order_rollups, orders, outbox, recommendations, reviews, sales, search, sessions
+from .models import AdmissionTicket, CoPurchase, Customer, Game, Genre, Order, OrderItem, OutboxEmail, Review, SalesDaily, Tag
+
+# Таблицы, которые растут вместе с магазином: полный просмотр недопустим
+HOT_TABLES = {
+    'store_game', 'store_review', 'store_order', 'store_orderitem', 'store_salesdaily',
+    'store_reservation', 'store_admissionticket', 'store_outboxemail', 'store_copurchase', 'store_gameneighbor',
+}
+
+FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+
+
+class QueryRecorder:
+    """Обертка execute_wrapper: запоминает SQL и параметры всех запросов"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+    def selects(self, table=None):
+        return [
+            (sql, params) for sql, params in self.queries
+            if sql.lstrip().upper().startswith('SELECT') and (table is None or f'"{table}"' in sql)
+        ]
+
+
+def explain(sql, params):
+    """Строки плана EXPLAIN QUERY PLAN (колонка detail)"""
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return [row[3] for row in cursor.fetchall()]
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'Планы запросов проверяются на SQLite')
+class QueryPlanTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.genre = Genre.objects.create(name='RPG')
+        cls.other_genre = Genre.objects.create(name='Шутер')
+        tag = Tag.objects.create(name='Мультиплеер')
+        cls.games = []
+        for index in range(60):
+            game = Game.objects.create(
+                title=f'Игра {index:02d}', description='Описание', price=Decimal(100 + index * 10),
+                quantity=index % 4, genre=cls.genre if index % 2 else cls.other_genre,
+            )
+            game.tags.add(tag)
+            cls.games.append(game)
+        cls.game = cls.games[1]
+
+        cls.user = User.objects.create_user('buyer', 'buyer@example.com', 'p')
+        cls.manager = User.objects.create_user('manager', 'manager@example.com', 'p', is_staff=True)
+        for index in range(12):
+            author = User.objects.create_user(f'reviewer{index}')
+            Review.objects.create(game=cls.game, user=author, rating=index % 5 + 1, comment='Отзыв ' * (index + 1))
+
+        customer = Customer.objects.create(user=cls.user)
+        for index in range(5):
+            order = Order.objects.create(customer=customer, total_amount=cls.game.price)
+            OrderItem.objects.create(order=order, game=cls.game, quantity=1, price=cls.game.price)
+            # Вторая игра в заказе - для блока "С этой игрой покупают"
+            other = cls.games[3 + index % 2]
+            OrderItem.objects.create(order=order, game=other, quantity=1, price=other.price)
+            order.status = 'completed'
+            order.save()
+
+    def setUp(self):
+        # Первые страницы отзывов и отчеты кешируются - нужны настоящие запросы
+        for alias in settings.CACHES:
+            caches[alias].clear()
+
+    def record(self, url, user=None):
+        if user is not None:
+            self.client.force_login(user)
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            response = self.client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400, url)
+        return recorder
+
+    def assertNoFullScans(self, recorder):
+        for sql, params in recorder.selects():
+            for detail in explain(sql, params):
+                match = FULL_SCAN.match(detail)
+                if match and match.group(1) in HOT_TABLES:
+                    self.fail(f'Полный просмотр {match.group(1)}: {detail}\n{sql}')
+
+    def assertIndexedOrder(self, sql, params):
+        plan = explain(sql, params)
+        self.assertFalse(
+            [detail for detail in plan if 'TEMP B-TREE FOR' in detail and 'ORDER BY' in detail],
+            f'Сортировка без индекса: {plan}\n{sql}',
+        )
+        self.assertFalse([detail for detail in plan if FULL_SCAN.match(detail)], f'{plan}\n{sql}')
+
+    def test_catalog_sorts_use_partial_indexes(self):
+        for sort in ('title', 'newest', 'price_asc', 'price_desc'):
+            with self.subTest(sort=sort):
+                recorder = self.record(f'/games/?sort={sort}')
+                self.assertNoFullScans(recorder)
+                sql, params = recorder.selects('store_game')[0]
+                self.assertIndexedOrder(sql, params)
+                self.assertTrue(any('game_in_stock' in detail for detail in explain(sql, params)))
+
+    def test_catalog_next_page(self):
+        first = self.client.get('/games/?sort=price_desc')
+        cursor = first.context['page'].next_cursor
+        self.assertIsNotNone(cursor)
+        recorder = self.record(f'/games/?sort=price_desc&cursor={cursor}')
+        sql, params = recorder.selects('store_game')[0]
+        self.assertIndexedOrder(sql, params)
+
+    def test_catalog_filters(self):
+        for url in (f'/games/?genre={self.genre.id}', '/games/?stock=all&sort=newest', '/games/?search=Игра'):
+            with self.subTest(url=url):
+                self.assertNoFullScans(self.record(url))
+
+    def test_home(self):
+        self.assertNoFullScans(self.record('/'))
+
+    def test_review_feed_sorts(self):
+        for sort in ('newest', 'highest', 'lowest', 'with_text'):
+            with self.subTest(sort=sort):
+                recorder = self.record(f'/games/{self.game.id}/reviews/?sort={sort}')
+                self.assertNoFullScans(recorder)
+                sql, params = recorder.selects('store_review')[0]
+                self.assertIndexedOrder(sql, params)
+
+    def test_game_detail(self):
+        self.assertNoFullScans(self.record(f'/games/{self.game.id}/', user=self.user))
+
+    def test_game_detail_reads_neighbors_by_index(self):
+        recorder = self.record(f'/games/{self.game.id}/')
+        neighbors = recorder.selects('store_gameneighbor')
+        self.assertEqual(len(neighbors), 1)
+        self.assertIndexedOrder(*neighbors[0])
+
+    def test_order_history(self):
+        recorder = self.record('/orders/history/', user=self.user)
+        self.assertNoFullScans(recorder)
+        sql, params = recorder.selects('store_order')[-1]
+        self.assertIndexedOrder(sql, params)
+
+    def test_cart(self):
+        self.client.force_login(self.user)
+        self.client.post(f'/cart/add/{self.game.id}/', {'quantity': 1})
+        self.assertNoFullScans(self.record('/cart/'))
+
+    def test_reports(self):
+        for url in (
+            '/reports/top-games/',
+            '/reports/weekly-sales/',
+            '/reports/sales/',
+            '/reports/sales/?bucket=hour',
+            '/reports/sales/?bucket=week&status=completed',
+            f'/reports/sales/?genre={self.genre.id}',
+        ):
+            with self.subTest(url=url):
+                self.assertNoFullScans(self.record(url, user=self.manager))
+
+    def test_weekly_sales_reads_rollup_by_index(self):
+        recorder = self.record('/reports/weekly-sales/', user=self.manager)
+        sql, params = recorder.selects('store_salesdaily')[0]
+        self.assertIndexedOrder(sql, params)
+
+
+class CheckoutTests(TestCase):
+    """Оформление заказа: последний экземпляр продается один раз"""
+
+    @classmethod
+    def setUpTestData(cls):
+        genre = Genre.objects.create(name='RPG')
+        cls.game = Game.objects.create(
+            title='Последняя копия', description='Описание', price=Decimal(500), quantity=1, genre=genre,
+        )
+        cls.user = User.objects.create_user('buyer', 'buyer@example.com', 'p')
+        cls.customers = [
+            Customer.objects.create(user=cls.user),
+            Customer.objects.create(user=User.objects.create_user('rival', 'rival@example.com', 'p')),
+        ]
+
+    def test_last_copy_is_sold_once(self):
+        # Обе покупки загрузили игру до того, как кто-то из них списал остаток
+        copies = [Game.objects.get(pk=self.game.pk) for _ in self.customers]
+        placed = failed = 0
+        for customer, game in zip(self.customers, copies):
+            try:
+                orders.place_order(customer, [(game, 1)])
+                placed += 1
+            except orders.OutOfStock:
+                failed += 1
+
+        self.assertEqual((placed, failed), (1, 1))
+        self.game.refresh_from_db()
+        self.assertEqual(self.game.quantity, 0)
+        self.assertEqual(OrderItem.objects.filter(game=self.game).count(), 1)
+
+    def test_checkout_ignores_malformed_cart_keys(self):
+        self.client.force_login(self.user)
+        session = self.client.session
+        session['cart'] = {'мусор': {'quantity': 1}, str(self.game.pk): {'quantity': 1}}
+        session.save()
+
+        response = self.client.post('/checkout/')
+
+        order = Order.objects.get(customer__user=self.user)
+        self.assertRedirects(response, f'/payment/{order.pk}/', fetch_redirect_response=False)
+        self.assertEqual(list(order.orderitem_set.values_list('game_id', flat=True)), [self.game.pk])
+
+
+class FailingSendBackend(locmem.EmailBackend):
+    """locmem, на котором каждая отправка падает"""
+
+    def send_messages(self, messages):
+        raise SMTPException('450 mailbox unavailable')
+
+
+class UnreachableBackend(locmem.EmailBackend):
+    """locmem, который не может открыть соединение - как SMTP на закрытом порту"""
+
+    def open(self):
+        raise ConnectionRefusedError(111, 'Connection refused')
+
+
+class OutboxTests(TestCase):
+    """Очередь писем: отправка, повторы с задержкой и недоступный сервер"""
+
+    def setUp(self):
+        self.emails = [outbox.enqueue(f'Заказ #{index}', 'Текст', [f'buyer{index}@example.com']) for index in range(3)]
+
+    def assertDeferred(self, email, attempts, status='pending'):
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (status, attempts))
+        self.assertTrue(email.last_error)
+        expected = timezone.now() + outbox.backoff(attempts)
+        self.assertAlmostEqual(email.next_attempt_at.timestamp(), expected.timestamp(), delta=5)
+
+    def test_send(self):
+        self.assertEqual(outbox.send_batch(), (3, 0))
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), [email.to for email in self.emails])
+        self.assertEqual(OutboxEmail.objects.filter(status='sent', attempts=1).count(), 3)
+        # Отправленные письма не забираются повторно
+        self.assertEqual(outbox.send_batch(), (0, 0))
+
+    def test_failed_send_is_retried_with_backoff(self):
+        self.assertEqual(outbox.send_batch(connection=FailingSendBackend()), (0, 3))
+        for email in self.emails:
+            self.assertDeferred(email, attempts=1)
+        # До истечения задержки письма не забираются
+        self.assertEqual(outbox.send_batch(), (0, 0))
+
+        OutboxEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(outbox.send_batch(), (3, 0))
+        self.assertEqual(len(mail.outbox), 3)
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=2)
+    def test_max_attempts(self):
+        OutboxEmail.objects.update(attempts=1)
+        outbox.send_batch(connection=FailingSendBackend())
+        for email in self.emails:
+            self.assertDeferred(email, attempts=2, status='failed')
+        OutboxEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(outbox.send_batch(), (0, 0))
+
+    def test_unreachable_server_defers_whole_batch(self):
+        self.assertEqual(outbox.send_batch(connection=UnreachableBackend()), (0, 3))
+        for email in self.emails:
+            self.assertDeferred(email, attempts=1)
+        self.assertEqual(mail.outbox, [])
+
+    def test_worker_keeps_running_when_server_is_unreachable(self):
+        stdout, stderr = StringIO(), StringIO()
+        with override_settings(EMAIL_BACKEND='store.tests.UnreachableBackend'):
+            call_command('send_outbox', once=True, stdout=stdout, stderr=stderr)
+        self.assertIn('ошибок: 3', stdout.getvalue())
+        self.assertEqual(OutboxEmail.objects.filter(status='pending', attempts=1).count(), 3)
+
+
+class SessionTests(TestCase):
+    """Сессии: запись только при изменении, выход виден всем процессам"""
+
+    def session_writes(self, store):
+        with CaptureQueriesContext(connection) as queries:
+            store.save()
+        return [q['sql'] for q in queries if 'django_session' in q['sql'] and not q['sql'].startswith('SELECT')]
+
+    def test_unchanged_session_is_not_written(self):
+        store = sessions.SessionStore()
+        store['cart'] = {'1': {'quantity': 2}}
+        store.save()
+
+        loaded = sessions.SessionStore(store.session_key)
+        self.assertEqual(loaded['cart'], {'1': {'quantity': 2}})
+        self.assertEqual(self.session_writes(loaded), [])
+        loaded['cart']['1']['quantity'] = 3
+        self.assertEqual(len(self.session_writes(loaded)), 1)
+
+    def test_flush_is_seen_by_other_stores(self):
+        store = sessions.SessionStore()
+        store['_auth_user_id'] = '1'
+        store.save()
+        key = store.session_key
+        # Другой процесс уже читал эту сессию
+        self.assertEqual(sessions.SessionStore(key)['_auth_user_id'], '1')
+
+        store.flush()
+        self.assertNotIn('_auth_user_id', sessions.SessionStore(key))
+
+    def test_payload_keeps_non_ascii_text(self):
+        serializer = sessions.CompactJSONSerializer()
+        data = {'message': 'Игра добавлена в корзину'}
+        self.assertEqual(serializer.loads(serializer.dumps(data)), data)
+        self.assertLess(len(serializer.dumps(data)), len(json.dumps(data).encode('ascii')))
+        # Сессии, записанные прежним JSONSerializer, читаются
+        self.assertEqual(serializer.loads(json.dumps(data).encode('latin-1')), data)
+
+
+class SalesRollupTests(TestCase):
+    """Сводка продаж и совместные покупки совпадают с пересчетом по истории заказов"""
+
+    @classmethod
+    def setUpTestData(cls):
+        genre = Genre.objects.create(name='RPG')
+        cls.games = [
+            Game.objects.create(title=f'Игра {i}', description='Описание', price=Decimal(100 * i), quantity=10, genre=genre)
+            for i in (1, 2)
+        ]
+        cls.customer = Customer.objects.create(user=User.objects.create_user('buyer', 'buyer@example.com', 'p'))
+        cls.manager = User.objects.create_user('manager', 'manager@example.com', 'p', is_staff=True)
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def rollup(self):
+        return sorted(SalesDaily.objects.values_list('game_id', 'day', 'units', 'revenue', 'orders'), key=str)
+
+    def assertMatchesRebuild(self):
+        rollup = [row for row in self.rollup() if row[4]]
+        sales.rebuild()
+        self.assertEqual(rollup, self.rollup())
+
+    def test_items_added_after_status(self):
+        # Как админка с инлайном позиций и скрипты: сначала оплаченный заказ, потом позиции
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(customer=self.customer, status='completed', payment_status='completed')
+            for game in self.games:
+                OrderItem.objects.create(order=order, game=game, quantity=2, price=game.price)
+        total = SalesDaily.objects.get(game=None)
+        self.assertEqual((total.units, total.revenue, total.orders), (4, Decimal(600), 1))
+        self.assertMatchesRebuild()
+
+        # Правка и удаление позиций уже оплаченного заказа
+        item = order.orderitem_set.get(game=self.games[0])
+        item.quantity = 5
+        with self.captureOnCommitCallbacks(execute=True):
+            item.save()
+        self.assertEqual(SalesDaily.objects.get(game=self.games[0]).units, 5)
+        with self.captureOnCommitCallbacks(execute=True):
+            order.orderitem_set.get(game=self.games[1]).delete()
+        self.assertMatchesRebuild()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order.delete()
+        self.assertEqual(SalesDaily.objects.filter(orders__gt=0).count(), 0)
+
+    def test_status_change_counts_order_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(customer=self.customer)
+            OrderItem.objects.create(order=order, game=self.games[0], quantity=1, price=self.games[0].price)
+            order.payment_status = 'completed'
+            order.save()
+            OrderItem.objects.create(order=order, game=self.games[1], quantity=1, price=self.games[1].price)
+        self.assertEqual(SalesDaily.objects.get(game=None).orders, 1)
+        self.assertMatchesRebuild()
+
+        order.status = 'cancelled'
+        with self.captureOnCommitCallbacks(execute=True):
+            order.save()
+        self.assertEqual(SalesDaily.objects.filter(orders__gt=0).count(), 0)
+
+    def test_co_purchases_follow_items(self):
+        first, second = self.games
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(customer=self.customer, status='completed')
+            OrderItem.objects.create(order=order, game=first, quantity=1, price=first.price)
+        self.assertEqual(recommendations.for_game(first.pk), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            OrderItem.objects.create(order=order, game=second, quantity=1, price=second.price)
+        self.assertEqual(recommendations.for_game(first.pk), [second])
+        self.assertEqual(recommendations.for_game(second.pk), [first])
+        cells = sorted(CoPurchase.objects.values_list('game_id', 'other_id', 'orders'))
+        recommendations.rebuild()
+        self.assertEqual(cells, sorted(CoPurchase.objects.values_list('game_id', 'other_id', 'orders')))
+
+        order.status = 'cancelled'
+        with self.captureOnCommitCallbacks(execute=True):
+            order.save()
+        self.assertFalse(CoPurchase.objects.exists())
+        self.assertEqual(recommendations.for_game(first.pk), [])
+
+    def test_uncounted_cancellation_keeps_cells_non_negative(self):
+        first, second = self.games
+        CoPurchase.objects.create(game=first, other=second, orders=1)
+        before = order_rollups.Snapshot(date.today(), [(first.pk, 1, first.price), (second.pk, 1, second.price)])
+        # Отмена заказа, который не попал в матрицу: ячейки (second, first) нет
+        recommendations.apply_change(before, None)
+        self.assertFalse(CoPurchase.objects.exists())
+
+    def test_weekly_report_covers_seven_days(self):
+        self.client.force_login(self.manager)
+        data = self.client.get('/reports/weekly-sales/?format=json').json()
+        start, end = (date.fromisoformat(day) for day in data['period'].split(' - '))
+        self.assertEqual((end - start).days, 6)
+
+
+class ReviewFeedTests(TestCase):
+    """Первая страница отзывов: общий кеш, сброс после фиксации"""
+
+    @classmethod
+    def setUpTestData(cls):
+        genre = Genre.objects.create(name='RPG')
+        cls.game = Game.objects.create(title='Игра', description='Описание', price=Decimal(100), quantity=1, genre=genre)
+        cls.user = User.objects.create_user('author', 'author@example.com', 'p')
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def test_first_page_is_cached_in_shared_cache(self):
+        self.assertEqual(settings.CACHES[settings.REVIEW_CACHE_ALIAS]['BACKEND'],
+                         'django.core.cache.backends.db.DatabaseCache')
+        self.assertEqual(len(reviews.first_page(self.game.pk)), 0)
+        with self.assertNumQueries(1):
+            reviews.first_page(self.game.pk)
+
+    def test_new_and_approved_reviews_reset_first_page(self):
+        reviews.first_page(self.game.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            review = Review.objects.create(game=self.game, user=self.user, rating=5, comment='Отлично', is_approved=False)
+        self.assertEqual(len(reviews.first_page(self.game.pk)), 0)
+
+        review.is_approved = True
+        with self.captureOnCommitCallbacks(execute=True):
+            review.save()
+        self.assertEqual([item['id'] for item in reviews.first_page(self.game.pk)], [review.pk])
+
+
+class CartHoldLimitTests(TestCase):
+    """Одна корзина не может зарезервировать весь склад"""
+
+    @classmethod
+    def setUpTestData(cls):
+        genre = Genre.objects.create(name='RPG')
+        cls.games = [
+            Game.objects.create(title=f'Хит {i}', description='Описание', price=Decimal(100), quantity=55, genre=genre)
+            for i in (1, 2)
+        ]
+
+    def set_quantity(self, game, quantity):
+        return self.client.post(
+            '/cart/api/', json.dumps({'lines': [{'game_id': game.pk, 'quantity': quantity}]}),
+            content_type='application/json',
+        ).json()
+
+    def reserved(self):
+        return [game.reserved for game in Game.objects.order_by('pk')]
+
+    @override_settings(CART_MAX_HOLD_PER_LINE=10)
+    def test_line_hold_is_capped(self):
+        game = self.games[0]
+        self.client.post(f'/cart/add/{game.pk}/', {'quantity': 11})
+        self.assertEqual(self.reserved(), [0, 0])
+
+        self.client.post(f'/cart/add/{game.pk}/', {'quantity': 1})
+        data = self.set_quantity(game, 55)
+        self.assertEqual(data['lines'][0]['quantity'], 10)
+        self.assertEqual(data['lines'][0]['max_quantity'], 10)
+        self.assertTrue(data['warnings'])
+        self.assertEqual(self.reserved(), [10, 0])
+
+    @override_settings(CART_MAX_HOLD_PER_LINE=10, CART_MAX_HOLD_PER_CART=12)
+    def test_cart_hold_is_capped(self):
+        first, second = self.games
+        self.client.post(f'/cart/add/{first.pk}/', {'quantity': 10})
+        self.client.post(f'/cart/add/{second.pk}/', {'quantity': 3})
+        self.client.post(f'/cart/add/{second.pk}/', {'quantity': 1})
+        self.assertEqual(self.reserved(), [10, 1])
+
+        self.set_quantity(second, 10)
+        self.assertEqual(self.reserved(), [10, 2])
+
+
+class AdmissionTests(TestCase):
+    """Очередь на оформление: опрос из очереди не пишет в базу"""
+
+    def visitor(self):
+        return SimpleNamespace(session={})
+
+    @override_settings(CHECKOUT_MAX_CONCURRENT=1)
+    def test_queued_poll_only_reads(self):
+        first, second = self.visitor(), self.visitor()
+        self.assertTrue(admission.enter(first).admitted)
+        self.assertEqual(admission.enter(second).position, 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            result = admission.enter(second)
+        self.assertFalse(result.admitted)
+        self.assertEqual([q['sql'] for q in queries if not q['sql'].startswith('SELECT')], [])
+
+        admission.release(first)
+        self.assertTrue(admission.enter(second).admitted)
+
+    def test_concurrent_requests_share_one_ticket(self):
+        visitor = self.visitor()
+        token = visitor.session[admission.SESSION_KEY] = 'a' * 32
+        created = []
+
+        def concurrent_request(execute, sql, params, many, context):
+            result = execute(sql, params, many, context)
+            if not created and sql.startswith('SELECT') and AdmissionTicket._meta.db_table in sql:
+                # Второй запрос того же посетителя создал место сразу после нашей проверки
+                created.append(AdmissionTicket.objects.create(token=token, last_seen=timezone.now()))
+            return result
+
+        with connection.execute_wrapper(concurrent_request):
+            self.assertTrue(admission.enter(visitor).admitted)
+        self.assertEqual(list(AdmissionTicket.objects.values_list('pk', flat=True)), [created[0].pk])
+
+
+class SearchTests(TestCase):
+    """Поиск по релевантности: счетчик совпадает с тем, что можно пролистать"""
+
+    @classmethod
+    def setUpTestData(cls):
+        genre = Genre.objects.create(name='RPG')
+        for i in range(3):
+            Game.objects.create(title=f'Дракон {i}', description='Описание', price=Decimal(100), quantity=1, genre=genre)
+
+    def test_count_matches_ranked_results(self):
+        with mock.patch.object(search, 'RANKED_LIMIT', 2):
+            response = self.client.get('/games/?search=Дракон')
+        self.assertEqual(response.context['facets'].total, 2)
+        self.assertEqual(len(response.context['page']), 2)
+        self.assertIsNone(response.context['page'].next_cursor)
+        self.assertTrue(response.context['search_truncated'])
+
+        # Без ранжирования совпадения не ограничены
+        response = self.client.get('/games/?search=Дракон&sort=newest')
+        self.assertEqual(response.context['facets'].total, 3)
+
+
+class AnalyticsTests(TestCase):
+    """Сравнение с предыдущим периодом не теряет интервалы"""
+
+    def test_compare_keeps_unmatched_buckets(self):
+        # Март - один месяц, предыдущие 31 день - конец января и февраль
+        query = analytics.SalesQuery(date(2026, 3, 1), date(2026, 3, 31), bucket='month', compare=True)
+        result = analytics.compute(query)
+        rows = analytics.compare_rows(result)
+
+        self.assertEqual(len(result['buckets']), 1)
+        self.assertEqual(len(result['previous']['buckets']), 2)
+        self.assertEqual([(row['start'], row['previous']['start']) for row in rows],
+                         [('2026-03-01', '2026-01-01'), ('', '2026-02-01')])
+        self.assertEqual(rows[1]['revenue'], 0)
+
+
+class ExportTests(TestCase):
+    """Выгрузка рейтинга всех игр читается из базы порциями"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user('manager', 'manager@example.com', 'p', is_staff=True)
+        genre = Genre.objects.create(name='RPG')
+        for i in range(3):
+            game = Game.objects.create(title=f'Игра {i}', description='Описание', price=Decimal(100), quantity=1, genre=genre)
+            SalesDaily.objects.create(game=game, day=date(2026, 1, 1), units=i + 1, revenue=Decimal(100 * (i + 1)), orders=1)
+
+    def test_unlimited_top_games_is_streamed_from_iterator(self):
+        self.client.force_login(self.manager)
+        with mock.patch.object(exports, 'iterate', wraps=exports.iterate) as iterate:
+            response = self.client.get('/reports/top-games/?format=ndjson&limit=0')
+            lines = b''.join(response.streaming_content).decode().splitlines()
+        iterate.assert_called_once()
+        self.assertEqual([json.loads(line)['total_sold'] for line in lines], [3, 2, 1])
+
+
+class StaticFilesTests(TestCase):
+    """Навсегда кешируются только имена с хешем из манифеста collectstatic"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        settings_override = override_settings(STATIC_ROOT=self.root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def cache_control(self, name):
+        response = self.client.get(settings.STATIC_URL + name)
+        response.close()
+        self.assertEqual(response.status_code, 200)
+        return response.get('Cache-Control', '')
+
+    def test_only_manifest_names_are_immutable(self):
+        call_command('collectstatic', interactive=False, verbosity=0)
+        hashed = staticfiles_storage.stored_name('store/css/base.css')
+        self.assertIn('immutable', self.cache_control(hashed))
+
+        # Похоже на имя с хешем, но collectstatic его не записывал
+        lookalike = 'store/css/base.0123456789ab.css'
+        shutil.copy(os.path.join(self.root, hashed), os.path.join(self.root, lookalike))
+        self.assertNotIn('immutable', self.cache_control(lookalike))
+        self.assertNotIn('immutable', self.cache_control('store/css/base.css'))
+
+    def test_missing_manifest_is_logged(self):
+        with self.assertLogs('store.assets', 'WARNING'):
+            self.assertEqual(staticfiles_storage.stored_name('store/css/base.css'), 'store/css/base.css')
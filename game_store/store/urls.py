@@ -14,6 +14,7 @@ urlpatterns = [
     path('games/<int:game_id>/', views.game_detail, name='game_detail'),
 
     # ==================== ОТЗЫВЫ ====================
+    path('games/<int:game_id>/reviews/', views.game_reviews, name='game_reviews'),
     path('games/<int:game_id>/review/', views.add_review, name='add_review'),
     path('reviews/delete/<int:review_id>/', views.delete_review, name='delete_review'),
 
@@ -22,6 +23,7 @@ urlpatterns = [
     path('cart/add/<int:game_id>/', views.add_to_cart, name='add_to_cart'),
     path('cart/remove/<int:item_id>/', views.remove_from_cart, name='remove_from_cart'),
     path('cart/update/<int:item_id>/', views.update_cart_item, name='update_cart_item'),
+    path('cart/api/', views.cart_api, name='cart_api'),
 
     # ==================== ЗАКАЗЫ И ПЛАТЕЖИ ====================
     path('checkout/', views.checkout, name='checkout'),
@@ -36,4 +38,6 @@ urlpatterns = [
     path('reports/', views.reports, name='reports'),
     path('reports/top-games/', views.top_games_report, name='top_games_report'),
     path('reports/weekly-sales/', views.weekly_sales_report, name='weekly_sales_report'),
+    path('reports/orders-export/', views.orders_export, name='orders_export'),
+    path('reports/sales/', views.sales_analytics, name='sales_analytics'),
 ]
\ No newline at end of file
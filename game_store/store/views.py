@@ -2,40 +2,20 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
-from django.db.models import Q, Sum, Count
 from django.utils import timezone
 from datetime import timedelta
 import json
 import uuid
-from django.core.mail import send_mail
+from django.db import router, transaction
+from .models import Game, Genre, Tag, Customer, Order, OrderItem, Review, SalesDaily
+from . import analytics, catalog, exports, facets, orders, outbox, recommendations, replica, report_cache, reviews, sales, search, storage
+from .admission import admission_required, release as release_admission
+from .cart import MAX_BATCH_LINES, CartService, get_cart
+from django.http import JsonResponse
+from django.views.decorators.http import require_http_methods
+from django.template.loader import render_to_string
+from django.views.static import serve
 from django.conf import settings
-from .models import Game, Genre, Tag, Customer, Order, OrderItem, Review
-from django.http import HttpResponse, JsonResponse
-
-
-# Вспомогательные функции
-def get_cart(request):
-    """Получает корзину из сессии"""
-    cart = request.session.get('cart', {})
-    return cart
-
-
-def save_cart(request, cart):
-    """Сохраняет корзину в сессии"""
-    request.session['cart'] = cart
-    request.session.modified = True
-
-
-def calculate_cart_total(cart):
-    """Рассчитывает общую сумму корзины"""
-    total = 0
-    for game_id, item in cart.items():
-        try:
-            game = Game.objects.get(id=int(game_id))
-            total += game.price * item['quantity']
-        except (Game.DoesNotExist, ValueError):
-            continue
-    return total
 
 
 # Вспомогательная функция для проверки роли менеджера
@@ -115,7 +95,7 @@ def custom_logout(request):
 def home(request):
     """Главная страница"""
     # Получаем несколько игр для отображения на главной
-    featured_games = Game.objects.filter(quantity__gt=0)[:6]
+    featured_games = catalog.featured_games(limit=6)
     genres = Genre.objects.all()[:8]
 
     return render(request, 'store/home.html', {
@@ -126,49 +106,44 @@ def home(request):
 
 
 def game_list(request):
-    """Страница списка игр с фильтрацией"""
-    games = Game.objects.filter(quantity__gt=0)
-
-    # Фильтрация по жанру
-    genre_id = request.GET.get('genre')
-    if genre_id:
-        games = games.filter(genre_id=genre_id)
+    """Страница списка игр с фасетной фильтрацией"""
+    selection = facets.Selection.from_query(request.GET)
+    games = selection.filter_queryset(catalog.catalog_queryset(in_stock=False))
 
-    # Фильтрация по тегу
-    tag_id = request.GET.get('tag')
-    if tag_id:
-        games = games.filter(tags__id=tag_id)
-
-    # Поиск
+    # Поиск (по умолчанию результаты идут по релевантности)
     search_query = request.GET.get('search')
-    if search_query:
-        games = games.filter(
-            Q(title__icontains=search_query) |
-            Q(description__icontains=search_query)
-        )
-
-    # Сортировка
-    sort_by = request.GET.get('sort', 'title')
-    if sort_by == 'price_asc':
-        games = games.order_by('price')
-    elif sort_by == 'price_desc':
-        games = games.order_by('-price')
-    elif sort_by == 'title':
-        games = games.order_by('title')
-    elif sort_by == 'newest':
-        games = games.order_by('-created_at')
+    sort_by = request.GET.get('sort') or (catalog.RELEVANCE if search_query else catalog.DEFAULT_SORT)
+    cursor = request.GET.get('cursor')
+    search_bits = None
+    search_truncated = False
+
+    if search_query and sort_by == catalog.RELEVANCE and search.is_available():
+        # Ранжируются только RANKED_LIMIT лучших совпадений - их же и считаем,
+        # чтобы "Найдено игр" совпадало с тем, что можно пролистать
+        ranked_ids = search.search_game_ids(search_query)
+        search_bits = facets.bits_from_ids(ranked_ids)
+        search_truncated = len(ranked_ids) >= search.RANKED_LIMIT
+        page = catalog.paginate_ranked(games, ranked_ids, cursor=cursor)
+    else:
+        if search_query and search.is_available():
+            search_bits = facets.bits_from_ids(search.matching_ids(search_query))
+        if search_query:
+            games = search.filter_queryset(games, search_query)
+        # Сортировка и постраничный вывод по курсору
+        sort_by = catalog.normalize_sort(sort_by)
+        page = catalog.paginate(games, sort=sort_by, cursor=cursor)
 
-    genres = Genre.objects.all()
-    tags = Tag.objects.all()
+    # Счетчики фасетов считаются по битовым картам, без COUNT-запросов
+    facet_counts = facets.count(selection, restrict=search_bits)
 
     return render(request, 'store/game_list.html', {
-        'games': games,
-        'genres': genres,
-        'tags': tags,
+        'games': page,
+        'page': page,
+        'facets': facet_counts,
+        'selection': selection,
         'cart_count': len(get_cart(request)),
-        'selected_genre': genre_id,
-        'selected_tag': tag_id,
         'search_query': search_query or '',
+        'search_truncated': search_truncated,
         'sort_by': sort_by,
     })
 
@@ -179,8 +154,13 @@ def game_detail(request, game_id):
     cart = get_cart(request)
     in_cart = str(game_id) in cart
 
-    # Получаем отзывы для этой игры
-    reviews = Review.objects.filter(game=game, is_approved=True).order_by('-created_at')
+    # Отзывы листаются страницами; первая страница каждой сортировки закеширована
+    review_sort = reviews.normalize_sort(request.GET.get('reviews_sort'))
+    review_cursor = request.GET.get('reviews_cursor')
+    if review_cursor:
+        review_page = reviews.page(game.id, review_sort, review_cursor)
+    else:
+        review_page = reviews.first_page(game.id, review_sort)
 
     # Проверяем, может ли пользователь оставить отзыв
     can_review = False
@@ -206,11 +186,29 @@ def game_detail(request, game_id):
         'game': game,
         'in_cart': in_cart,
         'cart_count': len(cart),
-        'reviews': reviews,
+        'reviews': review_page,
+        'review_sort': review_sort,
+        'review_sorts': reviews.sort_choices(),
         'can_review': can_review,
         'user_review': user_review,
         'average_rating': game.average_rating(),
         'review_count': game.review_count(),
+        'bought_together': recommendations.for_game(game.id),
+    })
+
+
+def game_reviews(request, game_id):
+    """Следующая страница отзывов игры в JSON (кнопка "Показать еще")"""
+    game = get_object_or_404(Game, id=game_id)
+    review_page = reviews.page(game.id, request.GET.get('sort'), request.GET.get('cursor'))
+    html = render_to_string('store/review_items.html', {'reviews': review_page}, request=request)
+    return JsonResponse({
+        'html': html,
+        'reviews': [
+            dict(review, created_at=review['created_at'].isoformat()) for review in review_page
+        ],
+        'next_cursor': review_page.next_cursor,
+        'sort': review_page.sort,
     })
 
 
@@ -274,41 +272,17 @@ def delete_review(request, review_id):
 
 def cart_view(request):
     """Просмотр корзины"""
-    cart = get_cart(request)
-    cart_items = []
-    total_price = 0
+    cart = CartService(request)
+    cart_items = cart.items()
 
-    for game_id, item_data in cart.items():
-        try:
-            game = Game.objects.get(id=int(game_id))
-            quantity = item_data['quantity']
-
-            # Проверяем доступное количество
-            available_quantity = game.quantity
-            if quantity > available_quantity:
-                messages.warning(request, f'Только {available_quantity} шт. {game.title} доступно')
-                quantity = min(quantity, available_quantity)
-                cart[game_id]['quantity'] = quantity
-                save_cart(request, cart)
-
-            item_total = game.price * quantity
-            total_price += item_total
-
-            cart_items.append({
-                'game': game,
-                'quantity': quantity,
-                'total': item_total,
-                'game_id': game_id,
-            })
-        except (Game.DoesNotExist, ValueError):
-            # Удаляем несуществующий товар из корзины
-            cart.pop(game_id, None)
-
-    save_cart(request, cart)
+    # Проверяем доступное количество
+    for warning in cart.warnings:
+        messages.warning(request, warning)
+    cart.save()
 
     return render(request, 'store/cart.html', {
         'cart_items': cart_items,
-        'total_price': total_price,
+        'total_price': cart.total,
         'cart_count': len(cart),
     })
 
@@ -316,31 +290,17 @@ def cart_view(request):
 def add_to_cart(request, game_id):
     """Добавление игры в корзину"""
     game = get_object_or_404(Game, id=game_id)
-    cart = get_cart(request)
+    cart = CartService(request)
 
-    game_key = str(game_id)
     quantity = int(request.POST.get('quantity', 1))
 
     # Проверяем доступное количество
-    if quantity > game.quantity:
-        messages.error(request, f'Недостаточно товара. Доступно: {game.quantity}')
+    error = cart.add(game, quantity)
+    if error:
+        messages.error(request, error)
         return redirect('game_detail', game_id=game_id)
 
-    if game_key in cart:
-        # Обновляем количество
-        new_quantity = cart[game_key]['quantity'] + quantity
-        if new_quantity > game.quantity:
-            messages.error(request, f'Недостаточно товара. Доступно: {game.quantity}')
-            return redirect('game_detail', game_id=game_id)
-        cart[game_key]['quantity'] = new_quantity
-    else:
-        # Добавляем новый товар
-        cart[game_key] = {
-            'quantity': quantity,
-            'added_at': timezone.now().isoformat(),
-        }
-
-    save_cart(request, cart)
+    cart.save()
     messages.success(request, f'"{game.title}" добавлен в корзину')
 
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -351,11 +311,11 @@ def add_to_cart(request, game_id):
 
 def remove_from_cart(request, item_id):
     """Удаление игры из корзины"""
-    cart = get_cart(request)
+    cart = CartService(request)
 
-    if str(item_id) in cart:
-        cart.pop(str(item_id))
-        save_cart(request, cart)
+    if str(item_id) in cart.cart:
+        cart.remove(item_id)
+        cart.save()
         messages.success(request, 'Товар удален из корзины')
 
     return redirect('cart')
@@ -364,37 +324,58 @@ def remove_from_cart(request, item_id):
 def update_cart_item(request, item_id):
     """Обновление количества товара в корзине"""
     if request.method == 'POST':
-        cart = get_cart(request)
-        game_key = str(item_id)
+        cart = CartService(request)
 
-        if game_key in cart:
+        if str(item_id) in cart.cart:
             try:
                 quantity = int(request.POST.get('quantity', 1))
-                game = Game.objects.get(id=item_id)
-
-                if quantity <= 0:
-                    cart.pop(game_key)
-                    messages.success(request, 'Товар удален из корзины')
-                elif quantity > game.quantity:
-                    messages.error(request, f'Недостаточно товара. Доступно: {game.quantity}')
-                    cart[game_key]['quantity'] = game.quantity
-                else:
-                    cart[game_key]['quantity'] = quantity
-                    messages.success(request, 'Количество обновлено')
-
-                save_cart(request, cart)
-            except (ValueError, Game.DoesNotExist):
+            except ValueError:
                 messages.error(request, 'Ошибка обновления корзины')
+                return redirect('cart')
+
+            warning = cart.set_quantity(item_id, quantity)
+            if warning:
+                messages.error(request, warning)
+            elif quantity <= 0:
+                messages.success(request, 'Товар удален из корзины')
+            else:
+                messages.success(request, 'Количество обновлено')
+            cart.save()
 
     return redirect('cart')
 
 
+@require_http_methods(['GET', 'POST'])
+def cart_api(request):
+    """JSON API корзины: GET - состояние корзины, POST - пачка изменений строк.
+
+    Тело POST: {"lines": [{"game_id": 12, "quantity": 3}, ...]}; количество 0 удаляет строку.
+    В ответе - строки с суммами, общая сумма, число товаров и предупреждения об остатках.
+    """
+    cart = CartService(request)
+
+    if request.method == 'POST':
+        try:
+            payload = json.loads(request.body or b'{}')
+            changes = [(int(line['game_id']), int(line['quantity'])) for line in payload['lines']]
+        except (ValueError, KeyError, TypeError):
+            return JsonResponse({'error': 'Неверный формат запроса'}, status=400)
+        if len(changes) > MAX_BATCH_LINES:
+            return JsonResponse({'error': f'Не больше {MAX_BATCH_LINES} строк за запрос'}, status=400)
+        cart.apply(changes)
+
+    summary = cart.summary()
+    cart.save()
+    return JsonResponse(summary)
+
+
 @login_required
+@admission_required
 def checkout(request):
     """Оформление заказа (только для авторизованных пользователей)"""
-    cart = get_cart(request)
+    cart = CartService(request)
 
-    if not cart:
+    if not len(cart):
         messages.error(request, 'Корзина пуста')
         return redirect('cart')
 
@@ -402,78 +383,45 @@ def checkout(request):
     customer, created = Customer.objects.get_or_create(user=request.user)
 
     if request.method == 'POST':
-        try:
-            # Создаем заказ
-            order = Order.objects.create(
-                customer=customer,
-                status='pending',
-                total_amount=0,
-                payment_method='none',
-                payment_status='pending'
-            )
-
-            total_amount = 0
-
-            # Добавляем товары в заказ
-            for game_id, item_data in cart.items():
-                game = Game.objects.get(id=int(game_id))
-                quantity = item_data['quantity']
-
-                # Проверяем доступное количество
-                if quantity > game.quantity:
-                    messages.error(request, f'Недостаточно "{game.title}". Доступно: {game.quantity}')
-                    order.delete()
-                    return redirect('cart')
-
-                # Создаем элемент заказа
-                OrderItem.objects.create(
-                    order=order,
-                    game=game,
-                    quantity=quantity,
-                    price=game.price
-                )
-
-                # Обновляем количество товара
-                game.quantity -= quantity
-                game.save()
-
-                total_amount += game.price * quantity
-
-            # Обновляем общую сумму заказа
-            order.total_amount = total_amount
-            order.save()
-
-            # Очищаем корзину
-            request.session['cart'] = {}
-            request.session.modified = True
-
-            # Перенаправляем на страницу оплаты
-            messages.success(request, f'Заказ #{order.id} создан! Перейдите к оплате.')
-            return redirect('payment', order_id=order.id)
+        # cart.games заодно выбрасывает из корзины мусорные ключи - до обхода словаря
+        games = cart.games
+        items = []
+        for game_id, item_data in list(cart.cart.items()):
+            game = games.get(int(game_id))
+            if game is None:
+                messages.error(request, 'Одна из игр корзины больше не продается')
+                return redirect('cart')
+            items.append((game, item_data['quantity']))
 
+        try:
+            # Заказ, списание остатков и элементы заказа - одной транзакцией
+            order = orders.place_order(customer, items, holder=cart.holder)
+        except orders.OutOfStock as e:
+            game = Game.objects.filter(pk=e.game.pk).first()
+            available = cart.available_for(game) if game else 0
+            messages.error(request, f'Недостаточно "{e.game.title}". Доступно: {available}')
+            return redirect('cart')
         except Exception as e:
             messages.error(request, f'Ошибка при оформлении заказа: {str(e)}')
             return redirect('cart')
 
-    # Подсчитываем итоги для подтверждения
-    cart_items = []
-    total_price = 0
+        # Очищаем корзину
+        cart.clear()
+        cart.save()
 
-    for game_id, item_data in cart.items():
-        game = Game.objects.get(id=int(game_id))
-        quantity = item_data['quantity']
-        item_total = game.price * quantity
-        total_price += item_total
+        # Перенаправляем на страницу оплаты
+        messages.success(request, f'Заказ #{order.id} создан! Перейдите к оплате.')
+        return redirect('payment', order_id=order.id)
 
-        cart_items.append({
-            'game': game,
-            'quantity': quantity,
-            'total': item_total,
-        })
+    # Подсчитываем итоги для подтверждения
+    cart_items = cart.items()
+    for warning in cart.warnings:
+        messages.warning(request, warning)
+    cart.save()
 
     return render(request, 'store/checkout.html', {
         'cart_items': cart_items,
-        'total_price': total_price,
+        'total_price': cart.total,
         'customer': customer,
         'cart_count': len(cart),
     })
@@ -482,6 +430,7 @@ def checkout(request):
 # ==================== ПЛАТЕЖНАЯ СИСТЕМА ====================
 
 @login_required
+@admission_required
 def payment_view(request, order_id):
     """Страница оплаты заказа"""
     order = get_object_or_404(Order, id=order_id, customer__user=request.user)
@@ -503,10 +452,11 @@ def payment_view(request, order_id):
             order.status = 'processing'
             order.payment_method = 'card'
             order.payment_status = 'completed'
-            order.save()
-
-            # Отправляем email подтверждения
-            send_order_confirmation_email(request.user, order)
+            # Письмо ставится в очередь в той же транзакции, что и смена статуса
+            with transaction.atomic():
+                order.save()
+                send_order_confirmation_email(request.user, order)
+            release_admission(request)
 
             messages.success(request, f'✅ Оплата заказа #{order.id} прошла успешно! На почту отправлено подтверждение.')
             return redirect('order_success', order_id=order.id)
@@ -515,10 +465,11 @@ def payment_view(request, order_id):
             # Оплата по email (подтверждение через почту)
             order.payment_method = 'email'
             order.payment_status = 'pending'
-            order.save()
-
-            # Отправляем ссылку для подтверждения оплаты на email
-            send_payment_link_email(request.user, order)
+            # Ссылку для подтверждения оплаты ставим в очередь вместе с заказом
+            with transaction.atomic():
+                order.save()
+                send_payment_link_email(request.user, order)
+            release_admission(request)
 
             messages.success(request, f'📧 На вашу почту отправлена ссылка для подтверждения оплаты.')
             return redirect('payment_pending', order_id=order.id)
@@ -548,10 +499,10 @@ def confirm_payment_view(request, order_id, payment_code):
     # Подтверждаем оплату
     order.status = 'processing'
     order.payment_status = 'completed'
-    order.save()
-
-    # Отправляем подтверждение
-    send_order_confirmation_email(request.user, order)
+    with transaction.atomic():
+        order.save()
+        # Подтверждение уйдет из очереди писем
+        send_order_confirmation_email(request.user, order)
 
     messages.success(request, f'✅ Оплата заказа #{order.id} подтверждена!')
     return redirect('order_success', order_id=order.id)
@@ -590,9 +541,11 @@ def order_history_view(request):
 
 
 # ==================== EMAIL ФУНКЦИИ ====================
+# Письма не отправляются из запроса: они ставятся в очередь (store/outbox.py),
+# которую разбирает команда send_outbox.
 
 def send_order_confirmation_email(user, order):
-    """Отправка email с подтверждением заказа"""
+    """Ставит в очередь email с подтверждением заказа"""
     subject = f'Game Store - Подтверждение заказа #{order.id}'
 
     message = f"""
@@ -609,7 +562,7 @@ def send_order_confirmation_email(user, order):
     --------------------------
     """
 
-    for item in order.orderitem_set.all():
+    for item in order.orderitem_set.select_related('game'):
         message += f"- {item.game.title} x {item.quantity} = {item.price * item.quantity} руб.\n"
 
     message += f"""
@@ -626,17 +579,11 @@ def send_order_confirmation_email(user, order):
     🌐 http://127.0.0.1:8000
     """
 
-    send_mail(
-        subject,
-        message,
-        settings.DEFAULT_FROM_EMAIL,
-        [user.email],
-        fail_silently=False,
-    )
+    outbox.enqueue(subject, message, [user.email])
 
 
 def send_payment_link_email(user, order):
-    """Отправка ссылки для подтверждения оплаты по email"""
+    """Ставит в очередь ссылку для подтверждения оплаты по email"""
     payment_url = f"http://127.0.0.1:8000/confirm-payment/{order.id}/{order.payment_code}/"
 
     subject = f'Game Store - Подтверждение оплаты заказа #{order.id}'
@@ -663,57 +610,73 @@ def send_payment_link_email(user, order):
     Команда Game Store
     """
 
-    send_mail(
-        subject,
-        message,
-        settings.DEFAULT_FROM_EMAIL,
-        [user.email],
-        fail_silently=False,
-    )
+    outbox.enqueue(subject, message, [user.email])
 
 
 # ==================== ОТЧЕТЫ (только для менеджеров) ====================
 
+TOP_GAMES_COLUMNS = [
+    ('game__title', 'Игра'),
+    ('game__genre__name', 'Жанр'),
+    ('total_sold', 'Продано копий'),
+    ('total_revenue', 'Общая выручка'),
+]
+
+DAILY_SALES_COLUMNS = [
+    ('day', 'Дата'),
+    ('orders', 'Заказов'),
+    ('units', 'Продано копий'),
+    ('revenue', 'Выручка'),
+]
+
+ANALYTICS_COLUMNS = [
+    ('start', 'Начало интервала'),
+    ('orders', 'Заказов'),
+    ('units', 'Продано копий'),
+    ('revenue', 'Выручка'),
+]
+
+ORDER_EXPORT_COLUMNS = [
+    ('created_at', 'Дата'),
+    ('id', 'Заказ №'),
+    ('customer__user__username', 'Клиент'),
+    ('total_amount', 'Сумма'),
+    ('status', 'Статус'),
+    ('payment_status', 'Статус оплаты'),
+]
+
 @user_passes_test(is_manager)
 def reports(request):
     """Страница отчетов (доступна только менеджерам)"""
     return render(request, 'store/reports.html', {
         'cart_count': len(get_cart(request)),
+        'replica_configured': replica.configured(),
+        'replica_lag': replica.lag(),
     })
 
 
 @user_passes_test(is_manager)
 def top_games_report(request):
     """Отчет по 10 самым продаваемым играм (только для менеджеров)"""
-    # Получаем 10 самых продаваемых игр
-    top_games = OrderItem.objects.values(
-        'game__title', 'game__genre__name'
-    ).annotate(
-        total_sold=Sum('quantity'),
-        total_revenue=Sum('price')
-    ).order_by('-total_sold')[:10]
-
-    if request.GET.get('format') == 'json':
-        data = list(top_games)
-        return JsonResponse(data, safe=False)
-
-    if request.GET.get('format') == 'csv':
-        import csv
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="top_games_report.csv"'
+    # ?limit=0 в выгрузках - рейтинг всех игр
+    limit = 10
+    if request.GET.get('format') in exports.FORMATS:
+        try:
+            limit = max(int(request.GET.get('limit', 10)), 0)
+        except ValueError:
+            pass
 
-        writer = csv.writer(response)
-        writer.writerow(['Игра', 'Жанр', 'Продано копий', 'Общая выручка'])
+    if limit == 0:
+        # Рейтинг всех игр не кешируем и не собираем в список - читаем порциями по ходу выгрузки.
+        # Строки читаются уже после выхода из представления - базу выбираем сейчас
+        top_games = sales.top_games(limit=None).using(router.db_for_read(SalesDaily))
+        return exports.stream(request, TOP_GAMES_COLUMNS, exports.iterate(top_games), 'top_games_report')
 
-        for item in top_games:
-            writer.writerow([
-                item['game__title'],
-                item['game__genre__name'],
-                item['total_sold'],
-                item['total_revenue']
-            ])
+    # Страница и выгрузки берут один и тот же закешированный результат
+    top_games = report_cache.get(f'top-games:{limit}', lambda: list(sales.top_games(limit=limit)))
 
-        return response
+    if request.GET.get('format') in exports.FORMATS:
+        return exports.stream(request, TOP_GAMES_COLUMNS, top_games, 'top_games_report')
 
     return render(request, 'store/reports/top_games.html', {
         'top_games': top_games,
@@ -724,54 +687,118 @@ def top_games_report(request):
 @user_passes_test(is_manager)
 def weekly_sales_report(request):
     """Отчет по продажам за неделю (только для менеджеров)"""
-    week_ago = timezone.now() - timedelta(days=7)
-
-    # Продажи за неделю
-    weekly_sales = Order.objects.filter(
-        created_at__gte=week_ago,
-        status='completed'
-    ).annotate(
-        items_count=Count('orderitem')
-    ).order_by('-created_at')
-
-    # Статистика
-    total_sales = weekly_sales.aggregate(
-        total_amount=Sum('total_amount'),
-        total_orders=Count('id')
+    week_end = timezone.localdate()
+    # Семь дней, включая сегодняшний: daily_totals берет обе границы
+    week_start = week_end - timedelta(days=6)
+
+    # Продажи за неделю по дням - из сводки продаж, через кеш отчетов
+    total_sales = report_cache.get(
+        f'weekly-sales:{week_start.isoformat()}:{week_end.isoformat()}', lambda: sales.period_summary(week_start, week_end)
     )
+    daily_sales = total_sales['days']
+
+    if request.GET.get('format') in ('csv', 'ndjson'):
+        return exports.stream(request, DAILY_SALES_COLUMNS, daily_sales, 'weekly_sales_report')
 
     if request.GET.get('format') == 'json':
         data = {
-            'period': f'{week_ago.date()} - {timezone.now().date()}',
-            'total_orders': total_sales['total_orders'] or 0,
-            'total_amount': float(total_sales['total_amount'] or 0),
-            'orders': list(weekly_sales.values('id', 'customer__user__username', 'total_amount', 'created_at'))
+            'period': f'{week_start} - {week_end}',
+            'total_orders': total_sales['total_orders'],
+            'total_amount': float(total_sales['total_amount']),
+            'days': [
+                {
+                    'day': day['day'].isoformat(),
+                    'orders': day['orders'],
+                    'units': day['units'],
+                    'revenue': float(day['revenue']),
+                }
+                for day in daily_sales
+            ],
         }
         return JsonResponse(data)
 
-    if request.GET.get('format') == 'csv':
-        import csv
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="weekly_sales_report.csv"'
+    return render(request, 'store/reports/weekly_sales.html', {
+        'daily_sales': daily_sales,
+        'total_sales': total_sales,
+        'week_start': week_start,
+        'week_end': week_end,
+        'cart_count': len(get_cart(request)),
+    })
+
 
-        writer = csv.writer(response)
-        writer.writerow(['Дата', 'Заказ №', 'Клиент', 'Сумма', 'Статус'])
+@user_passes_test(is_manager)
+def orders_export(request):
+    """Потоковая выгрузка всех заказов в CSV/NDJSON/JSON (только для менеджеров).
 
-        for order in weekly_sales:
-            writer.writerow([
-                order.created_at.strftime('%Y-%m-%d %H:%M'),
-                order.id,
-                order.customer.user.username,
-                order.total_amount,
-                order.get_status_display()
-            ])
+    ?days=N ограничивает выгрузку последними N днями.
+    """
+    # Строки читаются уже после выхода из представления, когда ReplicaMiddleware
+    # сбросил выбор базы, - базу для выгрузки выбираем сейчас
+    queryset = Order.objects.using(router.db_for_read(Order)).order_by('-created_at', '-id')
+    days = request.GET.get('days', '')
+    if days.isdigit():
+        queryset = queryset.filter(created_at__gte=timezone.now() - timedelta(days=int(days)))
 
-        return response
+    statuses = dict(Order.STATUS_CHOICES)
+    payment_statuses = dict(Order.PAYMENT_STATUS_CHOICES)
+    fmt = request.GET.get('format', 'csv')
 
-    return render(request, 'store/reports/weekly_sales.html', {
-        'weekly_sales': weekly_sales,
-        'total_sales': total_sales,
-        'week_start': week_ago.date(),
-        'week_end': timezone.now().date(),
+    def rows():
+        # Клиент подтягивается тем же запросом, а не двумя запросами на строку
+        for row in exports.iterate(queryset.values(*[key for key, _ in ORDER_EXPORT_COLUMNS])):
+            if fmt == 'csv':
+                row['status'] = statuses.get(row['status'], row['status'])
+                row['payment_status'] = payment_statuses.get(row['payment_status'], row['payment_status'])
+            yield row
+
+    return exports.stream(request, ORDER_EXPORT_COLUMNS, rows(), 'orders_export', fmt=fmt)
+
+
+@user_passes_test(is_manager)
+def sales_analytics(request):
+    """Продажи за произвольный период с разбивкой по времени (только для менеджеров)"""
+    fmt = request.GET.get('format')
+    try:
+        query = analytics.SalesQuery.from_query(request.GET)
+    except analytics.QueryError as e:
+        if fmt in exports.FORMATS:
+            return JsonResponse({'error': str(e)}, status=400)
+        messages.error(request, str(e))
+        query = analytics.SalesQuery.default()
+
+    result = analytics.get(query)
+
+    if fmt == 'json':
+        return JsonResponse(result)
+
+    if fmt in ('csv', 'ndjson'):
+        return exports.stream(request, ANALYTICS_COLUMNS, result['buckets'], 'sales_analytics')
+
+    rows = result['buckets']
+    if query.compare:
+        rows = analytics.compare_rows(result)
+
+    return render(request, 'store/reports/sales_analytics.html', {
+        'query': query,
+        'result': result,
+        'rows': rows,
+        'buckets': [('hour', 'Час'), ('day', 'День'), ('week', 'Неделя'), ('month', 'Месяц')],
+        'genres': Genre.objects.order_by('name'),
+        'statuses': Order.STATUS_CHOICES,
         'cart_count': len(get_cart(request)),
-    })
\ No newline at end of file
+    })
+
+
+# ==================== МЕДИАФАЙЛЫ ====================
+
+def media_file(request, path):
+    """Отдает загруженный файл; файлы с хешем в имени кешируются навсегда.
+
+    В продакшене медиа раздает веб-сервер с тем же правилом: путь вида
+    ab/cd/abcd....ext никогда не меняет содержимое (store/storage.py).
+    """
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    if storage.is_addressed(path) and response.status_code in (200, 304):
+        max_age = getattr(settings, 'MEDIA_CACHE_MAX_AGE', 365 * 24 * 60 * 60)
+        response['Cache-Control'] = f'public, max-age={max_age}, immutable'
+    return response
\ No newline at end of file